@@ -0,0 +1,80 @@
+"""
+Micro-benchmark of feed tips eligibility: timestamps checked one by one vs `feed_eligibility.eligible_timestamps`.
+
+    python benchmarks/bench_feed_eligibility.py [number of timestamps]
+"""
+import random
+import sys
+import timeit
+from dataclasses import replace
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from telliot_feeds.reporters.tips.listener.funded_feeds_filter import _get_price_change
+from telliot_feeds.reporters.tips.listener.funded_feeds_filter import FundedFeedFilter
+
+from timestamps_tip_scanner.feed_eligibility import eligible_timestamps
+from timestamps_tip_scanner.utils import FeedDetails
+
+NOW = 1_700_000_000
+# a feed of a report every minute with a 10% price threshold, funded for all of them
+FEED = FeedDetails(
+    reward=10**18,
+    balance=10**24,
+    startTime=NOW - 60 * 86400,
+    interval=3600,
+    window=600,
+    priceThreshold=1000,
+    rewardIncreasePerSecond=10**12,
+    feedsWithFundingIndex=1,
+)
+
+
+def one_by_one(
+    feed: FeedDetails, timestamps: List[int], before_timestamps: List[int], values: Dict[int, Tuple[Any, Any]]
+) -> List[int]:
+    filtr = FundedFeedFilter()
+    eligible = []
+    for timestamp, timestamp_before in zip(timestamps, before_timestamps):
+        first_in_window, time_diff = filtr.is_timestamp_first_in_window(
+            timestamp_before, timestamp, feed.startTime, feed.window, feed.interval
+        )
+        if feed.balance < feed.reward + feed.rewardIncreasePerSecond * time_diff:
+            break
+        if first_in_window:
+            eligible.append(timestamp)
+        elif feed.priceThreshold > 0 and _get_price_change(*values[timestamp]) > feed.priceThreshold:
+            eligible.append(timestamp)
+    return eligible
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 40_000
+    rng = random.Random(0)
+    timestamps = [NOW - 28 * 86400 + 60 * i for i in range(count)]
+    before_timestamps = [0] + timestamps[:-1]
+    values = {timestamp: (1800.0, 1800.0 * rng.uniform(0.85, 1.15)) for timestamp in timestamps}
+
+    print(f"{count} timestamps of one feed")
+    for feed in (FEED, replace(FEED, priceThreshold=0)):
+        assert one_by_one(feed, timestamps, before_timestamps, values) == eligible_timestamps(
+            timestamps, before_timestamps, feed, values.__getitem__
+        )
+        loop = min(timeit.repeat(lambda: one_by_one(feed, timestamps, before_timestamps, values), number=1, repeat=5))
+        engine = min(
+            timeit.repeat(
+                lambda: eligible_timestamps(timestamps, before_timestamps, feed, values.__getitem__),
+                number=1,
+                repeat=5,
+            )
+        )
+        print(f"price threshold {feed.priceThreshold}:")
+        print(f"  one by one:          {loop * 1000:.1f}ms")
+        print(f"  eligible_timestamps: {engine * 1000:.1f}ms")
+        print(f"  speedup: {loop / engine:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark of the tips multicalls: one Multicall of every call vs `multicall_batches` batches in parallel.
+
+Runs getDataBefore / retrieveData calls of a query id's timestamps against a local node, e.g. the brownie
+(ganache) node of the tests with the autopay and multicall contracts deployed:
+
+    python benchmarks/bench_multicall_batches.py <node url> <autopay address> [number of calls] [workers]
+"""
+import sys
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+
+from hexbytes import HexBytes
+from multicall import Call
+from multicall import Multicall
+from web3 import Web3
+
+from timestamps_tip_scanner.multicall_batches import plan_batches
+from timestamps_tip_scanner.multicall_batches import run_batches
+
+QUERY_ID = HexBytes("0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992")
+
+
+def make_calls(autopay: str, count: int) -> List[Call]:
+    start = int(time.time()) - 4 * 7 * 24 * 60 * 60
+    calls = []
+    for i in range(count // 2):
+        timestamp = start + i * 60
+        calls.append(
+            Call(
+                autopay,
+                ["getDataBefore(bytes32,uint256)(bytes,uint256)", QUERY_ID, timestamp],
+                [[("before_values", i), None], [("timestamps", i), None]],
+            )
+        )
+        calls.append(Call(autopay, ["retrieveData(bytes32,uint256)(bytes)", QUERY_ID, timestamp], [[i, None]]))
+    return calls
+
+
+def timed(label: str, func: Callable[[], Dict[Any, Any]]) -> None:
+    started = time.perf_counter()
+    try:
+        results = func()
+    except Exception as e:
+        print(f"{label}: failed after {time.perf_counter() - started:.2f}s ({type(e).__name__}: {str(e)[:80]})")
+        return
+    print(f"{label}: {time.perf_counter() - started:.2f}s, {len(results)} results")
+
+
+def main() -> None:
+    w3 = Web3(Web3.HTTPProvider(sys.argv[1], request_kwargs={"timeout": 300}))
+    autopay = Web3.toChecksumAddress(sys.argv[2])
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 10_000
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+    calls = make_calls(autopay, count)
+
+    started = time.perf_counter()
+    batches = plan_batches(calls)
+    print(f"{len(calls)} calls planned in {len(batches)} batches in {time.perf_counter() - started:.3f}s")
+
+    def run(batch: List[Call]) -> Dict[Any, Any]:
+        return Multicall(calls=batch, _w3=w3)()  # type: ignore
+
+    timed("one multicall", lambda: run(calls))
+    timed("batches, 1 worker", lambda: run_batches(batches, run, workers=1))
+    timed(f"batches, {workers} workers", lambda: run_batches(batches, run, workers=workers))
+
+
+if __name__ == "__main__":
+    main()
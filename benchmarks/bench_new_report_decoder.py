@@ -0,0 +1,73 @@
+"""
+Micro-benchmark of NewReport decoding: web3's generic `get_event_data` vs `new_report.decode_new_report`.
+
+    python benchmarks/bench_new_report_decoder.py [number of logs]
+"""
+import sys
+import timeit
+
+from eth_abi import encode_abi
+from hexbytes import HexBytes
+from web3 import Web3
+from web3._utils.events import get_event_data
+
+from timestamps_tip_scanner.new_report import decode_new_report
+from timestamps_tip_scanner.new_report import NEW_REPORT_TOPIC
+
+NEW_REPORT_ABI = {
+    "anonymous": False,
+    "inputs": [
+        {"indexed": True, "internalType": "bytes32", "name": "_queryId", "type": "bytes32"},
+        {"indexed": True, "internalType": "uint256", "name": "_time", "type": "uint256"},
+        {"indexed": False, "internalType": "bytes", "name": "_value", "type": "bytes"},
+        {"indexed": False, "internalType": "uint256", "name": "_nonce", "type": "uint256"},
+        {"indexed": False, "internalType": "bytes", "name": "_queryData", "type": "bytes"},
+        {"indexed": True, "internalType": "address", "name": "_reporter", "type": "address"},
+    ],
+    "name": "NewReport",
+    "type": "event",
+}
+QUERY_ID = HexBytes("0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992")
+QUERY_DATA = encode_abi(["string", "bytes"], ["SpotPrice", encode_abi(["string", "string"], ["eth", "usd"])])
+REPORTER = "0x33A4622B82D4c04a53e170c638B944ce27cffce3"
+
+
+def make_logs(count: int) -> list:
+    data = HexBytes(encode_abi(["bytes", "uint256", "bytes"], [(1800).to_bytes(32, "big"), 0, QUERY_DATA]))
+    return [
+        {
+            "address": "0xD9157453E2668B2fc45b7A803D3FEF3642430cC0",
+            "topics": [
+                NEW_REPORT_TOPIC,
+                QUERY_ID,
+                HexBytes((1683037267 + i).to_bytes(32, "big")),
+                HexBytes(bytes(12) + HexBytes(REPORTER)),
+            ],
+            "data": data,
+            "blockHash": HexBytes(i.to_bytes(32, "big")),
+            "blockNumber": 40_000_000 + i,
+            "logIndex": 0,
+            "transactionHash": HexBytes(i.to_bytes(32, "big")),
+            "transactionIndex": 0,
+            "removed": False,
+        }
+        for i in range(count)
+    ]
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    codec = Web3().codec
+    logs = make_logs(count)
+
+    generic = min(timeit.repeat(lambda: [get_event_data(codec, NEW_REPORT_ABI, log) for log in logs], number=1))
+    fast = min(timeit.repeat(lambda: [decode_new_report(log) for log in logs], number=1))
+
+    print(f"{count} NewReport logs")
+    print(f"get_event_data:    {generic:.3f}s ({generic / count * 1e6:.1f} us/log)")
+    print(f"decode_new_report: {fast:.3f}s ({fast / count * 1e6:.1f} us/log)")
+    print(f"speedup: {generic / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,71 +1,151 @@
 import json
 import time
 from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
 from typing import Optional
 
+from eth_typing import ChecksumAddress
+from eth_utils import to_checksum_address
 from fastapi import FastAPI
+from fastapi import HTTPException
+from fastapi import Request
 from fastapi.responses import HTMLResponse
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
 
+from timestamps_tip_scanner import metrics
+from timestamps_tip_scanner import tracing
+from timestamps_tip_scanner.api.utils import async_fetch_data
 from timestamps_tip_scanner.api.utils import autopay
-from timestamps_tip_scanner.api.utils import fetch_data
+from timestamps_tip_scanner.block_resolver import parse_timestamp
 from timestamps_tip_scanner.claims.single_tips import timestamps_to_claim
-from timestamps_tip_scanner.constants import CHAIN_ID_MAPPING
-from timestamps_tip_scanner.constants import REPORTS_FILENAME
+from timestamps_tip_scanner.jsonified_state import JSONifiedState
+from timestamps_tip_scanner.rate_limiter import usage_report
+from timestamps_tip_scanner.sqlite_state import open_state
 
 
 app = FastAPI()
 
 
-def reports_file(chain_id: int, address: str) -> Any:
+@app.middleware("http")
+async def trace_request(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    """Root span of the request, the scans, state reads and multicalls it runs are its children"""
+    with tracing.span(f"{request.method} {request.url.path}", query=request.url.query) as span:
+        response = await call_next(request)
+        span.set(status_code=response.status_code)
+    return response
+
+
+def recently_scanned(state: JSONifiedState) -> bool:
+    """Whether the reporter was scanned in the last 10 minutes"""
+    last_scan = state.last_scanned_time()
+    # if last scan was more than 10 minutes ago scan again
+    return last_scan is not None and int(time.time()) - last_scan <= 60 * 10
+
+
+def saved_reports(chain_id: int, address: str) -> Optional[Dict[ChecksumAddress, Any]]:
+    """Served reports of the saved state if the reporter was scanned recently, None otherwise"""
+    state = open_state(chain_id, to_checksum_address(address))
     try:
-        with open(REPORTS_FILENAME, "r") as f:
-            reports = json.load(f)
-    except FileNotFoundError:
-        return None
-    report_chain = reports.get(CHAIN_ID_MAPPING[chain_id]["name"])
-    if not report_chain:
-        return None
-    report_address = report_chain.get(address)
-    if not report_address:
-        return None
-    last_scan = report_address.get("last_scanned_time")
-    if not last_scan:
-        return None
-    if int(time.time()) - last_scan > 60 * 10:  # if last scan was more than 10 minutes ago scan again
+        if not recently_scanned(state):
+            return None
+        state.load()
+        return state.serve()
+    finally:
+        state.close()
+
+
+def saved_state_is_fresh(chain_id: int, address: str) -> bool:
+    """Whether the saved state of the reporter was scanned recently"""
+    state = open_state(chain_id, to_checksum_address(address))
+    try:
+        return recently_scanned(state)
+    finally:
+        state.close()
+
+
+def serve(state: JSONifiedState) -> Dict[ChecksumAddress, Any]:
+    """Served reports of a scanned state, which is closed"""
+    try:
+        return state.serve()
+    finally:
+        state.close()
+
+
+def since_timestamp(since: Optional[str]) -> Optional[int]:
+    if since is None:
         return None
-    return reports
+    try:
+        return parse_timestamp(since)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
 
 
 @app.get("/", response_class=HTMLResponse)
 def guide() -> str:
     return """<pre>Endpoints:
-    /reports/{chain_id}?address={address}&starting_block={starting_block}
-    /feed_tips/{chain_id}?address={address}&starting_block={starting_block}
-    /tips/{chain_id}?address={address}&starting_block={starting_block}</pre>"""
+    /reports/{chain_id}?address={address}&starting_block={starting_block}&since={since}
+    /feed_tips/{chain_id}?address={address}&starting_block={starting_block}&since={since}
+    /tips/{chain_id}?address={address}&starting_block={starting_block}&since={since}
+    /rpc_usage
+    /metrics
+
+    since: unix timestamp or ISO date to scan from</pre>"""
 
 
 @app.get("/reports/{chain_id}", response_class=HTMLResponse)
-def reports(chain_id: int, address: str, starting_block: Optional[int] = None) -> str:
-    data = fetch_data(chain_id, address, starting_block).serve()
+async def reports(
+    chain_id: int, address: str, starting_block: Optional[int] = None, since: Optional[str] = None
+) -> str:
+    # a resident `scanner watch` keeps the saved state fresh, only scan here if it went stale
+    data = None
+    if starting_block is None and since is None:
+        data = await run_in_threadpool(tracing.in_context(saved_reports), chain_id, address)
+    if data is None:
+        with tracing.span("fetch_data", chain_id=chain_id, starting_block=starting_block):
+            state = await async_fetch_data(chain_id, address, starting_block, since_timestamp(since))
+        data = await run_in_threadpool(tracing.in_context(serve), state)
     data_formatted = json.dumps(data, indent=4)
     content = f"<pre>{data_formatted}</pre>"
     return content
 
 
 @app.get("/feed_tips/{chain_id}", response_class=HTMLResponse)
-def feed_tips(chain_id: int, address: str, starting_block: Optional[int] = None) -> str:
-    if reports_file(chain_id, address) is None:
-        _ = fetch_data(chain_id, address, starting_block)
-    apay = autopay(chain_id, address)
-    data = apay.reward_claimed_status_check()
+async def feed_tips(
+    chain_id: int, address: str, starting_block: Optional[int] = None, since: Optional[str] = None
+) -> str:
+    if since is not None or not await run_in_threadpool(tracing.in_context(saved_state_is_fresh), chain_id, address):
+        with tracing.span("fetch_data", chain_id=chain_id, starting_block=starting_block):
+            state = await async_fetch_data(chain_id, address, starting_block, since_timestamp(since))
+        await run_in_threadpool(state.close)
+    apay = await run_in_threadpool(tracing.in_context(autopay), chain_id, address)
+    data = await run_in_threadpool(tracing.in_context(apay.reward_claimed_status_check))
     if data is None:
         return "<pre>{}</pre>"
     return f"<pre>{data}</pre>"
 
 
 @app.get("/tips/{chain_id}", response_class=HTMLResponse)
-def one_time_tips(chain_id: int, address: str, starting_block: Optional[int] = None) -> str:
-    if reports_file(chain_id, address) is None:
-        _ = fetch_data(chain_id, address, starting_block)
-    apay = autopay(chain_id, address)
-    return f"<pre>{timestamps_to_claim(apay=apay)}</pre>"
+async def one_time_tips(
+    chain_id: int, address: str, starting_block: Optional[int] = None, since: Optional[str] = None
+) -> str:
+    if since is not None or not await run_in_threadpool(tracing.in_context(saved_state_is_fresh), chain_id, address):
+        with tracing.span("fetch_data", chain_id=chain_id, starting_block=starting_block):
+            state = await async_fetch_data(chain_id, address, starting_block, since_timestamp(since))
+        await run_in_threadpool(state.close)
+    apay = await run_in_threadpool(tracing.in_context(autopay), chain_id, address)
+    to_claim = await run_in_threadpool(tracing.in_context(timestamps_to_claim), apay)
+    return f"<pre>{to_claim}</pre>"
+
+
+@app.get("/rpc_usage", response_class=HTMLResponse)
+def rpc_usage() -> str:
+    return f"<pre>{json.dumps(usage_report(), indent=4)}</pre>"
+
+
+@app.get("/metrics")
+def prometheus_metrics() -> Response:
+    content, content_type = metrics.latest()
+    return Response(content=content, media_type=content_type)
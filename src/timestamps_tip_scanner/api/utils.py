@@ -1,30 +1,56 @@
+import asyncio
 import os
+import threading
+from typing import Dict
 from typing import Optional
+from typing import Tuple
 
 from dotenv import load_dotenv
 from eth_utils import to_checksum_address
+from starlette.concurrency import run_in_threadpool
 from telliot_core.apps.telliot_config import TelliotConfig
 from telliot_core.directory import contract_directory
 from telliot_core.directory import ContractInfo
 from telliot_core.model.endpoints import RPCEndpoint
 from telliot_core.tellor.tellor360.autopay import Tellor360AutopayContract
+from web3 import Web3
 
+from timestamps_tip_scanner.async_event_scanner import async_web3
 from timestamps_tip_scanner.autopay_calls import AutopayCalls
+from timestamps_tip_scanner.block_resolver import BlockResolver
+from timestamps_tip_scanner.constants import SHARED_SCAN
+from timestamps_tip_scanner.constants import SHARED_SCAN_ADDRESS
+from timestamps_tip_scanner.endpoint_pool import pool_endpoints
 from timestamps_tip_scanner.jsonified_state import JSONifiedState
-from timestamps_tip_scanner.timestamps_scanner import run
+from timestamps_tip_scanner.timestamps_scanner import async_run
+from timestamps_tip_scanner.timestamps_scanner import async_run_shared
+from timestamps_tip_scanner.timestamps_scanner import parse_reporters
 
 
 print(f"env loaded: {load_dotenv()}")
 node_url = os.getenv("NODE_URL", None)
+# NODE_URL may list several endpoints separated by commas, requests are routed over all of them
+node_urls = [url.strip() for url in node_url.split(",")] if node_url else []
 cfg = TelliotConfig()
+# connected endpoints by chain id, their pool (health, learned range limits, threads) serves every request
+endpoints: Dict[int, RPCEndpoint] = {}
+endpoints_lock = threading.Lock()
+# one scan at a time per (chain id, reporter), concurrent requests wait for it instead of rescanning
+scan_locks: Dict[Tuple[int, str], asyncio.Lock] = {}
+# reporters scanned in one shared pass (None for all), see SHARED_SCAN
+shared_reporters = parse_reporters(SHARED_SCAN) if SHARED_SCAN else None
 
 
 def connect_endpoint(chain_id: int) -> RPCEndpoint:
+    """The chain's endpoint routed over the pool of NODE_URL endpoints, connected on the first request"""
     cfg.main.chain_id = chain_id
-    endpoint = RPCEndpoint(chain_id=chain_id, url=node_url)
-    if not endpoint.connect():
-        raise Exception(f"Could not connect to endpoint {endpoint}")
-    return endpoint
+    with endpoints_lock:
+        if chain_id not in endpoints:
+            endpoint = pool_endpoints([RPCEndpoint(chain_id=chain_id, url=url) for url in node_urls])
+            if endpoint is None:
+                raise Exception(f"Could not connect to any endpoint of {node_urls}")
+            endpoints[chain_id] = endpoint
+        return endpoints[chain_id]
 
 
 def fetch_contract(chain_id: int, name: str) -> ContractInfo:
@@ -41,17 +67,45 @@ def autopay(chain_id: int, wallet: str) -> AutopayCalls:
     return AutopayCalls(tellor_autopay)
 
 
-def fetch_data(chain_id: int, address: str, starting_block: Optional[int]) -> JSONifiedState:
-    w3 = connect_endpoint(chain_id)._web3
+async def async_fetch_data(
+    chain_id: int, address: str, starting_block: Optional[int], since: Optional[int] = None
+) -> JSONifiedState:
+    """Scan for a reporter's NewReport events without blocking the event loop on RPC calls
+
+    `since` (a unix timestamp) restarts the scan from the first block at or after it, unless `starting_block` is given.
+    Otherwise reporters of the SHARED_SCAN are scanned by resuming the shared scan, for all of them at once.
+    """
+    if node_url is None:
+        raise Exception("NODE_URL not set")
     contract_info = fetch_contract(chain_id, "tellor360-oracle")
     if not contract_info:
         raise Exception(f"Tellorflex not found in telliot on chain_id {chain_id}\nCheck supported tellor chain ids")
     abi = contract_info.get_abi(chain_id=chain_id)
-    tellorflex_contract = w3.eth.contract(address=contract_info.address[chain_id], abi=abi)
-    return run(
-        w3=w3,
-        tellorflex_contract=tellorflex_contract,
-        chain_id=chain_id,
-        reporter=to_checksum_address(address),
-        starting_block=starting_block,
-    )
+    # only used for the event ABI and address, calls go through the async Web3
+    tellorflex_contract = Web3().eth.contract(address=contract_info.address[chain_id], abi=abi)
+    reporter = to_checksum_address(address)
+    endpoint = await run_in_threadpool(connect_endpoint, chain_id)
+    block_resolver = BlockResolver(endpoint._web3, chain_id)
+    if starting_block is None and since is not None:
+        starting_block = await run_in_threadpool(block_resolver.first_block_since, since)
+
+    if SHARED_SCAN and starting_block is None and (shared_reporters is None or reporter in shared_reporters):
+        async with scan_locks.setdefault((chain_id, SHARED_SCAN_ADDRESS), asyncio.Lock()):
+            return await async_run_shared(
+                w3=async_web3(*node_urls),
+                tellorflex_contract=tellorflex_contract,
+                chain_id=chain_id,
+                reporters=shared_reporters,
+                block_resolver=block_resolver,
+            )
+
+    lock = scan_locks.setdefault((chain_id, reporter), asyncio.Lock())
+    async with lock:
+        return await async_run(
+            w3=async_web3(*node_urls),
+            tellorflex_contract=tellorflex_contract,
+            chain_id=chain_id,
+            reporter=reporter,
+            starting_block=starting_block,
+            block_resolver=block_resolver,
+        )
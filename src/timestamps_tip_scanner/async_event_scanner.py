@@ -0,0 +1,294 @@
+"""
+asyncio counterpart of `EventScanner` for a Web3 built on `AsyncHTTPProvider` and `AsyncEth`,
+so scans can be awaited directly (e.g. from FastAPI handlers) and many requests stay in flight.
+
+State reads and writes that hit the disk (saves, commits, the log cache) run in the threadpool.
+"""
+import asyncio
+import logging
+from collections import deque
+from time import time
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Type
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.contract import ContractEvent
+from web3.eth import AsyncEth
+from web3.exceptions import BlockNotFound
+from web3.types import FilterParams
+
+from timestamps_tip_scanner import metrics
+from timestamps_tip_scanner import tracing
+from timestamps_tip_scanner.endpoint_pool import AsyncEndpointPool
+from timestamps_tip_scanner.event_scanner import _block_ranges
+from timestamps_tip_scanner.event_scanner import _decode_logs
+from timestamps_tip_scanner.event_scanner import _event_filter_params
+from timestamps_tip_scanner.event_scanner import _sorted_logs
+from timestamps_tip_scanner.event_scanner import BaseEventScanner
+from timestamps_tip_scanner.log_cache import LogCache
+from timestamps_tip_scanner.retry_policy import RetryPolicy
+from timestamps_tip_scanner.utils import EventData
+
+
+def async_web3(*urls: str) -> Web3:
+    """Web3 instance with an async provider, failing requests over the endpoints in order.
+
+    Middlewares are disabled on purpose, the scanner does its own retries and range throttling.
+    Requests are paced by the endpoints' rate limiters.
+    """
+    return Web3(AsyncEndpointPool(urls), modules={"eth": (AsyncEth,)}, middlewares=[])  # type: ignore
+
+
+class AsyncEventScanner(BaseEventScanner):
+    """Scan blockchain for events with an async Web3.
+
+    Chunk throttling, chunk size heuristics and the reorg checkpoints are the same as `EventScanner`.
+    Event types of a chunk and the chain head are queried concurrently.
+    """
+
+    async def get_suggested_scan_start_block(self) -> int:
+        """Get where we should start to scan for new events, see `EventScanner.get_suggested_scan_start_block`."""
+        fork_point = await self.find_fork_point()
+        return await asyncio.to_thread(self.roll_back_to_fork_point, fork_point)
+
+    async def get_block_hash(self, block_number: int) -> str:
+        block = await self.web3.eth.get_block(block_number)  # type: ignore
+        return HexBytes(block["hash"]).hex()
+
+    async def find_fork_point(self) -> Optional[int]:
+        """The newest checkpointed block still on the canonical chain, None if there was no reorg"""
+        checkpoints = self.state.block_checkpoints()
+        for i, (block_number, block_hash) in enumerate(checkpoints):
+            try:
+                canonical_hash = await self.get_block_hash(block_number)
+            except BlockNotFound:
+                # the canonical chain is shorter now, the block was orphaned
+                continue
+            if canonical_hash == block_hash:
+                return block_number if i else None
+        return self.untracked_fork_point(checkpoints)
+
+    async def record_checkpoint(self, block_number: int, head_block: int) -> None:
+        """Record the hash of a scanned block that isn't final yet, so the next run can detect a reorg"""
+        final_block = head_block - self.state.finality_depth
+        if block_number > final_block:
+            self.state.record_block_hash(block_number, await self.get_block_hash(block_number))
+            self.state.prune_reorg_journal(final_block)
+
+    async def end_chunk(self, block_number: int) -> None:
+        """Commit the chunk, the state saves it to disk"""
+        await asyncio.to_thread(self.state.end_chunk, block_number)
+
+    async def get_suggested_scan_end_block(self) -> int:
+        """Get the last mined block on EVM chain we are following."""
+        return self.set_head(await self.web3.eth.block_number)  # type: ignore
+
+    async def fetch_chunk(self, start_block: int, end_block: int) -> Tuple[int, List[EventData]]:
+        """Read events between to block numbers without touching the state.
+
+        All event types are fetched concurrently, each throttling down its own block range,
+        so we only keep events up to the smallest range served.
+
+        :return: tuple(actual end block number, fetched events)
+        """
+
+        def _fetch_events_for(event_type: Type["ContractEvent"]) -> Callable[[int, int], Awaitable[List[EventData]]]:
+            async def _fetch_events(_start_block: int, _end_block: int) -> List[EventData]:
+                return await _async_fetch_events_for_all_contracts(
+                    self.web3,
+                    event_type,
+                    self.filters,
+                    from_block=_start_block,
+                    to_block=_end_block,
+                    log_cache=self.log_cache,
+                    final_block=self.final_block,
+                )
+
+            return _fetch_events
+
+        with tracing.span("fetch_chunk", from_block=start_block, to_block=end_block) as span:
+            results = await asyncio.gather(
+                *(
+                    _async_retry_web3_call(
+                        _fetch_events_for(event_type),
+                        start_block=start_block,
+                        end_block=end_block,
+                        policy=self.retry_policy,
+                    )
+                    for event_type in self.events
+                )
+            )
+            actual_end_block = min((result_end for result_end, _ in results), default=end_block)
+            all_events = [evt for _, events in results for evt in events if evt.blockNumber <= actual_end_block]
+            span.set(actual_to_block=actual_end_block, events=len(all_events))
+        return actual_end_block, all_events
+
+    async def fetch_range(self, start_block: int, end_block: int) -> List[EventData]:
+        """Read all events in a block range, in as many requests as the throttled chunk size needs."""
+        all_events = []
+        current_block = start_block
+        while current_block <= end_block:
+            actual_end_block, events = await self.fetch_chunk(current_block, end_block)
+            all_events += events
+            current_block = actual_end_block + 1
+        return all_events
+
+    async def scan_chunk(self, start_block: int, end_block: int) -> Tuple[int, List[str]]:
+        """Read and process events between to block numbers.
+
+        :return: tuple(actual end block number, processed events)
+        """
+        with tracing.span("scan_chunk", from_block=start_block, to_block=end_block) as span:
+            end_block, events = await self.fetch_chunk(start_block, end_block)
+            processed = self.process_events(events)
+            span.set(actual_to_block=end_block, events=len(events), new_reports=len(processed))
+        return end_block, processed
+
+    async def scan(
+        self,
+        start_block: int,
+        end_block: int,
+        start_chunk_size: int = 3499,
+        progress_callback: Optional[Callable[[int, int, int], None]] = None,
+    ) -> Tuple[List[str], int]:
+        """Perform a NewReport scan, see `EventScanner.scan`.
+
+        The chain head used to clamp each chunk is queried alongside the chunk's `eth_getLogs`.
+        """
+        assert start_block <= end_block
+
+        current_block = start_block
+        chunk_size = start_chunk_size
+        last_scan_duration = last_logs_found = 0
+        total_chunks_scanned = 0
+        all_processed: List[str] = []
+
+        while current_block <= end_block:
+            estimated_end_block = current_block + chunk_size
+            logging.debug(
+                "Scanning NewReports for blocks: %d - %d, chunk size %d, last chunk scan took %f, last logs found %d",
+                current_block,
+                estimated_end_block,
+                chunk_size,
+                last_scan_duration,
+                last_logs_found,
+            )
+
+            start = time()
+            (actual_end_block, events), suggested_end_block = await asyncio.gather(
+                self.fetch_chunk(current_block, estimated_end_block), self.get_suggested_scan_end_block()
+            )
+            new_entries = self.process_events(events)
+
+            # Where does our current chunk scan ends - are we out of chain yet?
+            current_end = min(suggested_end_block, actual_end_block)
+            metrics.record_chunk(
+                str(self.state.chain_name), current_block, current_end, time() - start, len(events), len(new_entries)
+            )
+
+            last_scan_duration = int(time() - start)
+            last_logs_found = len(new_entries)
+            all_processed += new_entries
+
+            if progress_callback:
+                progress_callback(current_block, chunk_size, len(new_entries))
+
+            # Try to guess how many blocks to fetch over `eth_getLogs` API next time
+            chunk_size = self.estimate_next_chunk_size(chunk_size, len(new_entries))
+
+            # Set where the next chunk starts
+            current_block = current_end + 1
+            total_chunks_scanned += 1
+            await self.record_checkpoint(current_end, suggested_end_block)
+            await self.end_chunk(current_end)
+        return all_processed, total_chunks_scanned
+
+    async def scan_parallel(
+        self,
+        start_block: int,
+        end_block: int,
+        chunk_size: int,
+        max_workers: int = 8,
+        progress_callback: Optional[Callable[[int, int, int], None]] = None,
+    ) -> Tuple[List[str], int]:
+        """Fetch block ranges concurrently and commit them in block order, see `EventScanner.scan_parallel`."""
+        assert start_block <= end_block
+
+        ranges = _block_ranges(start_block, end_block, chunk_size)
+        total_chunks_scanned = 0
+        all_processed: List[str] = []
+        pending: Deque[Tuple[int, int, "asyncio.Future[List[EventData]]"]] = deque()
+
+        def _submit_next() -> None:
+            block_range = next(ranges, None)
+            if block_range is not None:
+                pending.append((*block_range, asyncio.ensure_future(self.fetch_range(*block_range))))
+
+        for _ in range(max_workers):
+            _submit_next()
+
+        try:
+            last_commit = time()
+            while pending:
+                range_start, range_end, task = pending.popleft()
+                events = await task
+                new_entries = self.process_events(events)
+                chain = str(self.state.chain_name)
+                metrics.record_chunk(chain, range_start, range_end, time() - last_commit, len(events), len(new_entries))
+                last_commit = time()
+                all_processed += new_entries
+                total_chunks_scanned += 1
+                await self.record_checkpoint(range_end, end_block)
+                await self.end_chunk(range_end)
+
+                if progress_callback:
+                    progress_callback(range_start, range_end - range_start + 1, len(new_entries))
+
+                _submit_next()
+        finally:
+            for _, _, task in pending:
+                task.cancel()
+
+        return all_processed, total_chunks_scanned
+
+
+async def _async_retry_web3_call(
+    func: Callable[[int, int], Awaitable[List[EventData]]], start_block: int, end_block: int, policy: RetryPolicy
+) -> Tuple[int, List[EventData]]:
+    """Fetch the events of a block range with retries, see `event_scanner._retry_web3_call`."""
+    return end_block, await policy.async_fetch(func, start_block, end_block)
+
+
+async def _async_fetch_events_for_all_contracts(
+    web3: Web3,
+    event: Type["ContractEvent"],
+    argument_filters: Dict[str, Any],
+    from_block: int,
+    to_block: int,
+    log_cache: Optional[LogCache] = None,
+    final_block: Optional[int] = None,
+) -> List[EventData]:
+    """Get events using eth_getLogs API on an async Web3, see `event_scanner._fetch_events_for_all_contracts`."""
+    event_filter_params = _event_filter_params(web3.codec, event, argument_filters, from_block, to_block)
+    with tracing.span("get_logs", event=event.event_name, from_block=from_block, to_block=to_block) as span:
+        if log_cache is None:
+            logs = await web3.eth.get_logs(event_filter_params)  # type: ignore
+        else:
+            logs, missing = await asyncio.to_thread(log_cache.cached, event_filter_params)
+            span.set(cached_logs=len(logs), requests=len(missing))
+            for missing_from, missing_to in missing:
+                params: FilterParams = {**event_filter_params, "fromBlock": missing_from, "toBlock": missing_to}
+                fetched = await web3.eth.get_logs(params)  # type: ignore
+                await asyncio.to_thread(log_cache.store, params, fetched, final_block)
+                logs += fetched
+            logs = _sorted_logs(logs)
+        span.set(logs=len(logs))
+    return _decode_logs(web3.codec, event, logs)
@@ -1,51 +1,47 @@
-import ast
-import json
 import logging
+from functools import partial
 from time import time
 from typing import Any
 from typing import Dict
+from typing import Iterable
 from typing import List
 from typing import Optional
+from typing import Set
 from typing import Tuple
 from typing import Union
 
-from eth_abi import decode_single
 from hexbytes import HexBytes
 from multicall import Call
 from multicall import Multicall
 from telliot_core.tellor.tellor360.autopay import Tellor360AutopayContract
-from telliot_feeds.queries.query_catalog import query_catalog
-from telliot_feeds.reporters.tips.listener.funded_feeds_filter import _get_price_change
-from telliot_feeds.reporters.tips.listener.funded_feeds_filter import FundedFeedFilter
 
+from timestamps_tip_scanner import metrics
+from timestamps_tip_scanner import tracing
+from timestamps_tip_scanner.block_resolver import BlockResolver
+from timestamps_tip_scanner.claim_ledger import ClaimLedger
+from timestamps_tip_scanner.claim_ledger import ONE_TIME_TIP
+from timestamps_tip_scanner.claim_ledger import open_claim_ledger
 from timestamps_tip_scanner.constants import CHAIN_ID_MAPPING
 from timestamps_tip_scanner.constants import FOUR_WEEKS
 from timestamps_tip_scanner.constants import QUERYDATASTORAGEMAPPING
-from timestamps_tip_scanner.constants import REPORTS_FILENAME
 from timestamps_tip_scanner.constants import TWELVE_HOURS
+from timestamps_tip_scanner.feed_eligibility import eligible_timestamps
+from timestamps_tip_scanner.jsonified_state import JSONifiedState
+from timestamps_tip_scanner.multicall_batches import plan_batches
+from timestamps_tip_scanner.multicall_batches import run_batches
+from timestamps_tip_scanner.oracle_cache import open_oracle_cache
+from timestamps_tip_scanner.query_types import decoder_registry
+from timestamps_tip_scanner.query_types import DecoderRegistry
+from timestamps_tip_scanner.reports_snapshot import reports_snapshot
+from timestamps_tip_scanner.reports_snapshot import ReportsSnapshot
+from timestamps_tip_scanner.sqlite_state import open_state
+from timestamps_tip_scanner.timestamps import SortedTimestamps
 from timestamps_tip_scanner.utils import FeedDetails
 
 
 PastTipType = Union[Tuple[str, str, int], Tuple[str, str]]
 
 
-def decode_typ_name(qdata: bytes) -> str:
-    """Decode query type name from query data
-
-    Args:
-    - qdata: query data in bytes
-
-    Return: string query type name
-    """
-    qtype_name: str
-    try:
-        qtype_name, _ = decode_single("(string,bytes)", qdata)
-    except OverflowError:
-        # string query for some reason encoding isn't the same as the others
-        qtype_name = ast.literal_eval(qdata.decode("utf-8"))["type"]
-    return qtype_name
-
-
 def feed_details(value: FeedDetails) -> FeedDetails:
     """Helper function to convert feed details response from multicall to FeedDetails dataclass"""
     return FeedDetails(*value)
@@ -70,65 +66,123 @@ def parse_feed_data(data: Dict[str, Any]) -> Any:
 
 
 class AutopayCalls:
-    def __init__(self, autopay_contract: Tellor360AutopayContract) -> None:
+    """Tips of a wallet's reports, an instance is one evaluation.
+
+    The wallet's reports are read once per version of the state store, and the windows of
+    eligible timestamps computed once, at the time of the first one needed (see `refresh`).
+    """
+
+    def __init__(self, autopay_contract: Tellor360AutopayContract, state: Optional[JSONifiedState] = None) -> None:
         self.w3 = autopay_contract.node._web3
         self.chain_id = autopay_contract.node.chain_id
         self.wallet = self.w3.toChecksumAddress(autopay_contract.account.address)
         self.autopay_address = autopay_contract.address
         self.chain_name = CHAIN_ID_MAPPING[self.chain_id]["name"]
+        # the wallet's state store, a scanner's can be handed over
+        self.state = state if state is not None else open_state(self.chain_id, self.wallet)
+        self.evaluated_at: Optional[int] = None
+        self._windows: Dict[str, Optional[Dict[str, List[int]]]] = {}
+        self._windows_snapshot: Optional[ReportsSnapshot] = None
+        self._oracle_address: Optional[str] = None
+        self._removed_values_synced = False
+        self._claims_synced = False
+        # timestamps claimed in the ledger by (feed id, query id), of the feeds of this evaluation
+        self._claimed_feed_tips: Dict[Tuple[str, str], Set[int]] = {}
+
+    def refresh(self) -> None:
+        """Start a new evaluation, eligibility windows move to the current time"""
+        self.evaluated_at = None
+        self._windows = {}
+        self._claims_synced = False
+
+    def multicall(self, name: str, calls: List[Call], require_success: bool = True) -> Dict[Any, Any]:
+        """Run `calls` in Multicalls of batches the node can serve, in parallel (see multicall_batches.py),
+        `name` labels their metrics and span
+        """
+        batches = plan_batches(calls)
+        metrics.MULTICALL_CALLS.labels(name).observe(len(calls))
+        metrics.MULTICALL_BATCHES.labels(name).observe(len(batches))
+        with tracing.span("multicall", call=name, calls=len(calls), batches=len(batches)), metrics.observe_seconds(
+            metrics.MULTICALL_SECONDS.labels(name)
+        ):
+            return run_batches(
+                batches,
+                lambda batch: Multicall(calls=batch, _w3=self.w3, require_success=require_success)(),  # type: ignore
+                on_split=metrics.MULTICALL_SPLITS.labels(name).inc,
+            )
 
     @property
     def reports(self) -> Dict[str, Dict[str, Dict[str, Union[int, List[int]]]]]:
-        with open(REPORTS_FILENAME, "r") as f:
-            return json.load(f)
+        with tracing.span("load_reports", chain=self.chain_name):
+            state = JSONifiedState(self.chain_id, self.wallet)
+            state.load()
+        return state.state  # type: ignore
+
+    def snapshot(self) -> ReportsSnapshot:
+        with tracing.span("read_reports", chain=self.chain_name) as span:
+            snapshot = reports_snapshot(self.state)
+            span.set(query_ids=len(snapshot.reports or {}), version=snapshot.version)
+        return snapshot
+
+    def read_reports(self) -> Optional[Dict[str, SortedTimestamps]]:
+        """The wallet's saved reports by query id, shared with other evaluations so not to be modified"""
+        return self.snapshot().reports
+
+    def reports_window(self, name: str) -> Optional[Dict[str, List[int]]]:
+        """Timestamps by query id in the window of tips `name` ("feeds" or "singles") of this evaluation"""
+        snapshot = self.snapshot()
+        if snapshot is not self._windows_snapshot:
+            self._windows = {}
+            self._windows_snapshot = snapshot
+        if self.evaluated_at is None:
+            self.evaluated_at = int(time())
+        if name not in self._windows:
+            if name == "feeds":
+                window = snapshot.between(self.evaluated_at - FOUR_WEEKS, self.evaluated_at - TWELVE_HOURS)
+            elif name == "singles":
+                window = snapshot.before(self.evaluated_at - TWELVE_HOURS)
+            else:
+                raise ValueError(f"Unknown tips window {name}")
+            self._windows[name] = window
+        return self._windows[name]
 
-    def read_reports(self) -> Optional[Dict[str, List[int]]]:
-        reports_by_chain = self.reports.get(self.chain_name)
-        if reports_by_chain is None:
-            logging.info(f"No reports for chain {self.chain_name}")
-            return None
-        reports_by_address = reports_by_chain.get(self.wallet)
-        if reports_by_address is None:
-            logging.info(f"No reports for address {self.wallet}")
-            return None
-        if "last_scanned_block" in reports_by_address:
-            del reports_by_address["last_scanned_block"]
-        if "last_scanned_time" in reports_by_address:
-            del reports_by_address["last_scanned_time"]
-        return reports_by_address  # type: ignore
-
-    def get_query_type(self, query_id: str) -> Optional[str]:
-        """Helper function to get query data from storage contract"""
-        abi = [
-            {
-                "inputs": [{"internalType": "bytes32", "name": "_queryId", "type": "bytes32"}],
-                "name": "getQueryData",
-                "outputs": [{"internalType": "bytes", "name": "_queryData", "type": "bytes"}],
-                "stateMutability": "view",
-                "type": "function",
-            }
+    @property
+    def decoders(self) -> DecoderRegistry:
+        """Value decoders of the chain's query ids"""
+        return decoder_registry(self.chain_id, QUERYDATASTORAGEMAPPING.get(self.chain_id, ""))
+
+    def resolve_query_types(self, query_ids: Iterable[str]) -> None:
+        """Read the query types of the query ids the decoders can't resolve yet, in one multicall"""
+        storage_address = QUERYDATASTORAGEMAPPING.get(self.chain_id)
+        unresolved = self.decoders.unresolved(query_ids)
+        if not unresolved or storage_address is None:
+            return
+        calls = [
+            Call(
+                storage_address,
+                ["getQueryData(bytes32)(bytes)", HexBytes(query_id)],
+                [[query_id, None]],
+            )
+            for query_id in unresolved
         ]
         try:
-            storage_contract = self.w3.eth.contract(address=QUERYDATASTORAGEMAPPING[self.chain_id], abi=abi)
-            query_data = storage_contract.functions.getQueryData(query_id).call()
-            query_type = decode_typ_name(query_data)
+            query_data = self.multicall("query_data", calls, require_success=False)
         except Exception as e:
-            logging.debug(f"Failed to get query type for query id {query_id}: {e}")
-            return None
-        return query_type
+            logging.debug(f"Failed to get query data for query ids {unresolved}: {e}")
+            return
+        self.decoders.record({query_id: query_data.get(query_id) for query_id in unresolved})
+
+    def get_query_type(self, query_id: str) -> Optional[str]:
+        """Helper function to get query data from storage contract"""
+        self.resolve_query_types([query_id])
+        return self.decoders.query_type(query_id)
 
     def decode_value(self, query_id: str, before_value: bytes, after_value: bytes) -> Any:
         """Helper function to decode value from oracle response"""
-        in_catalog = query_catalog.find(query_id=query_id)
-        if not in_catalog:
-            # attempt to get query data from storage contract
-            query_type = self.get_query_type(query_id=query_id)
-            if query_type is None:
-                return None, None
-            in_catalog = query_catalog.find(query_type=query_type)
-        try:
-            decoder = in_catalog[0].query.value_type.decode
-        except IndexError:
+        # query ids of a whole evaluation are resolved at once by `get_valid_timestamps`
+        self.resolve_query_types([query_id])
+        decoder = self.decoders.decoder(query_id)
+        if decoder is None:
             return None, None
         before_val_decoded = decoder(before_value)
         after_val_decoded = decoder(after_value)
@@ -136,6 +190,16 @@ class AutopayCalls:
             return None, None
         return before_val_decoded, after_val_decoded
 
+    def decode_report_values(
+        self, query_id: str, before_values: Dict[Any, bytes], current_values: Dict[Any, bytes], timestamp: int
+    ) -> Tuple[Any, Any]:
+        """Decoded value before and value of a reported timestamp, from the multicall results"""
+        return self.decode_value(
+            query_id,
+            before_values[("before_values", query_id, timestamp)],
+            current_values[("current_values", query_id, timestamp)],
+        )
+
     def feed_ids_call(self) -> Optional[List[Call]]:
         """Assemble feed ids 'Call' object"""
         reports = self.unwanted_timestamps_removed_for_feeds()
@@ -160,7 +224,7 @@ class AutopayCalls:
             logging.info("Unable to construct feed ids call")
             return None
 
-        feeds = Multicall(calls=calls, _w3=self.w3, require_success=True)()
+        feeds = self.multicall("feed_ids", calls)
         feeds = {query_id: feeds[query_id] for query_id in feeds if feeds[query_id]}
         return feeds  # type: ignore
 
@@ -184,45 +248,104 @@ class AutopayCalls:
             logging.warning("No feed ids found in autopay")
             return None
         calls = self.feed_details_call(feed_ids)
-        return Multicall(calls=calls, _w3=self.w3, require_success=True)()
+        return self.multicall("feed_details", calls)
 
     def unwanted_timestamps_removed_for_feeds(self) -> Optional[Dict[str, List[int]]]:
         """Remove timestamps older than 4 weeks and younger than 12 hours since timestamps aren't eligible for tips
         These conditions are specific to feed tips only
         """
-        reports = self.read_reports()
-        if reports is None:
-            return None
-        current_time_seconds = int(time())
-        filtered_reports = {}
-        for query_id in reports:
-            # Filter out timestamps older than 4 weeks
-            filtered_timestamps = [
-                timestamp
-                for timestamp in reports[query_id]
-                if FOUR_WEEKS > (current_time_seconds - timestamp) > TWELVE_HOURS
-            ]
-            if filtered_timestamps:
-                filtered_reports[query_id] = filtered_timestamps
-        return filtered_reports
+        return self.reports_window("feeds")
 
     def unwanted_timestamps_removed_for_singles(self) -> Optional[Dict[str, List[int]]]:
         """Remove timestamps younger than 12 hours since timestamps aren't eligible for tips
         These conditions are specific to OneTimeTips only
         """
-        reports = self.read_reports()
-        if reports is None:
-            return None
-        current_time_seconds = int(time())
-        filtered_reports = {}
-        for query_id in reports:
-            # Filter out timestamps younger than 12 hours
-            filtered_timestamps = [
-                timestamp for timestamp in reports[query_id] if (current_time_seconds - timestamp) > TWELVE_HOURS
+        return self.reports_window("singles")
+
+    def oracle_address(self) -> str:
+        """Address of the oracle the autopay contract reads"""
+        if self._oracle_address is None:
+            abi = [
+                {
+                    "inputs": [],
+                    "name": "tellor",
+                    "outputs": [{"internalType": "address", "name": "", "type": "address"}],
+                    "stateMutability": "view",
+                    "type": "function",
+                }
             ]
-            if filtered_timestamps:
-                filtered_reports[query_id] = filtered_timestamps
-        return filtered_reports
+            autopay = self.w3.eth.contract(address=self.autopay_address, abi=abi)
+            self._oracle_address = autopay.functions.tellor().call()
+        return self._oracle_address  # type: ignore
+
+    def cached_oracle_reads(self, reports: Dict[str, List[int]]) -> Dict[Any, Any]:
+        """Final getDataBefore and retrieveData results of the reports' timestamps, keyed like multicall results"""
+        cache = open_oracle_cache(self.chain_id)
+        if cache is None or not reports:
+            return {}
+        if not self._removed_values_synced:
+            try:
+                cache.sync_removed_values(self.w3, self.oracle_address())
+            except Exception as e:
+                logging.warning(f"Failed to read removed values, not using cached oracle reads: {e}")
+                return {}
+            self._removed_values_synced = True
+        return cache.lookup(reports)
+
+    def store_oracle_reads(self, response: Dict[Any, Any]) -> None:
+        """Cache the final getDataBefore and retrieveData results of a multicall"""
+        cache = open_oracle_cache(self.chain_id)
+        if cache is not None:
+            cache.store(response)
+
+    def claim_ledger(self) -> Optional[ClaimLedger]:
+        """The chain's claim ledger, synced with the wallet's claim events once per evaluation"""
+        ledger = open_claim_ledger(self.chain_id)
+        if ledger is None or self._claims_synced:
+            return ledger
+        self._claims_synced = True
+        try:
+            synced_block = ledger.synced_block(self.autopay_address, self.wallet)
+            if synced_block is None:
+                # feed tips older than the feeds window can't be claimed anymore, nor are they checked
+                resolver = BlockResolver(self.w3, self.chain_id)
+                from_block = resolver.first_block_since(int(time()) - FOUR_WEEKS)
+                resolver.save()
+            else:
+                from_block = synced_block + 1
+            with tracing.span("sync_claims", chain=self.chain_name, from_block=from_block):
+                ledger.sync(self.w3, self.autopay_address, self.wallet, from_block)
+        except Exception as e:
+            logging.warning(f"Failed to read claim events, checking the claims not in the ledger on chain: {e}")
+        return ledger
+
+    def record_claims(self, query_id: str, timestamps: List[int], feed_id: str = ONE_TIME_TIP) -> None:
+        """Record timestamps claimed by our transactions, or found claimed on chain, one-time tips by default"""
+        ledger = open_claim_ledger(self.chain_id)
+        if ledger is not None:
+            ledger.record(self.autopay_address, query_id, timestamps, feed_id=feed_id)
+
+    def without_claimed_feed_tips(
+        self, feed_ids: Dict[str, Any], reports: Dict[str, List[int]]
+    ) -> Dict[str, List[int]]:
+        """Timestamps of the reports not claimed yet in some feed of their query id"""
+        ledger = self.claim_ledger()
+        if ledger is None:
+            return reports
+        self._claimed_feed_tips = {
+            (HexBytes(feed_id).hex(), query_id): ledger.claimed(self.autopay_address, query_id, feed_id)
+            for query_id, feeds in feed_ids.items()
+            for feed_id in feeds
+        }
+        unclaimed: Dict[str, List[int]] = {}
+        for query_id, timestamps in reports.items():
+            claimed = [
+                self._claimed_feed_tips[(HexBytes(feed_id).hex(), query_id)] for feed_id in feed_ids.get(query_id, [])
+            ]
+            left = [timestamp for timestamp in timestamps if any(timestamp not in feed for feed in claimed)]
+            if left:
+                unclaimed[query_id] = left
+        return unclaimed
 
     def get_feed_details_and_before_timestamps_and_before_values(
         self,
@@ -231,21 +354,27 @@ class AutopayCalls:
         reports = self.unwanted_timestamps_removed_for_feeds()
         # get feed ids list for each query id
         feed_ids = self.get_feed_ids()
-        if not feed_ids:
+        if not feed_ids or reports is None:
             logging.info("No feed ids found in autopay")
             return None, None
         # get feed details for each feed id
         feed_details_calls = self.feed_details_call(feed_ids)
-        # get timestamp before and value before
-        timestamps_before_calls = self.timestamps_before_call(reports=reports)
-        value_calls = self.retrieve_data(reports=reports)
-        if not feed_details_calls or not timestamps_before_calls or not value_calls:
+        if not feed_details_calls:
             logging.info("Unable to construct feed details Call")
             return None, None
+        reports = self.without_claimed_feed_tips(feed_ids, reports)
+        if not reports:
+            logging.info("No unclaimed timestamps to check feed tips for")
+            return None, None
+        # get timestamp before and value before, of the timestamps not cached
+        cached = self.cached_oracle_reads(reports)
+        timestamps_before_calls = self.timestamps_before_call(reports=reports, cached=cached) or []
+        value_calls = self.retrieve_data(reports=reports, cached=cached) or []
 
         calls = feed_details_calls + timestamps_before_calls + value_calls
-        response = Multicall(calls=calls, _w3=self.w3, require_success=True)()
-        return response, reports
+        response = self.multicall("feed_values", calls)
+        self.store_oracle_reads(response)
+        return {**cached, **response}, reports
 
     def get_valid_timestamps(self) -> Optional[Dict[Tuple[str, str], List[int]]]:
         """Check only if timestamp is first in window ie priceThreshold == zero"""
@@ -255,53 +384,31 @@ class AutopayCalls:
             return None
 
         before_values, current_values, before_timestamps, feeds = parse_feed_data(data)
+        # values are decoded for price threshold feeds, resolve their decoders at once
+        self.resolve_query_types(query_id for (query_id, _), feed in feeds.items() if feed.priceThreshold > 0)
         claim_params: Dict[Tuple[str, str], List[int]] = {}
-        # check window
-        filtr = FundedFeedFilter()
         for query_id, feed_id in feeds:
-            if feeds[(query_id, feed_id)].balance == 0:
+            feed = feeds[(query_id, feed_id)]
+            if feed.balance == 0:
                 continue
-            for timestamp in reports[query_id]:
-                # check if timestamp in window
-                reward_increase = feeds[(query_id, feed_id)].rewardIncreasePerSecond
-                reward_amount = feeds[(query_id, feed_id)].reward
-                balance = feeds[(query_id, feed_id)].balance
-                first_in_window, time_diff = filtr.is_timestamp_first_in_window(
-                    timestamp_before=before_timestamps[("timestamps", query_id, timestamp)],
-                    timestamp_to_check=timestamp,
-                    feed_start_timestamp=feeds[(query_id, feed_id)].startTime,
-                    feed_window=feeds[(query_id, feed_id)].window,
-                    feed_interval=feeds[(query_id, feed_id)].interval,
-                )
-                # check if reward amount is covered by balance
-                # taking into account reward increase
-                reward_amount += reward_increase * time_diff
-                if balance < reward_amount:
-                    break
-                if first_in_window:
-                    # if timestamp is first in window, add to list of timestamps for (feedId,)
-                    if (feed_id, query_id) not in claim_params:
-                        claim_params[(feed_id, query_id)] = []
-                    claim_params[(feed_id, query_id)].append(timestamp)
-                    # subtract reward amount from balance for next iteration
-                    balance -= reward_amount
-                elif feeds[(query_id, feed_id)].priceThreshold > 0:
-                    before_val = before_values[("before_values", query_id, timestamp)]
-                    current_val = current_values[("current_values", query_id, timestamp)]
-                    decoded_values = self.decode_value(query_id, before_val, current_val)
-                    if decoded_values == (None, None):
-                        continue
-                    price_change = _get_price_change(decoded_values[0], decoded_values[1])
-                    if price_change > feeds[(query_id, feed_id)].priceThreshold:
-                        if (feed_id, query_id) not in claim_params:
-                            claim_params[(feed_id, query_id)] = []
-                        claim_params[(feed_id, query_id)].append(timestamp)
-                        balance -= reward_amount
+            claimed = self._claimed_feed_tips.get((feed_id, query_id), set())
+            timestamps = [timestamp for timestamp in reports.get(query_id, []) if timestamp not in claimed]
+            # window, reward and price threshold checks of the feed's timestamps at once
+            eligible = eligible_timestamps(
+                timestamps,
+                [before_timestamps[("timestamps", query_id, timestamp)] for timestamp in timestamps],
+                feed,
+                partial(self.decode_report_values, query_id, before_values, current_values),
+            )
+            if eligible:
+                claim_params[(feed_id, query_id)] = eligible
 
         return claim_params
 
-    def timestamps_before_call(self, reports: Optional[Dict[str, List[int]]] = None) -> Optional[List[Call]]:
-        """Assemble timestamps before 'Call' object"""
+    def timestamps_before_call(
+        self, reports: Optional[Dict[str, List[int]]] = None, cached: Optional[Dict[Any, Any]] = None
+    ) -> Optional[List[Call]]:
+        """Assemble timestamps before 'Call' object, for the timestamps whose results aren't `cached`"""
         if reports is None:
             reports = self.unwanted_timestamps_removed_for_singles()
             if reports is None:
@@ -315,11 +422,16 @@ class AutopayCalls:
             )
             for query_id, timestamps in reports.items()
             for timestamp in timestamps
+            if not cached
+            or ("before_values", query_id, timestamp) not in cached
+            or ("timestamps", query_id, timestamp) not in cached
         ]
         return calls
 
-    def retrieve_data(self, reports: Optional[Dict[str, List[int]]] = None) -> Optional[List[Call]]:
-        """Assemble timestamps before 'Call' object"""
+    def retrieve_data(
+        self, reports: Optional[Dict[str, List[int]]] = None, cached: Optional[Dict[Any, Any]] = None
+    ) -> Optional[List[Call]]:
+        """Assemble retrieve data 'Call' object, for the timestamps whose values aren't `cached`"""
         if reports is None:
             reports = self.unwanted_timestamps_removed_for_singles()
             if reports is None:
@@ -333,13 +445,14 @@ class AutopayCalls:
             )
             for query_id, timestamps in reports.items()
             for timestamp in timestamps
+            if not cached or ("current_values", query_id, timestamp) not in cached
         ]
         return calls
 
     def get_timestamps_before(self) -> Dict[str, Any]:
         """Get timestamps before"""
         calls = self.timestamps_before_call()
-        return Multicall(calls=calls, _w3=self.w3, require_success=True)()  # type: ignore
+        return self.multicall("timestamps_before", calls)  # type: ignore
 
     def past_tips_call(self, reports: Optional[Dict[str, List[int]]] = None) -> Optional[List[Call]]:
         """Assemble past tips 'Call' object"""
@@ -362,21 +475,35 @@ class AutopayCalls:
     def get_past_tips(self) -> Dict[str, Any]:
         """get past tips from autopay"""
         calls = self.past_tips_call()
-        return Multicall(calls=calls, _w3=self.w3, require_success=True)()  # type: ignore
+        return self.multicall("past_tips", calls)  # type: ignore
 
-    def get_past_tips_and_timestamps_before(self) -> Optional[Dict[PastTipType, Any]]:
-        """get past tips and timestamps before from autopay"""
+    def unclaimed_singles(self) -> Optional[Dict[str, List[int]]]:
+        """Timestamps of the OneTimeTips window whose one-time tips the claim ledger hasn't seen claimed"""
         reports = self.unwanted_timestamps_removed_for_singles()
+        ledger = self.claim_ledger()
+        if reports is None or ledger is None:
+            return reports
+        return ledger.unclaimed_one_time_tips(self.autopay_address, reports)
+
+    def get_past_tips_and_timestamps_before(
+        self, reports: Optional[Dict[str, List[int]]] = None
+    ) -> Optional[Dict[PastTipType, Any]]:
+        """get past tips and timestamps before from autopay, of `reports` or the unclaimed OneTimeTips window"""
         if reports is None:
+            reports = self.unclaimed_singles()
+        if not reports:
             logging.info("No reports to contstruct timestamps before call")
             return None
+        cached = self.cached_oracle_reads(reports)
         past_tips_call = self.past_tips_call(reports)
-        timestamps_before_call = self.timestamps_before_call(reports)
+        timestamps_before_call = self.timestamps_before_call(reports, cached=cached)
         if past_tips_call is None or timestamps_before_call is None:
             logging.info("Unable to construct past tips and timestamps before call")
             return None
         calls = past_tips_call + timestamps_before_call
-        multi_call = Multicall(calls=calls, _w3=self.w3, require_success=True)()
+        multi_call = self.multicall("past_tips_and_timestamps_before", calls)
+        self.store_oracle_reads(multi_call)
+        multi_call = {**cached, **multi_call}
         # remove values from dict since not needed
         return {key: multi_call[key] for key in multi_call if "before_values" not in key}
 
@@ -405,13 +532,17 @@ class AutopayCalls:
         if calls is None or feeds is None:
             logging.info("No reward claimed status call object constructed")
             return None
-        response = Multicall(calls=calls, _w3=self.w3)()
+        response = self.multicall("claimed_status", calls)
         filtered_dict = {}
 
         for key in feeds:
             filtered_timestamps = [timestamp for claimed, timestamp in zip(response[key], feeds[key]) if not claimed]
             if filtered_timestamps:
                 filtered_dict[key] = filtered_timestamps
+            # claimed ones stay claimed, the next checks skip them
+            feed_id, query_id = key
+            claimed_timestamps = [timestamp for claimed, timestamp in zip(response[key], feeds[key]) if claimed]
+            self.record_claims(query_id, claimed_timestamps, feed_id=feed_id)
         return filtered_dict
 
 
@@ -0,0 +1,245 @@
+"""
+Historical backfill of a reporter's NewReport events over a process pool.
+
+The block range is split in partitions, each worker process scans one with its own `EventScanner`
+into a partial state saved in a file of its own (under BACKFILL_DIR), so decoding and state updates use every core.
+Once every partition is scanned the partials are merged into the main state store.
+Every partition has its file from the start, a partition that failed keeps it and running the same backfill
+again only scans what the failed ones miss.
+RPC_LIMITS apply to each worker process on its own.
+"""
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from eth_typing import ChecksumAddress
+from web3 import HTTPProvider
+from web3 import Web3
+from web3.contract import Contract
+from web3.middleware import geth_poa_middleware
+
+from timestamps_tip_scanner.constants import BACKFILL_DIR
+from timestamps_tip_scanner.endpoint_pool import EndpointPool
+from timestamps_tip_scanner.jsonified_state import JSONifiedState
+from timestamps_tip_scanner.jsonified_state import SCAN_METADATA_KEYS
+from timestamps_tip_scanner.sqlite_state import open_state
+from timestamps_tip_scanner.timestamps_scanner import _event_scanner
+from timestamps_tip_scanner.timestamps_scanner import new_report_filters
+
+BlockRange = Tuple[int, int]
+
+
+class PartitionState(JSONifiedState):
+    """Reports of one backfill partition, in a file of its own"""
+
+    def __init__(self, chain_id: int, address: str, path: str) -> None:
+        super().__init__(chain_id=chain_id, address=address)
+        self.freports = path
+
+    def _read_saved(self) -> Any:
+        with open(self.freports, "rt") as f:
+            return json.load(f)
+
+    def reports(self) -> Dict[str, List[int]]:
+        """Report timestamps by query id"""
+        entry = self.state[self.chain_name][self.address]
+        return {
+            query_id: list(timestamps) for query_id, timestamps in entry.items() if query_id not in SCAN_METADATA_KEYS
+        }
+
+
+@dataclass
+class Partition:
+    """What a worker process needs to scan a partition, picklable unlike a Web3 or a contract"""
+
+    chain_id: int
+    node_urls: List[str]
+    contract_address: str
+    abi: List[Dict[str, Any]]
+    reporter: ChecksumAddress
+    query_ids: Optional[List[str]]
+    start_block: int
+    end_block: int
+    path: str
+
+
+def partition(start_block: int, end_block: int, partitions: int) -> List[BlockRange]:
+    """Split a block range in up to `partitions` contiguous ranges of about the same size"""
+    assert start_block <= end_block
+    blocks = end_block - start_block + 1
+    partitions = max(1, min(partitions, blocks))
+    size, extra = divmod(blocks, partitions)
+    ranges = []
+    for i in range(partitions):
+        end = start_block + size + (i < extra) - 1
+        ranges.append((start_block, end))
+        start_block = end + 1
+    return ranges
+
+
+def partition_path(chain_id: int, reporter: str, start_block: int, end_block: int) -> str:
+    return os.path.join(BACKFILL_DIR, f"{chain_id}.{reporter}.{start_block}-{end_block}.json")
+
+
+def saved_partitions(chain_id: int, reporter: str) -> List[BlockRange]:
+    """Block ranges of the partitions a previous backfill of the reporter left, sorted"""
+    prefix = f"{chain_id}.{reporter}."
+    if not os.path.isdir(BACKFILL_DIR):
+        return []
+    ranges = []
+    for name in os.listdir(BACKFILL_DIR):
+        if name.startswith(prefix) and name.endswith(".json"):
+            start_block, end_block = os.path.splitext(name)[0].rsplit(".", 1)[1].split("-")
+            ranges.append((int(start_block), int(end_block)))
+    return sorted(ranges)
+
+
+def partition_state(part: Partition) -> PartitionState:
+    """The partition's partial state, restored if a previous run left one, of nothing scanned otherwise"""
+    state = PartitionState(chain_id=part.chain_id, address=part.reporter, path=part.path)
+    if os.path.isfile(part.path):
+        state.restore()
+    else:
+        state.reset(part.start_block - 1)
+    return state
+
+
+def scan_partition(part: Partition) -> int:
+    """Scan a partition into its partial state (in a worker process), return the events found"""
+    state = partition_state(part)
+    start_block = state.get_last_scanned_block() + 1
+    if start_block > part.end_block:
+        return 0
+
+    w3 = Web3(EndpointPool(part.node_urls))
+    w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+    tellorflex_contract = w3.eth.contract(address=part.contract_address, abi=part.abi)
+    scanner = _event_scanner(
+        w3=w3,
+        state=state,
+        reporter=part.reporter,
+        tellorflex_contract=tellorflex_contract,
+        filters=new_report_filters(tellorflex_contract, part.reporter, part.query_ids),
+    )
+    events, _ = scanner.scan(start_block, part.end_block, start_chunk_size=scanner.max_scan_chunk_size)
+    state.save()
+    return len(events)
+
+
+def node_urls(w3: Web3) -> List[str]:
+    """Urls of the endpoints `w3` requests, for the worker processes to connect to"""
+    provider = w3.provider
+    if isinstance(provider, EndpointPool):
+        return [p.endpoint_uri for p in provider.providers if isinstance(p, HTTPProvider)]  # type: ignore
+    if isinstance(provider, HTTPProvider):
+        return [provider.endpoint_uri]  # type: ignore
+    raise ValueError("Backfill workers need an HTTP endpoint")
+
+
+def merge_partitions(
+    chain_id: int, reporter: ChecksumAddress, parts: List[Partition], start_block: int, end_block: int
+) -> JSONifiedState:
+    """Fold the partial states into the reporter's state and move its last scanned block past them.
+
+    The last scanned block only moves if the scan it resumes reaches into the backfilled range,
+    otherwise the blocks in between would never be scanned.
+    """
+    state = open_state(chain_id=chain_id, address=reporter)
+    try:
+        state.restore()
+    except ValueError:
+        # nothing scanned yet (no block resolver to pick a start), the backfill is the scan
+        state.reset(start_block)
+
+    for part in parts:
+        state.merge_reports(reporter, partition_state(part).reports())
+
+    last_scanned_block = state.get_last_scanned_block()
+    if last_scanned_block >= start_block - 1:
+        state.end_chunk(max(last_scanned_block, end_block))
+    else:
+        logging.warning(
+            f"Reports of blocks {start_block} - {end_block} merged, "
+            f"the scan still resumes from block {last_scanned_block} before them"
+        )
+    state.save()
+    for part in parts:
+        os.remove(part.path)
+    return state
+
+
+def backfill(
+    *,
+    w3: Web3,
+    reporter: ChecksumAddress,
+    tellorflex_contract: Contract,
+    chain_id: int,
+    start_block: int,
+    end_block: Optional[int] = None,
+    partitions: int = 8,
+    processes: Optional[int] = None,
+    query_ids: Optional[List[str]] = None,
+) -> Tuple[Optional[JSONifiedState], List[BlockRange]]:
+    """Scan a block range for the reporter's NewReport events over a process pool, see the module docstring.
+
+    :param end_block: Last block of the backfill, the last final block by default (the following ones
+        are left to a regular scan, which tracks reorgs), or the one of the unfinished backfill from `start_block`
+    :param partitions: Number of block ranges scanned independently
+    :param processes: Worker processes, one per core by default
+    :return: The merged state (None if a partition failed) and the block ranges of the failed partitions
+    """
+    ranges = saved_partitions(chain_id, reporter)
+    if ranges and ranges[0][0] == start_block and end_block in (None, ranges[-1][1]):
+        # partitions of the last run failed, only they are scanned again
+        end_block = ranges[-1][1]
+        logging.info(f"Resuming the backfill of blocks {start_block} - {end_block}")
+    else:
+        if end_block is None:
+            finality_depth = JSONifiedState(chain_id=chain_id, address=reporter).finality_depth
+            end_block = w3.eth.block_number - 1 - finality_depth
+        if start_block > end_block:
+            raise ValueError(f"Nothing to backfill from block {start_block}, the last final block is {end_block}")
+        ranges = partition(start_block, end_block, partitions)
+
+    os.makedirs(BACKFILL_DIR, exist_ok=True)
+    urls = node_urls(w3)
+    parts = [
+        Partition(
+            chain_id=chain_id,
+            node_urls=urls,
+            contract_address=tellorflex_contract.address,
+            abi=tellorflex_contract.abi,
+            reporter=reporter,
+            query_ids=query_ids,
+            start_block=part_start,
+            end_block=part_end,
+            path=partition_path(chain_id, reporter, part_start, part_end),
+        )
+        for part_start, part_end in ranges
+    ]
+    for part in parts:
+        if not os.path.isfile(part.path):
+            # a partition failing before its first save is still listed by saved_partitions
+            partition_state(part).save()
+    logging.info(f"Backfilling blocks {start_block} - {end_block} in {len(parts)} partitions")
+
+    failed: List[BlockRange] = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [(part, executor.submit(scan_partition, part)) for part in parts]
+        for part, future in futures:
+            try:
+                logging.info(f"Partition {part.start_block} - {part.end_block} scanned, {future.result()} new events")
+            except Exception as e:
+                logging.error(f"Partition {part.start_block} - {part.end_block} failed: {e}")
+                failed.append((part.start_block, part.end_block))
+
+    if failed:
+        return None, failed
+    return merge_partitions(chain_id, reporter, parts, start_block, end_block), []
@@ -0,0 +1,114 @@
+"""
+JSON-RPC batch transport, web3.py (v5) sends one HTTP request per call
+so we post the batch payloads ourselves and hand back web3-formatted results.
+"""
+import collections
+import itertools
+import logging
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+import requests
+from web3 import HTTPProvider
+from web3 import Web3
+from web3._utils.method_formatters import filter_params_formatter
+from web3._utils.method_formatters import log_entry_formatter
+from web3.types import FilterParams
+from web3.types import LogReceipt
+
+from timestamps_tip_scanner import metrics
+from timestamps_tip_scanner.endpoint_pool import EndpointPool
+from timestamps_tip_scanner.rate_limiter import limiter_for
+
+
+class BatchRPCError(Exception):
+    """Error returned for a single request of a batch"""
+
+
+RPCRequest = Tuple[str, List[Any]]
+RPCResult = Union[Any, BatchRPCError]
+
+
+class BatchHTTPTransport:
+    """Pack several JSON-RPC requests into one HTTP round-trip.
+
+    Results are returned in request order, a request that failed on the node
+    is returned as a `BatchRPCError` instead of raising, so the caller can retry only that one.
+    """
+
+    def __init__(self, endpoint_uri: str, request_kwargs: Optional[Dict[str, Any]] = None) -> None:
+        self.endpoint_uri = endpoint_uri
+        self.request_kwargs = {"timeout": 30, **(request_kwargs or {})}
+        self.session = requests.Session()
+        self._ids = itertools.count()
+        self.limiter = limiter_for(endpoint_uri)
+
+    @classmethod
+    def from_web3(cls, web3: Web3) -> Optional["BatchHTTPTransport"]:
+        """Transport to the same endpoint as `web3` (the healthiest one of a pool), None if it doesn't talk HTTP"""
+        provider = web3.provider
+        if isinstance(provider, EndpointPool):
+            provider = provider.preferred_provider()
+        if not isinstance(provider, HTTPProvider):
+            return None
+        return cls(provider.endpoint_uri, dict(provider.get_request_kwargs()))  # type: ignore
+
+    def make_batch(self, batch: List[RPCRequest]) -> List[RPCResult]:
+        if not batch:
+            return []
+        for method, count in collections.Counter(method for method, _ in batch).items():
+            self.limiter.acquire(method, count)
+        ids = [next(self._ids) for _ in batch]
+        payload = [
+            {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+            for request_id, (method, params) in zip(ids, batch)
+        ]
+        logging.debug("Sending JSON-RPC batch of %d requests", len(payload))
+        endpoint = metrics.endpoint_label(self.endpoint_uri)
+        try:
+            with metrics.observe_seconds(metrics.RPC_LATENCY.labels(endpoint, "batch")):
+                response = self.session.post(self.endpoint_uri, json=payload, **self.request_kwargs)
+        except Exception:
+            metrics.RPC_ERRORS.labels(endpoint, "batch").inc()
+            raise
+        if response.status_code == 429:
+            self.limiter.record_throttled()
+        response.raise_for_status()
+        body = response.json()
+        if not isinstance(body, list):
+            # some nodes answer a whole batch with a single error object
+            raise BatchRPCError(body.get("error", body) if isinstance(body, dict) else body)
+
+        by_id = {item.get("id"): item for item in body}
+        results: List[RPCResult] = []
+        for request_id in ids:
+            item = by_id.get(request_id)
+            if item is None:
+                results.append(BatchRPCError(f"missing response for request {request_id}"))
+            elif "error" in item:
+                metrics.RPC_ERRORS.labels(endpoint, "batch").inc()
+                results.append(BatchRPCError(item["error"]))
+            else:
+                results.append(item.get("result"))
+        return results
+
+
+def get_logs_request(filter_params: FilterParams) -> RPCRequest:
+    return "eth_getLogs", [filter_params_formatter(filter_params)]
+
+
+def block_number_request() -> RPCRequest:
+    return "eth_blockNumber", []
+
+
+def format_logs(result: List[Dict[str, Any]]) -> List[LogReceipt]:
+    """Apply the same result formatting web3 does for `eth.get_logs`"""
+    return [log_entry_formatter(log) for log in result]
+
+
+def format_block_number(result: str) -> int:
+    return int(result, 16)
@@ -0,0 +1,155 @@
+"""
+Block number by timestamp, resolved over the node instead of a block explorer API.
+
+Blocks found on the way are kept as (block number -> timestamp) anchors in a file,
+so the next lookups start from a narrow bracket and take one or two `eth_getBlockByNumber` calls.
+The anchors are capped at BLOCK_ANCHORS_MAX per chain, see `prune_anchors`.
+"""
+import json
+import logging
+import os
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from web3 import Web3
+
+from timestamps_tip_scanner.constants import BLOCK_ANCHORS_FILENAME
+from timestamps_tip_scanner.constants import BLOCK_ANCHORS_MAX
+from timestamps_tip_scanner.constants import BLOCK_ANCHORS_RECENT
+
+Anchor = Tuple[int, int]
+
+
+def prune_anchors(anchors: Dict[int, int], max_anchors: int, recent: int) -> Dict[int, int]:
+    """At most `max_anchors` of the anchors: the `recent` latest blocks, lookups are mostly of the last weeks,
+    and one anchor per equal span of the blocks before them, so any lookup still starts from a narrow bracket"""
+    if len(anchors) <= max_anchors:
+        return anchors
+    recent = min(recent, max_anchors - 1)
+    blocks = sorted(anchors)
+    split = len(blocks) - recent
+    older, latest = blocks[:split], blocks[split:]
+    span = (older[-1] - older[0]) // (max_anchors - recent) + 1
+    spaced: Dict[int, int] = {}
+    for block in older:
+        spaced.setdefault((block - older[0]) // span, block)
+    return {block: anchors[block] for block in [*spaced.values(), *latest]}
+
+
+class BlockResolver:
+    """Find the last block mined at or before a timestamp.
+
+    The search interpolates the block from the timestamps of the blocks bracketing the target
+    (i.e. assumes a steady block time in between) and falls back to bisecting the bracket
+    when the guess doesn't narrow it enough.
+    """
+
+    def __init__(self, web3: Web3, chain_id: int, anchors_file: Optional[str] = BLOCK_ANCHORS_FILENAME) -> None:
+        """
+        :param web3: Node to read block timestamps from
+        :param chain_id: Chain the anchors are saved under
+        :param anchors_file: JSON file keeping anchors between runs, None to keep them in memory only
+        """
+        self.web3 = web3
+        self.chain_id = chain_id
+        self.anchors_file = anchors_file
+        self.anchors: Dict[int, int] = self._load_anchors()
+        self.rpc_calls = 0
+
+    def block_timestamp(self, block_number: int) -> int:
+        if block_number not in self.anchors:
+            self.rpc_calls += 1
+            self.anchors[block_number] = int(self.web3.eth.get_block(block_number)["timestamp"])
+        return self.anchors[block_number]
+
+    def block_at(self, timestamp: int) -> int:
+        """Number of the last block with a timestamp at or before `timestamp` (0 if before genesis)"""
+        known: List[Anchor] = sorted(self.anchors.items())
+        i = bisect_right([anchor_timestamp for _, anchor_timestamp in known], timestamp)
+        low = known[i - 1] if i > 0 else (0, self.block_timestamp(0))
+        high = known[i] if i < len(known) else None
+        if high is None:
+            head = self.web3.eth.block_number
+            self.rpc_calls += 1
+            high = (head, self.block_timestamp(head))
+            if high[1] <= timestamp:
+                return head
+        if low[1] > timestamp:
+            return 0
+
+        while high[0] - low[0] > 1:
+            span = high[0] - low[0]
+            # Interpolate assuming a steady block time between the bracketing blocks
+            guess = low[0] + (timestamp - low[1]) * span // max(1, high[1] - low[1])
+            guess = min(max(guess, low[0] + 1), high[0] - 1)
+            guess_timestamp = self.block_timestamp(guess)
+            if guess_timestamp <= timestamp:
+                low = (guess, guess_timestamp)
+            else:
+                high = (guess, guess_timestamp)
+            if high[0] - low[0] > span // 2:
+                # the block time wasn't steady, halve the bracket instead
+                middle = (low[0] + high[0]) // 2
+                if low[0] < middle < high[0]:
+                    middle_timestamp = self.block_timestamp(middle)
+                    if middle_timestamp <= timestamp:
+                        low = (middle, middle_timestamp)
+                    else:
+                        high = (middle, middle_timestamp)
+
+        logging.debug(f"Resolved timestamp {timestamp} to block {low[0]}, {self.rpc_calls} RPC calls so far")
+        self.save()
+        return low[0]
+
+    def first_block_since(self, timestamp: int) -> int:
+        """Number of the first block with a timestamp at or after `timestamp`"""
+        return self.block_at(timestamp - 1) + 1
+
+    def _load_anchors(self) -> Dict[int, int]:
+        if self.anchors_file is None:
+            return {}
+        try:
+            with open(self.anchors_file, "r") as f:
+                saved = json.load(f) or {}
+        except (IOError, json.decoder.JSONDecodeError):
+            return {}
+        return {int(block): int(timestamp) for block, timestamp in saved.get(str(self.chain_id), {}).items()}
+
+    def save(self) -> None:
+        """Merge our anchors into the anchors file, written atomically like the reports state, both pruned"""
+        if self.anchors_file is None:
+            self.anchors = prune_anchors(self.anchors, BLOCK_ANCHORS_MAX, BLOCK_ANCHORS_RECENT)
+            return
+        try:
+            with open(self.anchors_file, "r") as f:
+                saved = json.load(f) or {}
+        except (IOError, json.decoder.JSONDecodeError):
+            saved = {}
+        chain_anchors = {int(block): int(timestamp) for block, timestamp in saved.get(str(self.chain_id), {}).items()}
+        chain_anchors.update(self.anchors)
+        self.anchors = prune_anchors(chain_anchors, BLOCK_ANCHORS_MAX, BLOCK_ANCHORS_RECENT)
+        saved[str(self.chain_id)] = {str(block): timestamp for block, timestamp in self.anchors.items()}
+
+        tmp_file = f"{self.anchors_file}.{os.getpid()}.{id(self)}.tmp"
+        with open(tmp_file, "wt") as f:
+            json.dump(saved, f)
+        os.replace(tmp_file, self.anchors_file)
+
+
+def start_of_today() -> int:
+    """Timestamp of midnight today, local time"""
+    return int(datetime.today().replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+
+def parse_timestamp(value: str) -> int:
+    """A unix timestamp, or an ISO date/datetime (local time unless it has an offset)"""
+    if value.isdigit():
+        return int(value)
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        raise ValueError(f"Not a unix timestamp or an ISO date: {value}") from None
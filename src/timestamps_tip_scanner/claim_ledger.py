@@ -0,0 +1,205 @@
+"""
+On-disk ledger of the feed tips and one-time tips claimed for reported timestamps.
+
+A claimed timestamp can't become unclaimed, so tips checks skip the timestamps of the ledger
+before building their calls, only the few unclaimed ones are checked against the autopay contract.
+The ledger is filled from the receipts of our claims, the claimed status the checks read, and the
+`TipClaimed` / `OneTimeTipClaimed` events of a reporter (claims made by another instance or by hand).
+
+The events don't carry the timestamps claimed, they are decoded from the input of the claim transactions.
+Claims are keyed by autopay contract, feed id ("" for one-time tips), query id and timestamp.
+"""
+import logging
+import sqlite3
+import threading
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from eth_abi import decode_abi
+from hexbytes import HexBytes
+from web3 import Web3
+
+from timestamps_tip_scanner.constants import CLAIM_LEDGER
+from timestamps_tip_scanner.retry_policy import RetryPolicy
+
+TIP_CLAIMED_TOPIC = Web3.keccak(text="TipClaimed(bytes32,bytes32,uint256,address)").hex()
+ONE_TIME_TIP_CLAIMED_TOPIC = Web3.keccak(text="OneTimeTipClaimed(bytes32,uint256,address)").hex()
+CLAIM_TIP_SELECTOR = Web3.keccak(text="claimTip(bytes32,bytes32,uint256[])")[:4]
+CLAIM_ONE_TIME_TIP_SELECTOR = Web3.keccak(text="claimOneTimeTip(bytes32,uint256[])")[:4]
+# feed id of the one-time tips claims
+ONE_TIME_TIP = ""
+
+# (feed id, query id) -> timestamps
+FeedTimestamps = Dict[Tuple[str, str], List[int]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS claims (
+    chain_id INTEGER NOT NULL,
+    autopay TEXT NOT NULL,
+    query_id TEXT NOT NULL,
+    feed_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (chain_id, autopay, query_id, feed_id, timestamp)
+) WITHOUT ROWID;
+
+-- last block of a reporter's claim events read
+CREATE TABLE IF NOT EXISTS claims_synced (
+    chain_id INTEGER NOT NULL,
+    autopay TEXT NOT NULL,
+    reporter TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    PRIMARY KEY (chain_id, autopay, reporter)
+);
+"""
+
+
+def _hex(value: Any) -> str:
+    """Lower case 0x prefixed hex of a bytes32, as bytes or hex string"""
+    return HexBytes(value).hex().lower()
+
+
+def _topic(address: str) -> str:
+    return "0x" + address.lower().replace("0x", "").rjust(64, "0")
+
+
+def _claimant(log: Any) -> str:
+    """Lower case reporter of a TipClaimed log, its only non-indexed argument"""
+    (reporter,) = decode_abi(["address"], HexBytes(log["data"]))
+    return str(reporter).lower()
+
+
+class ClaimLedger:
+    """Claimed tips of a chain in a SQLite file"""
+
+    def __init__(self, path: str, chain_id: int) -> None:
+        self.path = path
+        self.chain_id = chain_id
+        # shared by the API's worker threads
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def claimed(self, autopay: str, query_id: str, feed_id: str = ONE_TIME_TIP) -> Set[int]:
+        """Timestamps of the query id claimed for the feed (one-time tips by default)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT timestamp FROM claims WHERE chain_id = ? AND autopay = ? AND query_id = ? AND feed_id = ?",
+                (self.chain_id, autopay.lower(), _hex(query_id), _hex(feed_id) if feed_id else ONE_TIME_TIP),
+            )
+            return {timestamp for timestamp, in rows}
+
+    def unclaimed_feed_tips(self, autopay: str, feeds: FeedTimestamps) -> FeedTimestamps:
+        """`feeds` without the timestamps claimed, feeds left without any are left out"""
+        unclaimed: FeedTimestamps = {}
+        for (feed_id, query_id), timestamps in feeds.items():
+            claimed = self.claimed(autopay, query_id, feed_id)
+            left = [timestamp for timestamp in timestamps if timestamp not in claimed]
+            if left:
+                unclaimed[(feed_id, query_id)] = left
+        return unclaimed
+
+    def unclaimed_one_time_tips(self, autopay: str, reports: Dict[str, List[int]]) -> Dict[str, List[int]]:
+        """`reports` without the timestamps whose one-time tips were claimed, query ids without any left out"""
+        unclaimed: Dict[str, List[int]] = {}
+        for query_id, timestamps in reports.items():
+            claimed = self.claimed(autopay, query_id)
+            left = [timestamp for timestamp in timestamps if timestamp not in claimed]
+            if left:
+                unclaimed[query_id] = left
+        return unclaimed
+
+    def record(self, autopay: str, query_id: str, timestamps: Iterable[int], feed_id: str = ONE_TIME_TIP) -> None:
+        """Record claimed timestamps of the query id, of a feed's tips or of its one-time tips"""
+        feed = _hex(feed_id) if feed_id else ONE_TIME_TIP
+        rows = [(self.chain_id, autopay.lower(), _hex(query_id), feed, int(timestamp)) for timestamp in timestamps]
+        if not rows:
+            return
+        with self.lock:
+            self.conn.executemany("INSERT OR IGNORE INTO claims VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.commit()
+
+    def synced_block(self, autopay: str, reporter: str) -> Optional[int]:
+        """Last block of the reporter's claim events read, None if never synced"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT block_number FROM claims_synced WHERE chain_id = ? AND autopay = ? AND reporter = ?",
+                (self.chain_id, autopay.lower(), reporter.lower()),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def sync(self, w3: Web3, autopay: str, reporter: str, from_block: int) -> None:
+        """Record the claims of the reporter's claim events from `from_block` to the head"""
+        head = w3.eth.block_number
+        if from_block <= head:
+            address = Web3.toChecksumAddress(autopay)
+            reporter_topic = _topic(reporter)
+            policy = RetryPolicy()
+
+            def claim_logs(topics: List[Optional[str]]) -> Any:
+                return policy.fetch(
+                    lambda start, end: w3.eth.get_logs(
+                        {"address": address, "topics": topics, "fromBlock": start, "toBlock": end}  # type: ignore
+                    ),
+                    from_block,
+                    head,
+                )
+
+            # OneTimeTipClaimed indexes the reporter, TipClaimed only has it in its data
+            tip_claims = [log for log in claim_logs([TIP_CLAIMED_TOPIC]) if _claimant(log) == reporter.lower()]
+            logs = tip_claims + claim_logs([ONE_TIME_TIP_CLAIMED_TOPIC, None, None, reporter_topic])
+            for tx_hash in dict.fromkeys(HexBytes(log["transactionHash"]) for log in logs):
+                self.record_transaction(autopay, HexBytes(w3.eth.get_transaction(tx_hash)["input"]))
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO claims_synced VALUES (?, ?, ?, ?)",
+                (self.chain_id, autopay.lower(), reporter.lower(), head),
+            )
+            self.conn.commit()
+
+    def record_transaction(self, autopay: str, tx_input: bytes) -> None:
+        """Record the claims of a claimTip or claimOneTimeTip transaction's input"""
+        selector, args = tx_input[:4], tx_input[4:]
+        try:
+            if selector == CLAIM_TIP_SELECTOR:
+                feed_id, query_id, timestamps = decode_abi(["bytes32", "bytes32", "uint256[]"], args)
+                self.record(autopay, query_id, timestamps, feed_id=feed_id)
+            elif selector == CLAIM_ONE_TIME_TIP_SELECTOR:
+                query_id, timestamps = decode_abi(["bytes32", "uint256[]"], args)
+                self.record(autopay, query_id, timestamps)
+            else:
+                # claimed through another contract, its claims are checked on chain
+                logging.debug(f"Not a claim transaction input: {HexBytes(tx_input[:4]).hex()}")
+        except Exception as e:
+            logging.debug(f"Failed to decode claim transaction input: {e}")
+
+    def clear(self) -> None:
+        with self.lock:
+            for table in ("claims", "claims_synced"):
+                self.conn.execute(f"DELETE FROM {table}")
+            self.conn.commit()
+
+
+_ledgers: Dict[int, ClaimLedger] = {}
+_ledgers_lock = threading.Lock()
+
+
+def open_claim_ledger(chain_id: int) -> Optional[ClaimLedger]:
+    """The process wide claim ledger of a chain in the CLAIM_LEDGER file, None if the ledger is disabled"""
+    if not CLAIM_LEDGER:
+        return None
+    with _ledgers_lock:
+        if chain_id not in _ledgers:
+            _ledgers[chain_id] = ClaimLedger(CLAIM_LEDGER, chain_id)
+        return _ledgers[chain_id]
+
+
+def clear_claim_ledgers() -> None:
+    with _ledgers_lock:
+        for ledger in _ledgers.values():
+            ledger.clear()
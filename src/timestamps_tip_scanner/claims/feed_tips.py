@@ -3,6 +3,8 @@ import logging
 import click
 from telliot_core.tellor.tellor360.autopay import Tellor360AutopayContract
 
+from timestamps_tip_scanner import metrics
+from timestamps_tip_scanner import tracing
 from timestamps_tip_scanner.autopay_calls import AutopayCalls
 from timestamps_tip_scanner.utils import gas_estimate
 
@@ -33,8 +35,13 @@ def claim_tips(autopay_contract: Tellor360AutopayContract) -> None:
             }
         )
         signed_tx = account.sign_transaction(tx)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+        with tracing.span("claim_tip", feed_id=feed_id, query_id=query_id, timestamps=len(timestamps)) as span:
+            tx_hash = w3.eth.send_raw_transaction(signed_tx.rawTransaction)
+            with metrics.observe_seconds(metrics.CLAIM_CONFIRMATION_SECONDS.labels("feed")):
+                receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+            span.set(tx_hash=tx_hash.hex(), status=receipt["status"], gas_used=receipt["gasUsed"])
+        if receipt["status"] == 1:
+            autopay.record_claims(query_id, timestamps, feed_id=feed_id)
         logger.info(f"Claimed tip for {feed_id}-{query_id} and {timestamps}")
         click.echo(f"Tx hash: {tx_hash.hex()}")
         logging.info(f"{account.address} claim transaction status: {receipt['status']}")
@@ -5,17 +5,19 @@ from typing import Optional
 
 from telliot_core.tellor.tellor360.autopay import Tellor360AutopayContract
 
+from timestamps_tip_scanner import metrics
+from timestamps_tip_scanner import tracing
 from timestamps_tip_scanner.autopay_calls import AutopayCalls
 from timestamps_tip_scanner.utils import gas_estimate
 from timestamps_tip_scanner.utils import one_time_tips
 
 
 def timestamps_to_claim(apay: AutopayCalls) -> Optional[List[Dict[str, List[int]]]]:
-    reports_dict = apay.unwanted_timestamps_removed_for_singles()
+    reports_dict = apay.unclaimed_singles()
     if reports_dict is None:
         logging.info("No reports found to check tips for")
         return None
-    dic = apay.get_past_tips_and_timestamps_before()
+    dic = apay.get_past_tips_and_timestamps_before(reports_dict)
     if dic is None:
         logging.info("No past tips found to check timestamps for")
         return None
@@ -37,7 +39,8 @@ def claim_single_tips(tellor_autopay: Tellor360AutopayContract) -> None:
     """Claim tips for eligible OneTimeTips in Autopay contract"""
     account = tellor_autopay.account.local_account
     w3 = tellor_autopay.node._web3
-    tip_eligible_reports = timestamps_to_claim(AutopayCalls(tellor_autopay))
+    apay = AutopayCalls(tellor_autopay)
+    tip_eligible_reports = timestamps_to_claim(apay)
     if not tip_eligible_reports:
         logging.info(f"No eligible timestamps to claim for {account.address}")
         return None
@@ -56,8 +59,13 @@ def claim_single_tips(tellor_autopay: Tellor360AutopayContract) -> None:
                 }
             )
             signed_tx = account.sign_transaction(tx)
-            tx_hash = w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-            receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+            with tracing.span("claim_one_time_tip", query_id=query_id, timestamps=len(timestamps)) as span:
+                tx_hash = w3.eth.send_raw_transaction(signed_tx.rawTransaction)
+                with metrics.observe_seconds(metrics.CLAIM_CONFIRMATION_SECONDS.labels("one_time")):
+                    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+                span.set(tx_hash=tx_hash.hex(), status=receipt["status"], gas_used=receipt["gasUsed"])
+            if receipt["status"] == 1:
+                apay.record_claims(query_id, timestamps)
             logging.info(f"Claimed tip for {query_id} and {timestamps}")
             logging.info(f"Tx hash: {tx_hash.hex()}")
             logging.info(f"{account.address} claim transaction status: {receipt['status']}")
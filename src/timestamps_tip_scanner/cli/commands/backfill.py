@@ -0,0 +1,84 @@
+from typing import Optional
+from typing import Tuple
+
+import click
+from eth_utils.typing import ChecksumAddress
+from telliot_core.apps.telliot_config import TelliotConfig
+
+from timestamps_tip_scanner.backfill import backfill as backfill_partitions
+from timestamps_tip_scanner.block_resolver import BlockResolver
+from timestamps_tip_scanner.cli.utils import connect_tellorflex
+from timestamps_tip_scanner.cli.utils import parse_since
+from timestamps_tip_scanner.cli.utils import reporter_address
+
+
+cfg = TelliotConfig()
+
+
+@click.command()
+@click.argument("chain_id", type=int)
+@click.option("--account", "-a", help="Account name, required if address not selected")
+@click.option("--address", "-addy", help="wallet address, required if account not selected")
+@click.option("--start-block", "-sb", type=int, default=None, help="first block of the backfill.")
+@click.option(
+    "--since", "-s", callback=parse_since, help="backfill from this time, a unix timestamp or an ISO date (2023-05-01)."
+)
+@click.option("--end-block", "-eb", type=int, default=None, help="last block of the backfill.")
+@click.option("--partitions", "-p", type=int, default=8, help="block ranges scanned independently.")
+@click.option("--processes", "-np", type=int, default=None, help="worker processes, one per core by default.")
+@click.option("--query-id", "-qid", "query_ids", multiple=True, help="only scan reports for this query id (repeatable)")
+def backfill(
+    chain_id: int,
+    account: str,
+    address: ChecksumAddress,
+    start_block: Optional[int],
+    since: Optional[int],
+    end_block: Optional[int],
+    partitions: int,
+    processes: Optional[int],
+    query_ids: Tuple[str, ...],
+) -> None:
+    """
+    Scan a long block range over a process pool and merge it into the saved state
+
+    CHAIN ID: desired chain to scan
+
+    ACCOUNT: chained account name to use
+
+    ADDRESS: wallet address
+
+    START BLOCK: first block of the backfill
+
+    SINCE: time to backfill from, resolved to a block over the node (ignored with START BLOCK)
+
+    END BLOCK: last block of the backfill, the last final block by default
+
+    PARTITIONS: the block range is split in this many partitions, failed ones are scanned again by rerunning
+
+    PROCESSES: worker processes scanning the partitions
+
+    QUERY ID: restrict the scan to these query ids
+    """
+    reporter = reporter_address(account, address)
+    w3, tellorflex_contract = connect_tellorflex(cfg, chain_id)
+    if start_block is None:
+        if since is None:
+            raise click.BadOptionUsage(option_name="start-block/since", message="start block or since required")
+        start_block = BlockResolver(w3, chain_id).first_block_since(since)
+
+    state, failed = backfill_partitions(
+        w3=w3,
+        reporter=reporter,
+        tellorflex_contract=tellorflex_contract,
+        chain_id=chain_id,
+        start_block=start_block,
+        end_block=end_block,
+        partitions=partitions,
+        processes=processes,
+        query_ids=list(query_ids),
+    )
+    if state is None:
+        for failed_start, failed_end in failed:
+            click.echo(f"Partition {failed_start} - {failed_end} failed")
+        raise click.ClickException(f"Rerun the backfill from block {start_block} to scan the failed partitions again")
+    click.echo(f"Backfilled, the scan resumes from block {state.get_last_scanned_block()}")
@@ -8,6 +8,7 @@ from telliot_core.tellor.tellor360.autopay import Tellor360AutopayContract
 from telliot_core.utils.key_helpers import lazy_unlock_account
 
 from timestamps_tip_scanner.claims.feed_tips import claim_tips
+from timestamps_tip_scanner.endpoint_pool import pool_endpoints
 
 cfg = TelliotConfig()
 
@@ -51,8 +52,8 @@ def claim_tip(chain_id: int, account: str, private_key: str) -> None:
         click.echo(f"No endpoints found for chain id: {chain_id}")
         raise click.BadOptionUsage(option_name="chain_id", message="chain id not found")
 
-    endpoint = endpoints[0]
-    if not endpoint.connect():
+    endpoint = pool_endpoints(endpoints)
+    if endpoint is None:
         raise click.BadArgumentUsage(
             f"Could not connect to endpoint for {chain_id}\n"
             "Please check your ~/telliot/endpoints.yaml file and try again"
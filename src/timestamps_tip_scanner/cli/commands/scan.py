@@ -1,13 +1,14 @@
 # import asyncio
 from typing import Optional
+from typing import Tuple
 
 import click
-from chained_accounts import find_accounts
-from eth_utils import to_checksum_address
 from eth_utils.typing import ChecksumAddress
 from telliot_core.apps.telliot_config import TelliotConfig
-from telliot_core.directory import contract_directory
 
+from timestamps_tip_scanner.cli.utils import connect_tellorflex
+from timestamps_tip_scanner.cli.utils import parse_since
+from timestamps_tip_scanner.cli.utils import reporter_address
 from timestamps_tip_scanner.timestamps_scanner import run
 
 
@@ -19,7 +20,22 @@ cfg = TelliotConfig()
 @click.option("--account", "-a", help="Account name, required if address not selected")
 @click.option("--start-block", "-sb", type=int, default=None, help="block num to start scanning from.")
 @click.option("--address", "-addy", help="wallet address, required if account not selected")
-def scan(chain_id: int, account: str, address: ChecksumAddress, start_block: Optional[int]) -> None:
+@click.option(
+    "--since", "-s", callback=parse_since, help="scan from this time, a unix timestamp or an ISO date (2023-05-01)."
+)
+@click.option("--query-id", "-qid", "query_ids", multiple=True, help="only scan reports for this query id (repeatable)")
+@click.option("--workers", "-w", type=int, default=None, help="concurrent getLogs requests for backfills.")
+@click.option("--batch-size", "-bs", type=int, default=None, help="getLogs chunks per JSON-RPC batch request.")
+def scan(
+    chain_id: int,
+    account: str,
+    address: ChecksumAddress,
+    start_block: Optional[int],
+    since: Optional[int],
+    query_ids: Tuple[str, ...],
+    workers: Optional[int],
+    batch_size: Optional[int],
+) -> None:
     """
     CHAIN ID: desired chain to scan
 
@@ -28,52 +44,26 @@ def scan(chain_id: int, account: str, address: ChecksumAddress, start_block: Opt
     ADDRESS: wallet address
 
     START BLOCK: block num to start scanning from.
-    """
-    if not address and not account:
-        raise click.BadOptionUsage(option_name="address/account", message="address or account name required")
-
-    if account and address:
-        raise click.BadOptionUsage(
-            option_name="address/account",
-            message="address and account name cannot be used together, please select one or the other",
-        )
-
-    if address:
-        address = to_checksum_address(address)
-
-    if account:
-        accounts = find_accounts(account)
-        if not accounts:
-            click.echo(
-                f"No account found named: '{account}'.\n"
-                "Either use -addy flag or add one with the account subcommand.\n"
-                "For more info run: `telliot account add --help`"
-            )
-            raise click.BadOptionUsage(option_name="address/account", message="address or account name required")
-        address = to_checksum_address(accounts[0].address)
 
-    cfg.main.chain_id = chain_id
+    SINCE: time to start scanning from, resolved to a block over the node (ignored with START BLOCK)
 
-    endpoints = cfg.endpoints.find(chain_id=chain_id)
-    if not endpoints:
-        raise click.BadArgumentUsage(message="No endpoints found for chain-id")
-    endpoint = endpoints[0]
-    if not endpoint.connect():
-        raise click.BadArgumentUsage(
-            f"Could not connect to endpoint for {chain_id}\n"
-            "Please check your ~/telliot/endpoints.yaml file and try again"
-        )
+    QUERY ID: restrict the scan to these query ids
 
-    w3 = endpoint._web3
+    WORKERS: fetch block ranges concurrently (defaults to SCAN_WORKERS env or 1)
 
-    contract_info = contract_directory.find(chain_id=chain_id, name="tellor360-oracle")
-    if not contract_info:
-        raise click.BadArgumentUsage(
-            f"Tellorflex not found in telliot on chain_id {chain_id}\nCheck supported tellor chain ids"
-        )
-
-    tellorflex_address = contract_info[0].address[chain_id]
-    abi = contract_info[0].get_abi(chain_id=chain_id)
-    tellorflex_contract = w3.eth.contract(address=tellorflex_address, abi=abi)
-
-    run(w3=w3, reporter=address, tellorflex_contract=tellorflex_contract, chain_id=chain_id, starting_block=start_block)
+    BATCH SIZE: chunks sent per JSON-RPC batch request (defaults to RPC_BATCH_SIZE env or 1)
+    """
+    reporter = reporter_address(account, address)
+    w3, tellorflex_contract = connect_tellorflex(cfg, chain_id)
+
+    run(
+        w3=w3,
+        reporter=reporter,
+        tellorflex_contract=tellorflex_contract,
+        chain_id=chain_id,
+        starting_block=start_block,
+        query_ids=list(query_ids),
+        since=since,
+        workers=workers,
+        batch_size=batch_size,
+    )
@@ -0,0 +1,57 @@
+from typing import Optional
+from typing import Tuple
+
+import click
+from eth_utils.typing import ChecksumAddress
+from telliot_core.apps.telliot_config import TelliotConfig
+
+from timestamps_tip_scanner.cli.utils import connect_tellorflex
+from timestamps_tip_scanner.cli.utils import parse_since
+from timestamps_tip_scanner.cli.utils import reporter_address
+from timestamps_tip_scanner.multi_chain import scan_chains as scan_all_chains
+
+
+cfg = TelliotConfig()
+
+
+@click.command(name="scan-chains")
+@click.argument("chain_ids", type=int, nargs=-1, required=True)
+@click.option("--account", "-a", help="Account name, required if address not selected")
+@click.option("--address", "-addy", help="wallet address, required if account not selected")
+@click.option(
+    "--since", "-s", callback=parse_since, help="scan from this time, a unix timestamp or an ISO date (2023-05-01)."
+)
+@click.option("--query-id", "-qid", "query_ids", multiple=True, help="only scan reports for this query id (repeatable)")
+@click.option("--workers", "-w", type=int, default=4, help="concurrent getLogs requests over all chains.")
+def scan_chains(
+    chain_ids: Tuple[int, ...],
+    account: str,
+    address: ChecksumAddress,
+    since: Optional[int],
+    query_ids: Tuple[str, ...],
+    workers: int,
+) -> None:
+    """
+    Scan several chains at once, each chain resumes from its saved state
+
+    CHAIN IDS: desired chains to scan
+
+    ACCOUNT: chained account name to use
+
+    ADDRESS: wallet address
+
+    SINCE: time to start scanning from, resolved to a block on each chain over its node
+
+    QUERY ID: restrict the scan to these query ids
+
+    WORKERS: getLogs requests in flight, shared by all the chains
+    """
+    reporter = reporter_address(account, address)
+    chains = {chain_id: connect_tellorflex(cfg, chain_id) for chain_id in dict.fromkeys(chain_ids)}
+
+    states = scan_all_chains(chains, reporter=reporter, workers=workers, since=since, query_ids=list(query_ids))
+    for chain_id in chains:
+        if chain_id in states:
+            click.echo(f"Chain {chain_id}: scanned up to block {states[chain_id].get_last_scanned_block()}")
+        else:
+            click.echo(f"Chain {chain_id}: scan failed, see the logs")
@@ -0,0 +1,62 @@
+from typing import Optional
+from typing import Tuple
+
+import click
+from eth_utils import to_checksum_address
+from telliot_core.apps.telliot_config import TelliotConfig
+
+from timestamps_tip_scanner.cli.utils import connect_tellorflex
+from timestamps_tip_scanner.cli.utils import parse_since
+from timestamps_tip_scanner.timestamps_scanner import run_shared
+
+
+cfg = TelliotConfig()
+
+
+@click.command(name="scan-shared")
+@click.argument("chain_id", type=int)
+@click.option(
+    "--reporter", "-r", "reporters", multiple=True, help="reporter address to index (repeatable), all if none"
+)
+@click.option("--start-block", "-sb", type=int, default=None, help="block num to start scanning from.")
+@click.option(
+    "--since", "-s", callback=parse_since, help="scan from this time, a unix timestamp or an ISO date (2023-05-01)."
+)
+@click.option("--workers", "-w", type=int, default=None, help="concurrent getLogs requests for backfills.")
+@click.option("--batch-size", "-bs", type=int, default=None, help="getLogs chunks per JSON-RPC batch request.")
+def scan_shared(
+    chain_id: int,
+    reporters: Tuple[str, ...],
+    start_block: Optional[int],
+    since: Optional[int],
+    workers: Optional[int],
+    batch_size: Optional[int],
+) -> None:
+    """
+    Scan the reports of many reporters in one pass, served per reporter by the API and claims
+
+    CHAIN ID: desired chain to scan
+
+    REPORTER: reporters to index, every reporter if none is given.
+    Reporters added since the last shared scan are backfilled over the blocks it already scanned
+
+    START BLOCK: block num to start scanning from, otherwise resume the saved shared scan
+
+    SINCE: time to start scanning from, resolved to a block over the node (ignored with START BLOCK)
+
+    WORKERS: fetch block ranges concurrently (defaults to SCAN_WORKERS env or 1)
+
+    BATCH SIZE: chunks sent per JSON-RPC batch request (defaults to RPC_BATCH_SIZE env or 1)
+    """
+    w3, tellorflex_contract = connect_tellorflex(cfg, chain_id)
+
+    run_shared(
+        w3=w3,
+        tellorflex_contract=tellorflex_contract,
+        chain_id=chain_id,
+        reporters=sorted({to_checksum_address(reporter) for reporter in reporters}) or None,
+        starting_block=start_block,
+        since=since,
+        workers=workers,
+        batch_size=batch_size,
+    )
@@ -0,0 +1,81 @@
+import os
+from typing import Optional
+from typing import Tuple
+
+import click
+from eth_utils.typing import ChecksumAddress
+from telliot_core.apps.telliot_config import TelliotConfig
+
+from timestamps_tip_scanner import metrics
+from timestamps_tip_scanner.cli.utils import connect_tellorflex
+from timestamps_tip_scanner.cli.utils import parse_since
+from timestamps_tip_scanner.cli.utils import reporter_address
+from timestamps_tip_scanner.timestamps_scanner import new_report_scanner
+from timestamps_tip_scanner.watcher import Watcher
+
+
+cfg = TelliotConfig()
+
+
+@click.command()
+@click.argument("chain_id", type=int)
+@click.option("--account", "-a", help="Account name, required if address not selected")
+@click.option("--start-block", "-sb", type=int, default=None, help="block num to start scanning from.")
+@click.option("--address", "-addy", help="wallet address, required if account not selected")
+@click.option(
+    "--since", "-s", callback=parse_since, help="scan from this time, a unix timestamp or an ISO date (2023-05-01)."
+)
+@click.option("--query-id", "-qid", "query_ids", multiple=True, help="only scan reports for this query id (repeatable)")
+@click.option("--interval", "-i", type=float, default=None, help="seconds between scans of the chain head.")
+@click.option("--metrics-port", "-mp", type=int, default=None, help="serve prometheus metrics on this port.")
+def watch(
+    chain_id: int,
+    account: str,
+    address: ChecksumAddress,
+    start_block: Optional[int],
+    since: Optional[int],
+    query_ids: Tuple[str, ...],
+    interval: Optional[float],
+    metrics_port: Optional[int],
+) -> None:
+    """
+    Keep scanning new blocks for reports, until stopped (CTRL+C)
+
+    CHAIN ID: desired chain to scan
+
+    ACCOUNT: chained account name to use
+
+    ADDRESS: wallet address
+
+    START BLOCK: block num to start scanning from, otherwise resume from the saved state
+
+    SINCE: time to start scanning from, resolved to a block over the node (ignored with START BLOCK)
+
+    QUERY ID: restrict the scan to these query ids
+
+    INTERVAL: seconds between scans (defaults to WATCH_INTERVAL env or 15)
+
+    METRICS PORT: serve prometheus metrics at /metrics on this port while watching
+    """
+    reporter = reporter_address(account, address)
+    w3, tellorflex_contract = connect_tellorflex(cfg, chain_id)
+    if interval is None:
+        interval = float(os.getenv("WATCH_INTERVAL", 15))
+
+    scanner = new_report_scanner(
+        w3=w3,
+        reporter=reporter,
+        tellorflex_contract=tellorflex_contract,
+        chain_id=chain_id,
+        starting_block=start_block,
+        query_ids=list(query_ids),
+        since=since,
+    )
+    if metrics_port is not None:
+        metrics.serve(metrics_port)
+        click.echo(f"Serving metrics on port {metrics_port}")
+    click.echo(f"Watching reports of {reporter} on chain {chain_id} every {interval} seconds")
+    try:
+        Watcher(scanner, interval=interval).follow()
+    except KeyboardInterrupt:
+        click.echo("Stopped watching, state saved")
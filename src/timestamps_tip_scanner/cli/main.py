@@ -1,9 +1,14 @@
 import click
 
+from timestamps_tip_scanner.cli.commands.backfill import backfill
 from timestamps_tip_scanner.cli.commands.claim_one_time_tip import claim_one_time_tip
 from timestamps_tip_scanner.cli.commands.claim_tip import claim_tip
 from timestamps_tip_scanner.cli.commands.scan import scan
+from timestamps_tip_scanner.cli.commands.scan_chains import scan_chains
+from timestamps_tip_scanner.cli.commands.scan_shared import scan_shared
+from timestamps_tip_scanner.cli.commands.watch import watch
 from timestamps_tip_scanner.logger import setup_logger
+from timestamps_tip_scanner.rate_limiter import log_usage
 
 setup_logger()
 
@@ -14,8 +19,14 @@ def main(ctx: click.Context) -> None:
     """Timestamps Tip Scanner"""
     if ctx.invoked_subcommand is None:
         click.echo(ctx.get_help())
+    # how close the command came to the RPC budgets
+    ctx.call_on_close(log_usage)
 
 
 main.add_command(scan)
+main.add_command(scan_chains)
+main.add_command(scan_shared)
+main.add_command(watch)
+main.add_command(backfill)
 main.add_command(claim_one_time_tip)
 main.add_command(claim_tip)
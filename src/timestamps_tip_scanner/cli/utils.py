@@ -0,0 +1,76 @@
+from typing import Optional
+from typing import Tuple
+
+import click
+from chained_accounts import find_accounts
+from eth_utils import to_checksum_address
+from eth_utils.typing import ChecksumAddress
+from telliot_core.apps.telliot_config import TelliotConfig
+from telliot_core.directory import contract_directory
+from web3 import Web3
+from web3.contract import Contract
+
+from timestamps_tip_scanner.block_resolver import parse_timestamp
+from timestamps_tip_scanner.endpoint_pool import pool_endpoints
+
+
+def reporter_address(account: Optional[str], address: Optional[str]) -> ChecksumAddress:
+    """Reporter address from either a chained account name or an address"""
+    if not address and not account:
+        raise click.BadOptionUsage(option_name="address/account", message="address or account name required")
+
+    if account and address:
+        raise click.BadOptionUsage(
+            option_name="address/account",
+            message="address and account name cannot be used together, please select one or the other",
+        )
+
+    if account:
+        accounts = find_accounts(account)
+        if not accounts:
+            click.echo(
+                f"No account found named: '{account}'.\n"
+                "Either use -addy flag or add one with the account subcommand.\n"
+                "For more info run: `telliot account add --help`"
+            )
+            raise click.BadOptionUsage(option_name="address/account", message="address or account name required")
+        address = accounts[0].address
+
+    return to_checksum_address(address)
+
+
+def parse_since(ctx: click.Context, param: click.Parameter, value: Optional[str]) -> Optional[int]:
+    """Click callback reading a --since unix timestamp or ISO date"""
+    if value is None:
+        return None
+    try:
+        return parse_timestamp(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from e
+
+
+def connect_tellorflex(cfg: TelliotConfig, chain_id: int) -> Tuple[Web3, Contract]:
+    """Connect to the chain's telliot endpoints (pooled if several) and build the TellorFlex contract"""
+    cfg.main.chain_id = chain_id
+
+    endpoints = cfg.endpoints.find(chain_id=chain_id)
+    if not endpoints:
+        raise click.BadArgumentUsage(message="No endpoints found for chain-id")
+    endpoint = pool_endpoints(endpoints)
+    if endpoint is None:
+        raise click.BadArgumentUsage(
+            f"Could not connect to endpoint for {chain_id}\n"
+            "Please check your ~/telliot/endpoints.yaml file and try again"
+        )
+
+    w3 = endpoint._web3
+
+    contract_info = contract_directory.find(chain_id=chain_id, name="tellor360-oracle")
+    if not contract_info:
+        raise click.BadArgumentUsage(
+            f"Tellorflex not found in telliot on chain_id {chain_id}\nCheck supported tellor chain ids"
+        )
+
+    tellorflex_address = contract_info[0].address[chain_id]
+    abi = contract_info[0].get_abi(chain_id=chain_id)
+    return w3, w3.eth.contract(address=tellorflex_address, abi=abi)
@@ -1,43 +1,25 @@
-from datetime import datetime
-
-
-start_timestamp = int(datetime.today().replace(hour=00, minute=00, second=0, microsecond=0).timestamp())
+import os
 
 CHAIN_ID_MAPPING = {
     80001: {
         "name": "mumbai",
-        "explorer_api": (
-            "https://api-testnet.polygonscan.com/api?module=block"
-            f"&action=getblocknobytime&timestamp={start_timestamp}&closest=before"
-        ),
+        "finality_depth": 256,
     },
     137: {
         "name": "polygon",
-        "explorer_api": (
-            "https://api.polygonscan.com/api?module=block&action=getblocknobytime"
-            f"&timestamp={start_timestamp}&closest=before"
-        ),
+        "finality_depth": 256,
     },
     1: {
         "name": "mainnet",
-        "explorer_api": (
-            "https://api.etherscan.io/api?module=block&action=getblocknobytime"
-            f"&timestamp={start_timestamp}&closest=before"
-        ),
+        "finality_depth": 64,
     },
     5: {
         "name": "goerli",
-        "explorer_api": (
-            "https://api-goerli.etherscan.io/api?module=block&action=getblocknobytime"
-            f"&timestamp={start_timestamp}&closest=before"
-        ),
+        "finality_depth": 64,
     },
     11155111: {
         "name": "sepolia",
-        "explorer_api": (
-            "https://api-sepolia.etherscan.io/api?module=block&action=getblocknobytime"
-            f"&timestamp={start_timestamp}&closest=before"
-        ),
+        "finality_depth": 64,
     },
 }
 
@@ -49,6 +31,46 @@ QUERYDATASTORAGEMAPPING = {
     11155111: "0x49eE5818fcA3016728827ba473c44f9024A6EC88",
 }
 
+# reports of all chains, before each chain got its own file (still read if a chain has no file yet)
 REPORTS_FILENAME = "new_report_timestamps.json"
+# reports of one chain, so scans of different chains don't overwrite each other's saves
+CHAIN_REPORTS_FILENAME = "new_report_timestamps.{chain}.json"
+REPORTS_DB_FILENAME = "new_report_timestamps.db"
+# state entry of the shared scan (see timestamps_scanner.run_shared), it indexes the reports of many reporters
+SHARED_SCAN_ADDRESS = "0x0000000000000000000000000000000000000000"
+# reporters the API scans in one shared pass, "all" or comma separated addresses, unset to scan each on its own
+SHARED_SCAN = os.getenv("SHARED_SCAN")
+# partial states of the partitions of `scanner backfill`, merged into the state store once all are scanned
+BACKFILL_DIR = os.getenv("BACKFILL_DIR", "backfill")
+# block number -> timestamp anchors of the block resolver, per chain id
+BLOCK_ANCHORS_FILENAME = "block_anchors.json"
+# anchors kept per chain, the most recent ones and evenly spaced ones over the blocks before them
+BLOCK_ANCHORS_MAX = int(os.getenv("BLOCK_ANCHORS_MAX", 2000))
+BLOCK_ANCHORS_RECENT = int(os.getenv("BLOCK_ANCHORS_RECENT", 200))
+# query type by query id, of the query ids the query catalog doesn't know, per chain and query data storage
+QUERY_TYPES_FILENAME = "query_types.json"
+# "json" (JSONifiedState) or "sqlite" (SQLiteState)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "json")
+# SQLite file caching eth_getLogs results of final blocks (see log_cache.py), disabled if not set
+LOG_CACHE = os.getenv("LOG_CACHE")
+# evict cached block ranges older than this many seconds / the oldest ones beyond this many logs
+LOG_CACHE_MAX_AGE = int(os.getenv("LOG_CACHE_MAX_AGE", 30 * 24 * 60 * 60))
+LOG_CACHE_MAX_LOGS = int(os.getenv("LOG_CACHE_MAX_LOGS", 1_000_000))
+# SQLite file caching final getDataBefore / retrieveData results (see oracle_cache.py), disabled if set empty
+ORACLE_CACHE = os.getenv("ORACLE_CACHE", "oracle_cache.db")
+# SQLite file of the tips claimed for reported timestamps (see claim_ledger.py), disabled if set empty
+CLAIM_LEDGER = os.getenv("CLAIM_LEDGER", "claim_ledger.db")
+# estimated gas and calldata + response bytes of a multicall batch, and batches run at once (see multicall_batches.py)
+MULTICALL_MAX_GAS = int(os.getenv("MULTICALL_MAX_GAS", 20_000_000))
+MULTICALL_MAX_BYTES = int(os.getenv("MULTICALL_MAX_BYTES", 256 * 1024))
+MULTICALL_WORKERS = int(os.getenv("MULTICALL_WORKERS", 4))
+# JSON file of per endpoint request rates, compute unit rates and budgets (see rate_limiter.py), no limits if not set
+RPC_LIMITS = os.getenv("RPC_LIMITS")
+# JSON lines file and/or Zipkin compatible collector url the tracing spans are exported to (see tracing.py)
+TRACE_FILE = os.getenv("TRACE_FILE")
+TRACE_COLLECTOR = os.getenv("TRACE_COLLECTOR")
+# Blocks behind the head after which we consider a block final (no reorg tracking),
+# used when a chain in CHAIN_ID_MAPPING has no "finality_depth"
+DEFAULT_FINALITY_DEPTH = 64
 TWELVE_HOURS = 43200
 FOUR_WEEKS = 4 * 7 * 24 * 60 * 60  # 4 weeks in seconds
@@ -0,0 +1,375 @@
+"""
+Pool of the JSON-RPC endpoints of a chain, used as the provider of a regular Web3 (`AsyncEndpointPool` of an async one).
+
+Every request goes to the healthiest endpoint (latency and error rate averages),
+reads that are slow to answer are hedged on the next endpoint, and a failed request
+fails over to the next endpoint before it fails for the caller.
+`eth_getLogs` block range limits learned from node errors route wide ranges to the endpoints
+that accept them, so one limited endpoint doesn't make the scanner halve its ranges for all of them.
+"""
+import logging
+import threading
+from concurrent.futures import as_completed
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from dataclasses import dataclass
+from time import monotonic
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Union
+
+import requests
+from aiohttp import ClientConnectorError
+from requests.exceptions import HTTPError
+from telliot_core.model import endpoints as telliot_endpoints
+from urllib3.exceptions import NewConnectionError
+from web3 import HTTPProvider
+from web3.providers.async_base import AsyncBaseProvider
+from web3.providers.base import BaseProvider
+from web3.types import RPCEndpoint
+from web3.types import RPCResponse
+
+from timestamps_tip_scanner import metrics
+from timestamps_tip_scanner.rate_limiter import limiter_for
+from timestamps_tip_scanner.rate_limiter import RateLimitedAsyncHTTPProvider
+
+# Reads safe to send to two endpoints at once
+HEDGED_METHODS = {
+    "eth_getLogs",
+    "eth_call",
+    "eth_blockNumber",
+    "eth_getBlockByNumber",
+    "eth_getBlockByHash",
+    "eth_getTransactionReceipt",
+    "eth_chainId",
+    "eth_getBalance",
+}
+
+# Writes that must not be sent twice, they only fail over if the endpoint couldn't be connected to
+NON_IDEMPOTENT_METHODS = {"eth_sendRawTransaction", "eth_sendTransaction"}
+
+# Error messages of nodes refusing an eth_getLogs range (too many blocks or too many results)
+RANGE_LIMIT_ERRORS = (
+    "block range",
+    "range is too large",
+    "range too large",
+    "exceed maximum block range",
+    "query returned more than",
+    "response size exceeded",
+    "too many blocks",
+    "log response size",
+)
+
+# Error messages of nodes throttling us
+RATE_LIMIT_ERRORS = ("rate limit", "too many requests", "limit exceeded", "capacity exceeded")
+
+
+class EndpointError(Exception):
+    """An endpoint failed a request another endpoint might serve"""
+
+
+class BlockRangeError(EndpointError):
+    """No endpoint accepts an eth_getLogs block range this wide"""
+
+    def __init__(self, message: str, max_block_range: int) -> None:
+        super().__init__(message)
+        # widest range some endpoint of the pool accepts
+        self.max_block_range = max_block_range
+
+
+@dataclass
+class EndpointHealth:
+    """Running averages of an endpoint's performance"""
+
+    # seconds per request, exponentially weighted
+    latency: float = 1.0
+    # share of failed requests, exponentially weighted
+    error_rate: float = 0.0
+    requests: int = 0
+    failures: int = 0
+    hedged: int = 0
+    # widest eth_getLogs block range served, and the learned limit (None until one was refused)
+    widest_block_range: int = 0
+    max_block_range: Optional[int] = None
+    # throttled endpoints are only used when no other one is left
+    cooldown_until: float = 0.0
+
+    def record(self, latency: float, ok: bool, weight: float) -> None:
+        self.requests += 1
+        if ok:
+            self.latency += weight * (latency - self.latency)
+        else:
+            self.failures += 1
+        self.error_rate += weight * ((0.0 if ok else 1.0) - self.error_rate)
+
+    def score(self, now: float) -> float:
+        """Lower is healthier"""
+        score = self.latency * (1 + 10 * self.error_rate)
+        if now < self.cooldown_until:
+            score *= 1000
+        return score
+
+
+class EndpointPool(BaseProvider):
+    """Web3 provider routing each request over several endpoints of the same chain."""
+
+    def __init__(
+        self,
+        endpoints: Sequence[Union[str, BaseProvider]],
+        hedge_factor: float = 3.0,
+        min_hedge_delay: float = 0.25,
+        cooldown: float = 30.0,
+        weight: float = 0.2,
+        request_kwargs: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        :param endpoints: Endpoint urls or providers, the first ones are preferred until latencies are known
+        :param hedge_factor: Hedge a read once it takes this many times the endpoint's average latency
+        :param min_hedge_delay: Never hedge a read sooner than this many seconds
+        :param cooldown: Seconds a throttled endpoint is avoided
+        :param weight: Weight of the latest request in the running averages
+        :param request_kwargs: Passed to the HTTP providers built from urls
+        """
+        if not endpoints:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        self.providers: List[BaseProvider] = [
+            HTTPProvider(endpoint, request_kwargs=request_kwargs) if isinstance(endpoint, str) else endpoint
+            for endpoint in endpoints
+        ]
+        self.health = [EndpointHealth() for _ in self.providers]
+        # shared with everything else requesting the same endpoints in this process
+        self.limiters = [
+            limiter_for(getattr(provider, "endpoint_uri", None) or repr(provider)) for provider in self.providers
+        ]
+        self.hedge_factor = hedge_factor
+        self.min_hedge_delay = min_hedge_delay
+        self.cooldown = cooldown
+        self.weight = weight
+        self.lock = threading.Lock()
+        # hedged requests and the losers of a hedge race run here
+        self.executor = ThreadPoolExecutor(max_workers=2 * len(self.providers), thread_name_prefix="endpoint-pool")
+
+    def preferred_provider(self) -> BaseProvider:
+        """The healthiest endpoint right now"""
+        return self.providers[self._ranked()[0]]
+
+    def isConnected(self) -> bool:
+        return any(provider.isConnected() for provider in self.providers)
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        block_range = _block_range(method, params)
+        tried: List[int] = []
+        last_error: Optional[Exception] = None
+        while True:
+            # ranked again after each failure, a refused range limits the endpoint from now on
+            candidates = [index for index in self._ranked(block_range) if index not in tried]
+            if not candidates:
+                break
+            second = candidates[1] if method in HEDGED_METHODS and len(candidates) > 1 else None
+            try:
+                return self._hedged_request(candidates[0], second, method, params, tried)
+            except EndpointError as e:
+                if method in NON_IDEMPOTENT_METHODS and not _unsent(e.__cause__):
+                    # the node may have received it, a second send could double or replace the transaction
+                    raise
+                last_error = e
+                logging.debug(f"{method} failed on endpoint {candidates[0]}, failing over: {e}")
+
+        max_block_range = self.max_block_range()
+        if block_range is not None and max_block_range is not None and block_range > max_block_range:
+            raise BlockRangeError(
+                f"No endpoint accepts an eth_getLogs range of {block_range} blocks, at most {max_block_range}",
+                max_block_range,
+            )
+        assert last_error is not None
+        raise last_error
+
+    def _hedged_request(
+        self, first: int, second: Optional[int], method: RPCEndpoint, params: Any, tried: List[int]
+    ) -> RPCResponse:
+        """Send to `first`, and to `second` too if `first` is slow, return the first good response"""
+        tried.append(first)
+        if second is None:
+            return self._send(first, method, params)
+
+        futures: Dict["Future[RPCResponse]", int] = {self.executor.submit(self._send, first, method, params): first}
+        done, _ = wait(futures, timeout=self._hedge_delay(first))
+        if not done:
+            with self.lock:
+                self.health[first].hedged += 1
+            tried.append(second)
+            futures[self.executor.submit(self._send, second, method, params)] = second
+
+        last_error: Optional[Exception] = None
+        for future in as_completed(futures):
+            try:
+                return future.result()
+            except EndpointError as e:
+                last_error = e
+        assert last_error is not None
+        raise last_error
+
+    def _send(self, index: int, method: RPCEndpoint, params: Any) -> RPCResponse:
+        """Request one endpoint, raise `EndpointError` for failures another endpoint might not have"""
+        self.limiters[index].acquire(method)
+        endpoint = metrics.endpoint_label(getattr(self.providers[index], "endpoint_uri", None) or str(index))
+        started = monotonic()
+        try:
+            with metrics.observe_seconds(metrics.RPC_LATENCY.labels(endpoint, method)):
+                response = self.providers[index].make_request(method, params)
+        except Exception as e:
+            metrics.RPC_ERRORS.labels(endpoint, method).inc()
+            throttled = isinstance(e, HTTPError) and e.response is not None and e.response.status_code == 429
+            self._record(index, monotonic() - started, ok=False, throttled=throttled)
+            raise EndpointError(f"{type(e).__name__}: {e}") from e
+
+        error = response.get("error")
+        if error:
+            metrics.RPC_ERRORS.labels(endpoint, method).inc()
+        message = str(error.get("message", error) if isinstance(error, dict) else error or "").lower()
+        block_range = _block_range(method, params)
+        if error and block_range is not None and any(text in message for text in RANGE_LIMIT_ERRORS):
+            self._record(index, monotonic() - started, ok=False, refused_range=block_range)
+            raise EndpointError(message)
+        if error and any(text in message for text in RATE_LIMIT_ERRORS):
+            self._record(index, monotonic() - started, ok=False, throttled=True)
+            raise EndpointError(message)
+        # other errors (e.g. a reverted eth_call) are answers, not endpoint failures
+        self._record(index, monotonic() - started, ok=True, served_range=None if error else block_range)
+        return response
+
+    def _record(
+        self,
+        index: int,
+        latency: float,
+        ok: bool,
+        throttled: bool = False,
+        refused_range: Optional[int] = None,
+        served_range: Optional[int] = None,
+    ) -> None:
+        with self.lock:
+            health = self.health[index]
+            health.record(latency, ok, self.weight)
+            if throttled:
+                health.cooldown_until = monotonic() + self.cooldown
+                self.limiters[index].record_throttled()
+            if served_range is not None:
+                health.widest_block_range = max(health.widest_block_range, served_range)
+            if refused_range is not None:
+                limit = max(health.widest_block_range, refused_range // 2)
+                health.max_block_range = min(health.max_block_range or limit, limit)
+                logging.info(f"Endpoint {index} refused {refused_range} blocks of logs, limiting it to {limit}")
+
+    def _ranked(self, block_range: Optional[int] = None) -> List[int]:
+        """Endpoint indexes, healthiest first, without those known to refuse the block range"""
+        now = monotonic()
+        with self.lock:
+            return sorted(
+                (
+                    index
+                    for index, health in enumerate(self.health)
+                    if block_range is None or health.max_block_range is None or block_range <= health.max_block_range
+                ),
+                key=lambda index: self.health[index].score(now),
+            )
+
+    def _hedge_delay(self, index: int) -> float:
+        with self.lock:
+            return max(self.min_hedge_delay, self.hedge_factor * self.health[index].latency)
+
+    def max_block_range(self) -> Optional[int]:
+        """Widest eth_getLogs block range some endpoint accepts, None if one has no known limit"""
+        with self.lock:
+            limits = [health.max_block_range for health in self.health]
+        if any(limit is None for limit in limits):
+            return None
+        return max(limits)  # type: ignore
+
+    def health_report(self) -> List[Dict[str, Any]]:
+        """Snapshot of every endpoint's health, for logs and metrics"""
+        with self.lock:
+            return [
+                {"endpoint": getattr(provider, "endpoint_uri", repr(provider)), **vars(health)}
+                for provider, health in zip(self.providers, self.health)
+            ]
+
+
+class AsyncEndpointPool(AsyncBaseProvider):
+    """Async Web3 provider failing a request over the endpoints of a chain, from the last one that served.
+
+    The async scanner doesn't hedge or route block ranges, its retry policy throttles them down.
+    """
+
+    def __init__(self, endpoint_uris: Sequence[str]) -> None:
+        if not endpoint_uris:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        super().__init__()
+        self.providers = [RateLimitedAsyncHTTPProvider(uri) for uri in endpoint_uris]
+        self.current = 0
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        last_error: Optional[Exception] = None
+        for offset in range(len(self.providers)):
+            index = (self.current + offset) % len(self.providers)
+            try:
+                response = await self.providers[index].make_request(method, params)
+            except Exception as e:
+                if method in NON_IDEMPOTENT_METHODS and not _unsent(e):
+                    raise
+                last_error = e
+                logging.debug(f"{method} failed on endpoint {index}, failing over: {e}")
+                continue
+            self.current = index
+            return response
+        raise EndpointError(f"{type(last_error).__name__}: {last_error}") from last_error
+
+    async def isConnected(self) -> bool:
+        for provider in self.providers:
+            if await provider.isConnected():
+                return True
+        return False
+
+
+def _block_range(method: str, params: Any) -> Optional[int]:
+    """Number of blocks an eth_getLogs request spans, None for other requests or symbolic blocks"""
+    if method != "eth_getLogs" or not params or not isinstance(params[0], dict):
+        return None
+    from_block, to_block = params[0].get("fromBlock"), params[0].get("toBlock")
+    try:
+        return int(to_block, 16) - int(from_block, 16) + 1  # type: ignore
+    except (TypeError, ValueError):
+        return None
+
+
+def _unsent(error: Optional[BaseException]) -> bool:
+    """Whether a failed request never reached the endpoint, because no connection could be made"""
+    if isinstance(error, (requests.ConnectTimeout, ClientConnectorError)):
+        return True
+    if not isinstance(error, requests.ConnectionError) or not error.args:
+        return False
+    # urllib3's MaxRetryError, with the reason of the last attempt
+    return isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+
+
+def pool_endpoints(
+    endpoints: Sequence[telliot_endpoints.RPCEndpoint], **pool_kwargs: Any
+) -> Optional[telliot_endpoints.RPCEndpoint]:
+    """Connect the telliot endpoints of a chain and route the first one's Web3 over all those that connected.
+
+    Requests are paced by the endpoints' `rate_limiter` limits.
+    The returned endpoint keeps the middlewares telliot set up, its `_web3` is the one handed to the scanner,
+    `AutopayCalls` and the claims, so they all go through the pool. None if no endpoint connects.
+    """
+    connected = [endpoint for endpoint in endpoints if endpoint.connect()]
+    if not connected:
+        return None
+    endpoint = connected[0]
+    # a single endpoint is pooled too, for the rate limiting
+    endpoint._web3.provider = EndpointPool([e.url for e in connected], **pool_kwargs)
+    if len(connected) > 1:
+        logging.info(f"Routing chain {endpoint.chain_id} requests over {len(connected)} endpoints")
+    return endpoint
@@ -4,11 +4,19 @@ https://web3py.readthedocs.io/en/stable/examples.html#example-code,
 refactored to use as a reports scanner
 """
 import logging
-from time import sleep
+import threading
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
 from time import time
 from typing import Any
 from typing import Callable
+from typing import ContextManager
+from typing import Deque
 from typing import Dict
+from typing import Iterator
 from typing import List
 from typing import Optional
 from typing import Tuple
@@ -16,46 +24,66 @@ from typing import Type
 
 from eth_abi.codec import ABICodec
 from eth_typing import ChecksumAddress
+from hexbytes import HexBytes
 from web3 import Web3
 from web3._utils.events import get_event_data
 from web3._utils.filters import construct_event_filter_params
 from web3.contract import Contract
 from web3.contract import ContractEvent
-
+from web3.exceptions import BlockNotFound
+from web3.types import FilterParams
+from web3.types import LogReceipt
+
+from timestamps_tip_scanner import metrics
+from timestamps_tip_scanner import tracing
+from timestamps_tip_scanner.batch_rpc import BatchHTTPTransport
+from timestamps_tip_scanner.batch_rpc import BatchRPCError
+from timestamps_tip_scanner.batch_rpc import block_number_request
+from timestamps_tip_scanner.batch_rpc import format_block_number
+from timestamps_tip_scanner.batch_rpc import format_logs
+from timestamps_tip_scanner.batch_rpc import get_logs_request
 from timestamps_tip_scanner.jsonified_state import JSONifiedState
+from timestamps_tip_scanner.log_cache import LogCache
+from timestamps_tip_scanner.new_report import decode_new_report
+from timestamps_tip_scanner.new_report import is_new_report_log
+from timestamps_tip_scanner.retry_policy import RetryPolicy
 from timestamps_tip_scanner.utils import EventData
 
 
-class EventScanner:
-    """Scan blockchain for events and try not to abuse JSON-RPC API too much.
+class BaseEventScanner:
+    """State, chunk size heuristics and event processing of the sync and async scanners.
 
-    Can be used for real-time scans, as it detects minor chain reorganisation and rescans.
-    Unlike the easy web3.contract.Contract, this scanner can scan events from multiple contracts at once.
-    For example, you can get all transfers from all tokens in the same scan.
-
-    You *should* disable the default `http_retry_request_middleware` on your provider for Web3,
-    because it cannot correctly throttle and decrease the `eth_getLogs` block number range.
+    The JSON-RPC calls are made by the subclasses, `EventScanner` and `async_event_scanner.AsyncEventScanner`.
     """
 
     def __init__(
         self,
-        reporter: ChecksumAddress,
+        reporter: Optional[ChecksumAddress],
         web3: Web3,
         contract: Contract,
         state: JSONifiedState,
         events: List[Type["ContractEvent"]],
-        filters: Dict[str, str],
+        filters: Dict[str, Any],
         max_chunk_scan_size: int = 3500,
         max_request_retries: int = 30,
         request_retry_seconds: float = 3.0,
+        batch_size: int = 1,
+        log_cache: Optional[LogCache] = None,
+        fetch_slots: Optional[threading.Semaphore] = None,
     ):
         """
+        :param reporter: Only record this reporter's events, None to record the events of every reporter
+            the filters let through (shared scans)
         :param contract: Contract
         :param events: List of web3 Event we scan
-        :param filters: Filters passed to getLogs
+        :param filters: Filters passed to getLogs, indexed event arguments (e.g. `_reporter`) become topics
         :param max_chunk_scan_size: JSON-RPC API limit in the number of blocks we query.
         :param max_request_retries: How many times we try to reattempt a failed JSON-RPC call
-        :param request_retry_seconds: Delay between failed requests to let JSON-RPC server to recover
+        :param request_retry_seconds: First backoff after a rate limited or repeatedly failing request
+        :param batch_size: How many chunks `scan` packs with the head query in one JSON-RPC batch (HTTP only)
+        :param log_cache: Serve the `eth_getLogs` of final blocks we fetched before from this cache
+        :param fetch_slots: Taken for every `eth_getLogs` request (or batch), bounds the requests in flight
+            shared with scanners of other chains, see `multi_chain.scan_chains`
         """
 
         self.web3 = web3
@@ -70,89 +98,65 @@ class EventScanner:
         self.max_scan_chunk_size = max_chunk_scan_size
         self.max_request_retries = max_request_retries
         self.request_retry_seconds = request_retry_seconds
-
-        # Factor how fast we increase the chunk size if results are found
-        # # (slow down scan after starting to get hits)
+        self.retry_policy = RetryPolicy(retries=max_request_retries, backoff_seconds=request_retry_seconds)
+        self.batch_size = batch_size
+        self.batch_transport = BatchHTTPTransport.from_web3(web3) if batch_size > 1 else None
+        self.log_cache = log_cache
+        self.fetch_slots = fetch_slots
+        # Last block we consider final as of the last head query, only logs up to it are cached
+        self.final_block: Optional[int] = None
+
+        # Factor how fast we decrease the chunk size if too many results are found
+        # (slow down scan when a chunk gets dense)
         self.chunk_size_decrease = 0.5
 
-        # Factor how was we increase chunk size if no results found
+        # Factor how fast we increase chunk size if results are sparse
         self.chunk_size_increase = 2
-        self.NUM_BLOCKS_RESCAN_FOR_FORKS = 10
 
-    def get_suggested_scan_start_block(self) -> Any:
-        """Get where we should start to scan for new events.
-
-        If there are no prior scans, start from block first block today.
-        Otherwise, start from the last end block minus ten blocks.
-        We rescan the last ten scanned blocks in the case there were forks to avoid
-        misaccounting due to minor single block works (happens once in a hour in Ethereum).
-        These heurestics could be made more robust, but this is for the sake of simple reference implementation.
-        """
-
-        end_block = self.get_last_scanned_block()
-        if end_block:
-            return max(1, end_block - self.NUM_BLOCKS_RESCAN_FOR_FORKS)
-        return self.state.reset()
-
-    def get_suggested_scan_end_block(self) -> int:
-        """Get the last mined block on EVM chain we are following."""
-
-        # Do not scan all the way to the final block, as this
-        # block might not be mined yet
-        return self.web3.eth.block_number - 1
+        # Logs are filtered by reporter on the node, so a chunk only gets crowded by a busy reporter;
+        # below this many events per chunk we keep growing the range
+        self.max_events_per_chunk = 500
 
     def get_last_scanned_block(self) -> int:
         return self.state.get_last_scanned_block()
 
-    def scan_chunk(self, start_block: int, end_block: int) -> Tuple[int, List[str]]:
-        """Read and process events between to block numbers.
-
-        Dynamically decrease the size of the chunk if the case JSON-RPC server pukes out.
-
-        :return: tuple(actual end block number, when this block was mined, processed events)
-        """
+    def roll_back_to_fork_point(self, fork_point: Optional[int]) -> int:
+        """Roll back the reports from orphaned blocks if the chain was reorganised, return where to start scanning"""
+        if fork_point is not None:
+            logging.warning(f"Chain reorganisation detected, rolling back state to block {fork_point}")
+            self.state.rollback_to(fork_point)
+        return self.get_last_scanned_block()
+
+    def untracked_fork_point(self, checkpoints: List[Tuple[int, str]]) -> Optional[int]:
+        """Fork point when none of the checkpoints is on the canonical chain anymore"""
+        if not checkpoints:
+            return None
+        # Reorged deeper than we track, go back to the last block we consider final
+        return max(0, checkpoints[0][0] - self.state.finality_depth)
+
+    def set_head(self, block_number: int) -> int:
+        """Record the latest block of the node, return the last block to scan"""
+        # Do not scan all the way to the final block, as this
+        # block might not be mined yet
+        head = block_number - 1
+        self.final_block = head - self.state.finality_depth
+        return head
 
+    def process_events(self, events: List[EventData]) -> List[str]:
+        """Record fetched events in the state, must be called in block order."""
         all_processed = []
-
-        for event_type in self.events:
-
-            # Callable that takes care of the underlying web3 call
-            def _fetch_events(_start_block: int, _end_block: int) -> List[EventData]:
-                return _fetch_events_for_all_contracts(
-                    self.web3,
-                    event_type,
-                    self.filters,
-                    from_block=_start_block,
-                    to_block=_end_block,
-                )
-
-            # Do `n` retries on `eth_getLogs`,
-            # throttle down block range if needed
-            end_block, events = _retry_web3_call(
-                _fetch_events,
-                start_block=start_block,
-                end_block=end_block,
-                retries=self.max_request_retries,
-                delay=self.request_retry_seconds,
-            )
-            if not events:
-                continue
-            for evt in events:
-                idx = evt.logIndex  # Integer of the log index position in the block, null when its pending
-                # We cannot avoid minor chain reorganisations, but
-                # at least we must avoid blocks that are not mined yet
-                assert idx is not None, "Somehow tried to scan a pending block"
-
-                if evt.args._reporter == self.reporter:
-                    logging.debug(
-                        "Processing event %s, block:%d count:%d",
-                        evt.event,
-                        evt.blockNumber,
-                    )
-                    processed = self.state.process_event(evt)
-                    all_processed.append(processed)
-
-        return end_block, all_processed
+        for evt in events:
+            idx = evt.logIndex  # Integer of the log index position in the block, null when its pending
+            # We cannot avoid minor chain reorganisations, but
+            # at least we must avoid blocks that are not mined yet
+            assert idx is not None, "Somehow tried to scan a pending block"
+
+            # The node already filters by the `_reporter` topic, this only guards custom filters
+            if self.reporter is None or evt.args._reporter == self.reporter:
+                logging.debug("Processing event %s, block:%d", evt.event, evt.blockNumber)
+                processed = self.state.process_event(evt, final_block=self.final_block)
+                all_processed.append(processed)
+        return all_processed
 
     def estimate_next_chunk_size(self, current_chuck_size: int, event_found_count: int) -> int:
         """Try to figure out optimal chunk size
@@ -169,21 +173,206 @@ class EventScanner:
         Currently Ethereum JSON-API does not have an API to tell when a first event occurred in a blockchain
         and our heuristics try to accelerate block fetching (chunk size) until we see the first event.
 
-        These heurestics exponentially increase the scan chunk size depending on if we are seeing events or not.
-        When any transfers are encountered, we are back to scanning only a few blocks at a time.
+        These heurestics exponentially increase the scan chunk size while the results are sparse.
+        Since logs are filtered by reporter on the node, a chunk holding a few reports is cheap to fetch,
+        so we only slow down when a chunk returns more than `max_events_per_chunk` events.
         It does not make sense to do a full chain scan starting from block 1, doing one JSON-RPC call per 20 blocks.
         """
 
-        if event_found_count > 0:
-            # When we encounter first events, reset the chunk size window
-            current_chuck_size = self.min_scan_chunk_size
-        else:
+        if event_found_count > self.max_events_per_chunk:
+            # Dense range, back off to keep the response size in check
+            current_chuck_size *= self.chunk_size_decrease
+        elif event_found_count < self.max_events_per_chunk // 2:
             current_chuck_size *= self.chunk_size_increase
 
         current_chuck_size = max(self.min_scan_chunk_size, current_chuck_size)
         current_chuck_size = min(self.max_scan_chunk_size, current_chuck_size)
+        # don't ask again for ranges the node had us split
+        if self.retry_policy.range_limit is not None:
+            current_chuck_size = min(max(self.retry_policy.range_limit, 1), current_chuck_size)
         return int(current_chuck_size)
 
+
+class EventScanner(BaseEventScanner):
+    """Scan blockchain for events and try not to abuse JSON-RPC API too much.
+
+    Can be used for real-time scans, as it detects minor chain reorganisation and rescans.
+    Unlike the easy web3.contract.Contract, this scanner can scan events from multiple contracts at once.
+    For example, you can get all transfers from all tokens in the same scan.
+
+    You *should* disable the default `http_retry_request_middleware` on your provider for Web3,
+    because it cannot correctly throttle and decrease the `eth_getLogs` block number range.
+    """
+
+    def get_suggested_scan_start_block(self) -> int:
+        """Get where we should start to scan for new events.
+
+        The block hashes recorded by the last scans (see `record_checkpoint`) are checked against the node,
+        newest first, which is a single call when there was no reorg. If the chain was reorganised,
+        the reports from orphaned blocks are rolled back and we resume from the fork point.
+        """
+        return self.roll_back_to_fork_point(self.find_fork_point())
+
+    def get_block_hash(self, block_number: int) -> str:
+        return HexBytes(self.web3.eth.get_block(block_number)["hash"]).hex()
+
+    def find_fork_point(self) -> Optional[int]:
+        """The newest checkpointed block still on the canonical chain, None if there was no reorg"""
+        checkpoints = self.state.block_checkpoints()
+        for i, (block_number, block_hash) in enumerate(checkpoints):
+            try:
+                canonical_hash = self.get_block_hash(block_number)
+            except BlockNotFound:
+                # the canonical chain is shorter now, the block was orphaned
+                continue
+            if canonical_hash == block_hash:
+                return block_number if i else None
+        return self.untracked_fork_point(checkpoints)
+
+    def record_checkpoint(self, block_number: int, head_block: int) -> None:
+        """Record the hash of a scanned block that isn't final yet, so the next run can detect a reorg"""
+        final_block = head_block - self.state.finality_depth
+        if block_number > final_block:
+            self.state.record_block_hash(block_number, self.get_block_hash(block_number))
+            self.state.prune_reorg_journal(final_block)
+
+    def get_suggested_scan_end_block(self) -> int:
+        """Get the last mined block on EVM chain we are following."""
+        return self.set_head(self.web3.eth.block_number)
+
+    def fetch_slot(self) -> ContextManager[Any]:
+        """Wait for a free slot of the shared request budget, if there is one"""
+        return self.fetch_slots if self.fetch_slots is not None else nullcontext()
+
+    def fetch_chunk(self, start_block: int, end_block: int) -> Tuple[int, List[EventData]]:
+        """Read events between to block numbers without touching the state.
+
+        Dynamically decrease the size of the chunk if the case JSON-RPC server pukes out.
+
+        :return: tuple(actual end block number, fetched events)
+        """
+
+        all_events: List[EventData] = []
+
+        with tracing.span("fetch_chunk", from_block=start_block, to_block=end_block) as span:
+            for event_type in self.events:
+
+                # Callable that takes care of the underlying web3 call
+                def _fetch_events(_start_block: int, _end_block: int) -> List[EventData]:
+                    with self.fetch_slot():
+                        return _fetch_events_for_all_contracts(
+                            self.web3,
+                            event_type,
+                            self.filters,
+                            from_block=_start_block,
+                            to_block=_end_block,
+                            log_cache=self.log_cache,
+                            final_block=self.final_block,
+                        )
+
+                # Do `n` retries on `eth_getLogs`,
+                # throttle down block range if needed
+                end_block, events = _retry_web3_call(
+                    _fetch_events, start_block=start_block, end_block=end_block, policy=self.retry_policy
+                )
+                if events:
+                    all_events += events
+            span.set(events=len(all_events))
+
+        return end_block, all_events
+
+    def fetch_chunks_batched(self, ranges: List[Tuple[int, int]]) -> Tuple[int, List[Tuple[int, int, List[EventData]]]]:
+        """Fetch consecutive block ranges and the chain head in a single JSON-RPC batch.
+
+        Ranges are returned in order up to the first one the node failed to serve,
+        which is fetched again through `fetch_chunk` to get the usual retries and range throttling.
+
+        :return: tuple(suggested scan end block, [(range start, actual range end, events)])
+        """
+        assert self.batch_transport is not None
+
+        # Ranges, or parts of them, in the log cache are not requested
+        range_logs: Dict[Tuple[int, int], List[LogReceipt]] = {}
+        requested: List[Tuple[int, int, FilterParams]] = []
+        for range_index, (start_block, end_block) in enumerate(ranges):
+            for event_index, event_type in enumerate(self.events):
+                params = _event_filter_params(self.web3.codec, event_type, self.filters, start_block, end_block)
+                cached, missing = self.log_cache.cached(params) if self.log_cache else ([], [(start_block, end_block)])
+                range_logs[range_index, event_index] = cached
+                for from_block, to_block in missing:
+                    requested.append(
+                        (range_index, event_index, {**params, "fromBlock": from_block, "toBlock": to_block})
+                    )
+
+        batch = [block_number_request()] + [get_logs_request(params) for _, _, params in requested]
+        try:
+            with self.fetch_slot(), tracing.span(
+                "fetch_chunks_batched", from_block=ranges[0][0], to_block=ranges[-1][1], requests=len(batch)
+            ):
+                head, *logs_results = self.batch_transport.make_batch(batch)
+        except Exception as e:
+            logging.warning("JSON-RPC batch failed with %s, falling back to single requests", e)
+            actual_end_block, events = self.fetch_chunk(*ranges[0])
+            return self.get_suggested_scan_end_block(), [(ranges[0][0], actual_end_block, events)]
+
+        if isinstance(head, BatchRPCError):
+            suggested_end_block = self.get_suggested_scan_end_block()
+        else:
+            # Do not scan all the way to the final block, as this
+            # block might not be mined yet
+            suggested_end_block = format_block_number(head) - 1
+            self.final_block = suggested_end_block - self.state.finality_depth
+
+        failed: Dict[int, BatchRPCError] = {}
+        for (range_index, event_index, params), result in zip(requested, logs_results):
+            if isinstance(result, BatchRPCError):
+                failed.setdefault(range_index, result)
+                continue
+            logs = format_logs(result)
+            if self.log_cache:
+                self.log_cache.store(params, logs, self.final_block)
+            range_logs[range_index, event_index] += logs
+
+        fetched: List[Tuple[int, int, List[EventData]]] = []
+        for range_index, (start_block, end_block) in enumerate(ranges):
+            if range_index in failed:
+                logging.warning(
+                    "Batched events for block range %d - %d failed with %s", start_block, end_block, failed[range_index]
+                )
+                actual_end_block, events = self.fetch_chunk(start_block, end_block)
+                fetched.append((start_block, actual_end_block, events))
+                break
+            events = [
+                evt
+                for event_index, event_type in enumerate(self.events)
+                for evt in _decode_logs(self.web3.codec, event_type, _sorted_logs(range_logs[range_index, event_index]))
+            ]
+            fetched.append((start_block, end_block, events))
+        return suggested_end_block, fetched
+
+    def fetch_range(self, start_block: int, end_block: int) -> List[EventData]:
+        """Read all events in a block range, in as many requests as the throttled chunk size needs."""
+        all_events = []
+        current_block = start_block
+        while current_block <= end_block:
+            actual_end_block, events = self.fetch_chunk(current_block, end_block)
+            all_events += events
+            current_block = actual_end_block + 1
+        return all_events
+
+    def scan_chunk(self, start_block: int, end_block: int) -> Tuple[int, List[str]]:
+        """Read and process events between to block numbers.
+
+        Dynamically decrease the size of the chunk if the case JSON-RPC server pukes out.
+
+        :return: tuple(actual end block number, processed events)
+        """
+        with tracing.span("scan_chunk", from_block=start_block, to_block=end_block) as span:
+            end_block, events = self.fetch_chunk(start_block, end_block)
+            processed = self.process_events(events)
+            span.set(actual_to_block=end_block, events=len(events), new_reports=len(processed))
+        return end_block, processed
+
     def scan(
         self,
         start_block: int,
@@ -202,6 +391,8 @@ class EventScanner:
         :param progress_callback: If this is an UI application, update the progress of the scan
 
         :return: [All processed events, number of chunks used]
+
+        With `batch_size` > 1 each round trip carries `batch_size` chunks plus the head query.
         """
         assert start_block <= end_block
 
@@ -229,78 +420,147 @@ class EventScanner:
             )
 
             start = time()
-            actual_end_block, new_entries = self.scan_chunk(current_block, estimated_end_block)
-
-            # Where does our current chunk scan ends - are we out of chain yet?
-            if self.get_suggested_scan_end_block() < actual_end_block:
-                current_end = self.get_suggested_scan_end_block()
+            if self.batch_transport is not None:
+                ranges = list(islice(_block_ranges(current_block, end_block, chunk_size), self.batch_size))
+                suggested_end_block, fetched = self.fetch_chunks_batched(ranges)
             else:
-                current_end = actual_end_block
-
+                actual_end_block, events = self.fetch_chunk(current_block, estimated_end_block)
+                suggested_end_block = self.get_suggested_scan_end_block()
+                fetched = [(current_block, actual_end_block, events)]
             last_scan_duration = int(time() - start)
-            all_processed += new_entries
+            chunk_seconds = (time() - start) / max(1, len(fetched))
+
+            next_chunk_size = chunk_size
+            for chunk_start, actual_end_block, events in fetched:
+                new_entries = self.process_events(events)
+
+                # Where does our current chunk scan ends - are we out of chain yet?
+                current_end = min(suggested_end_block, actual_end_block)
+                metrics.record_chunk(
+                    str(self.state.chain_name), chunk_start, current_end, chunk_seconds, len(events), len(new_entries)
+                )
+
+                last_logs_found = len(new_entries)
+                all_processed += new_entries
 
-            # Print progress bar
-            if progress_callback:
-                progress_callback(current_block, chunk_size, len(new_entries))
+                # Print progress bar
+                if progress_callback:
+                    progress_callback(chunk_start, chunk_size, len(new_entries))
 
-            # Try to guess how many blocks to fetch over `eth_getLogs` API next time
-            chunk_size = self.estimate_next_chunk_size(chunk_size, len(new_entries))
+                # Try to guess how many blocks to fetch over `eth_getLogs` API next time
+                next_chunk_size = self.estimate_next_chunk_size(next_chunk_size, len(new_entries))
 
-            # Set where the next chunk starts
-            current_block = current_end + 1
-            total_chunks_scanned += 1
-            self.state.end_chunk(current_end)
+                # Set where the next chunk starts
+                current_block = current_end + 1
+                total_chunks_scanned += 1
+                self.record_checkpoint(current_end, suggested_end_block)
+                self.state.end_chunk(current_end)
+            chunk_size = next_chunk_size
         return all_processed, total_chunks_scanned
 
+    def scan_parallel(
+        self,
+        start_block: int,
+        end_block: int,
+        chunk_size: int,
+        max_workers: int = 8,
+        progress_callback: Optional[Callable[[int, int, int], None]] = None,
+    ) -> Tuple[List[str], int]:
+        """Perform a NewReport scan fetching several block ranges at once, for historical backfills.
+
+        Ranges are fetched out of order on a thread pool, but events are applied and
+        `end_chunk` is called strictly in block order, so a crash can resume from the state as usual.
+        Each worker throttles down its own range on failure like `scan_chunk` does.
 
-def _retry_web3_call(
-    func: Callable[[int, int], List[EventData]], start_block: int, end_block: int, retries: int, delay: float
-) -> Tuple[Optional[int], Optional[List[EventData]]]:
-    """A custom retry loop to throttle down block range.
+        :param start_block: The first block included in the scan
 
-    If our JSON-RPC server cannot serve all incoming `eth_getLogs` in a single request,
-    we retry and throttle down block range for every retry.
+        :param end_block: The last block included in the scan
 
-    For example, Go Ethereum does not indicate what is an acceptable response size.
-    It just fails on the server-side with a "context was cancelled" warning.
+        :param chunk_size: How many blocks past its start block each worker fetches per range, as in `scan`
+
+        :param max_workers: How many `eth_getLogs` requests we keep in flight
+
+        :param progress_callback: If this is an UI application, update the progress of the scan
+
+        :return: [All processed events, number of ranges used]
+        """
+        assert start_block <= end_block
+
+        ranges = _block_ranges(start_block, end_block, chunk_size)
+        total_chunks_scanned = 0
+        all_processed: List[str] = []
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Bound the fetched ranges waiting for their turn to be committed
+            pending: Deque[Tuple[int, int, "Future[List[EventData]]"]] = deque()
+
+            def _submit_next() -> None:
+                block_range = next(ranges, None)
+                if block_range is not None:
+                    pending.append((*block_range, executor.submit(tracing.in_context(self.fetch_range), *block_range)))
+
+            for _ in range(max_workers * 2):
+                _submit_next()
+
+            try:
+                last_commit = time()
+                while pending:
+                    range_start, range_end, future = pending.popleft()
+                    events = future.result()
+                    new_entries = self.process_events(events)
+                    # ranges are fetched concurrently, their scan speed is the commit rate
+                    chain = str(self.state.chain_name)
+                    metrics.record_chunk(
+                        chain, range_start, range_end, time() - last_commit, len(events), len(new_entries)
+                    )
+                    last_commit = time()
+                    all_processed += new_entries
+                    total_chunks_scanned += 1
+                    self.record_checkpoint(range_end, end_block)
+                    self.state.end_chunk(range_end)
+
+                    if progress_callback:
+                        progress_callback(range_start, range_end - range_start + 1, len(new_entries))
+
+                    _submit_next()
+            finally:
+                # a failed range fails the scan, don't fetch the ranges after it
+                for _, _, future in pending:
+                    future.cancel()
+
+        return all_processed, total_chunks_scanned
+
+
+def _block_ranges(start_block: int, end_block: int, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """Consecutive block ranges from `start_block` to `end_block`, each `chunk_size` blocks past its start block"""
+    for block in range(start_block, end_block + 1, chunk_size + 1):
+        yield block, min(block + chunk_size, end_block)
+
+
+def _retry_web3_call(
+    func: Callable[[int, int], List[EventData]], start_block: int, end_block: int, policy: RetryPolicy
+) -> Tuple[int, List[EventData]]:
+    """Fetch the events of a block range, retrying as `policy` decides for each error.
+
+    A range the JSON-RPC server can't serve in a single request is split and all of it fetched,
+    so the end block returned is always `end_block`.
 
     :param func: A callable that triggers Ethereum JSON-RPC, as func(start_block, end_block)
     :param start_block: The initial start block of the block range
     :param end_block: The initial start block of the block range
-    :param retries: How many times we retry
-    :param delay: Time to sleep between retries
+    :param policy: Retry policy of the scanner
     """
-    for i in range(retries):
-        try:
-            return end_block, func(start_block, end_block)
-        except Exception as e:
-            # Assume this is HTTPConnectionPool(host='localhost', port=8545): Read timed out. (read timeout=10)
-            # from Go Ethereum. This translates to the error "context was cancelled" on the server side:
-            # https://github.com/ethereum/go-ethereum/issues/20426
-            if i < retries - 1:
-                # Give some more verbose info than the default middleware
-                logging.warning(
-                    "Retrying events for block range %d - %d (%d) failed with %s, retrying in %s seconds",
-                    start_block,
-                    end_block,
-                    end_block - start_block,
-                    e,
-                    delay,
-                )
-                # Decrease the `eth_getBlocks` range
-                end_block = start_block + ((end_block - start_block) // 2)
-                # Let the JSON-RPC to recover e.g. from restart
-                sleep(delay)
-                continue
-            else:
-                logging.warning("Out of retries")
-                raise
-    return None, None
+    return end_block, policy.fetch(func, start_block, end_block)
 
 
 def _fetch_events_for_all_contracts(
-    web3: Web3, event: Type["ContractEvent"], argument_filters: Dict[str, Any], from_block: int, to_block: int
+    web3: Web3,
+    event: Type["ContractEvent"],
+    argument_filters: Dict[str, Any],
+    from_block: int,
+    to_block: int,
+    log_cache: Optional[LogCache] = None,
+    final_block: Optional[int] = None,
 ) -> List[EventData]:
     """Get events using eth_getLogs API.
 
@@ -308,7 +568,41 @@ def _fetch_events_for_all_contracts(
 
     This is a stateless method, as opposed to createFilter.
     It can be safely called against nodes which do not provide `eth_newFilter` API, like Infura.
+
+    Indexed event arguments in `argument_filters` (a single value or a list of values) are turned into
+    topics, so the node only returns matching logs instead of us decoding and dropping them.
+    With a `log_cache`, only the block ranges it doesn't cover are requested, logs up to `final_block` are cached.
     """
+    event_filter_params = _event_filter_params(web3.codec, event, argument_filters, from_block, to_block)
+
+    with tracing.span("get_logs", event=event.event_name, from_block=from_block, to_block=to_block) as span:
+        if log_cache is None:
+            # Call JSON-RPC API on your Ethereum node.
+            # get_logs() returns raw AttributedDict entries
+            logs = web3.eth.get_logs(event_filter_params)
+        else:
+            logs, missing = log_cache.cached(event_filter_params)
+            span.set(cached_logs=len(logs), requests=len(missing))
+            for missing_from, missing_to in missing:
+                params: FilterParams = {**event_filter_params, "fromBlock": missing_from, "toBlock": missing_to}
+                fetched = web3.eth.get_logs(params)
+                log_cache.store(params, fetched, final_block)
+                logs += fetched
+            logs = _sorted_logs(logs)
+        span.set(logs=len(logs))
+
+    return _decode_logs(web3.codec, event, logs)
+
+
+def _sorted_logs(logs: List[LogReceipt]) -> List[LogReceipt]:
+    """Logs in chain order, when pieced together from the log cache and the node"""
+    return sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"]))
+
+
+def _event_filter_params(
+    codec: ABICodec, event: Type["ContractEvent"], argument_filters: Dict[str, Any], from_block: int, to_block: int
+) -> FilterParams:
+    """Build the `eth_getLogs` parameters for an event, shared by the sync and async scanners."""
 
     if from_block is None:
         raise TypeError("Missing mandatory keyword argument to getLogs: fromBlock")
@@ -317,13 +611,6 @@ def _fetch_events_for_all_contracts(
     # This will return raw underlying ABI JSON object for the event
     abi = event._get_event_abi()
 
-    # Depending on the Solidity version used to compile
-    # the contract that uses the ABI,
-    # it might have Solidity ABI encoding v1 or v2.
-    # We just assume the default that you set on Web3 object here.
-    # More information here https://eth-abi.readthedocs.io/en/latest/index.html
-    codec: ABICodec = web3.codec
-
     # Here we need to poke a bit into Web3 internals, as this
     # functionality is not exposed by default.
     # Construct JSON-RPC raw filter presentation based on human readable Python descriptions
@@ -340,14 +627,27 @@ def _fetch_events_for_all_contracts(
     )
 
     logging.debug("Querying eth_getLogs with the following parameters: %s", event_filter_params)
+    return event_filter_params
+
 
-    # Call JSON-RPC API on your Ethereum node.
-    # get_logs() returns raw AttributedDict entries
-    logs = web3.eth.get_logs(event_filter_params)
+def _decode_logs(codec: ABICodec, event: Type["ContractEvent"], logs: List[LogReceipt]) -> List[EventData]:
+    """Convert raw `eth_getLogs` entries to events.
+
+    Depending on the Solidity version used to compile the contract that uses the ABI,
+    it might have Solidity ABI encoding v1 or v2.
+    We just assume the default codec set on the Web3 object.
+    More information here https://eth-abi.readthedocs.io/en/latest/index.html
+
+    NewReport logs skip the generic decoding, see `new_report.decode_new_report`.
+    """
+    abi = event._get_event_abi()
 
     # Convert raw binary data to Python proxy objects as described by ABI
     all_events = []
     for log in logs:
+        if abi["name"] == "NewReport" and is_new_report_log(log):
+            all_events.append(decode_new_report(log))
+            continue
         # Convert raw JSON-RPC log result to human readable event by using ABI data
         # More information how processLog works here
         # https://github.com/ethereum/web3.py/blob/fbaf1ad11b0c7fac09ba34baff2c256cffe0a148/web3/_utils/events.py#L200
@@ -0,0 +1,99 @@
+"""
+Feed tips eligibility of all of a feed's reported timestamps at once, in NumPy arrays.
+
+High frequency feeds have thousands of reports a month, checking their timestamps one by one with
+`FundedFeedFilter.is_timestamp_first_in_window` and `_get_price_change` was the CPU hotspot of the API.
+The checks below are the same, on arrays of a feed's timestamps: a timestamp is eligible if it is the first
+report of its window, or if the value moved more than the feed's price threshold since the value before it.
+The timestamps are checked in order until one whose reward, grown by `rewardIncreasePerSecond` for every
+second since its window started, is more than the feed's balance.
+
+Rewards and balances are uint256 amounts of wei, they are compared as python ints and only
+the seconds into the windows, which fit an int64, as arrays.
+"""
+from itertools import compress
+from typing import Any
+from typing import Callable
+from typing import List
+from typing import Sequence
+from typing import Tuple
+
+import numpy as np
+
+from timestamps_tip_scanner.utils import FeedDetails
+
+INT64_MAX = np.iinfo(np.int64).max
+# price change, in basis points, of a value whose value before is zero
+ZERO_BEFORE_PRICE_CHANGE = 10000
+
+# decoded (value before, value) of a timestamp, (None, None) if it can't be decoded to a number
+DecodeValues = Callable[[int], Tuple[Any, Any]]
+
+
+def window_positions(
+    timestamps: np.ndarray, before_timestamps: np.ndarray, start: int, window: int, interval: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Whether each timestamp is the first in its window, and its seconds since the window started"""
+    window_starts = start + interval * ((timestamps - start) // interval)
+    time_diffs = timestamps - window_starts
+    return (time_diffs < min(window, INT64_MAX)) & (before_timestamps < window_starts), time_diffs
+
+
+def funded_count(time_diffs: np.ndarray, reward: int, reward_increase: int, balance: int) -> int:
+    """Number of timestamps, from the first, whose rewards the balance covers"""
+    if reward_increase == 0:
+        return 0 if balance < reward else len(time_diffs)
+    # balance < reward + reward_increase * time_diff  <=>  time_diff > (balance - reward) // reward_increase
+    limit = (balance - reward) // reward_increase
+    if limit < 0:
+        return 0
+    if limit >= INT64_MAX:
+        return len(time_diffs)
+    uncovered = np.flatnonzero(time_diffs > limit)
+    return int(uncovered[0]) if uncovered.size else len(time_diffs)
+
+
+def price_changes(before_values: Sequence[Any], values: Sequence[Any]) -> np.ndarray:
+    """Price changes in basis points, as `_get_price_change` computes them of each pair"""
+    if set(map(type, before_values)) | set(map(type, values)) != {float}:
+        # python ints are divided exactly, not as float64s
+        return np.array([_price_change(before, value) for before, value in zip(before_values, values)])
+    before = np.asarray(before_values, dtype=np.float64)
+    after = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        changes = np.trunc(10000 * np.abs(after - before) / before)
+    return np.where(before == 0, ZERO_BEFORE_PRICE_CHANGE, changes)
+
+
+def _price_change(before: Any, value: Any) -> int:
+    if before == 0:
+        return ZERO_BEFORE_PRICE_CHANGE
+    return int((10000 * abs(value - before)) / before)
+
+
+def eligible_timestamps(
+    timestamps: Sequence[int], before_timestamps: Sequence[int], feed: FeedDetails, decode_values: DecodeValues
+) -> List[int]:
+    """The feed tips eligible timestamps, of a feed's sorted (unclaimed) timestamps and their timestamps before.
+
+    `decode_values` is only called for the funded timestamps not first in their window, of price threshold feeds.
+    """
+    if not timestamps:
+        return []
+    reported = np.asarray(timestamps, dtype=np.int64)
+    first_in_window, time_diffs = window_positions(
+        reported, np.asarray(before_timestamps, dtype=np.int64), feed.startTime, feed.window, feed.interval
+    )
+    funded = funded_count(time_diffs, feed.reward, feed.rewardIncreasePerSecond, feed.balance)
+    eligible = first_in_window[:funded].copy()
+
+    if feed.priceThreshold > 0:
+        not_first = np.flatnonzero(~eligible)
+        decoded = [decode_values(timestamps[i]) for i in not_first.tolist()]
+        decodable = np.array([pair != (None, None) for pair in decoded], dtype=bool)
+        if decodable.any():
+            before_values, values = zip(*compress(decoded, decodable))
+            moved = price_changes(before_values, values) > feed.priceThreshold
+            eligible[not_first[decodable][moved]] = True
+
+    return reported[:funded][eligible].tolist()  # type: ignore
@@ -1,3 +1,4 @@
+import glob
 import json
 import logging
 import os
@@ -7,17 +8,46 @@ from typing import Any
 from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Tuple
 
-import requests
 from eth_typing.evm import ChecksumAddress
 from eth_utils import to_checksum_address
 from hexbytes import HexBytes
 
+from timestamps_tip_scanner import metrics
+from timestamps_tip_scanner import tracing
+from timestamps_tip_scanner.block_resolver import BlockResolver
+from timestamps_tip_scanner.block_resolver import start_of_today
 from timestamps_tip_scanner.constants import CHAIN_ID_MAPPING
+from timestamps_tip_scanner.constants import CHAIN_REPORTS_FILENAME
+from timestamps_tip_scanner.constants import DEFAULT_FINALITY_DEPTH
 from timestamps_tip_scanner.constants import REPORTS_FILENAME
+from timestamps_tip_scanner.constants import SHARED_SCAN_ADDRESS
+from timestamps_tip_scanner.timestamps import json_default
+from timestamps_tip_scanner.timestamps import SortedTimestamps
 from timestamps_tip_scanner.utils import EventData
 
 
+# Keys of a reporter's saved entry that aren't query ids, the last three are only in the shared scan entry
+SCAN_METADATA_KEYS = (
+    "last_scanned_block",
+    "last_scanned_time",
+    "block_hashes",
+    "recent_reports",
+    "reporters",
+    "first_block",
+    "reports",
+)
+
+
+def compact_reports(reports: Dict[str, Any]) -> Dict[str, Any]:
+    """Load the timestamp lists of a reporter's saved entry as SortedTimestamps"""
+    return {
+        key: value if key in SCAN_METADATA_KEYS else SortedTimestamps(value)  # type: ignore
+        for key, value in reports.items()
+    }
+
+
 class JSONifiedState:
     """Store the state of scanned blocks and all events.
 
@@ -25,24 +55,30 @@ class JSONifiedState:
     Simple load/store massive JSON on start up.
     """
 
-    def __init__(self, chain_id: int, address: str) -> None:
+    def __init__(self, chain_id: int, address: str, block_resolver: Optional[BlockResolver] = None) -> None:
         self.chain_id = chain_id
         self.chain_name = CHAIN_ID_MAPPING.get(self.chain_id, {}).get("name")
+        # Blocks this deep under the head are final, above it we track block hashes to detect reorgs
+        self.finality_depth = int(CHAIN_ID_MAPPING.get(self.chain_id, {}).get("finality_depth", DEFAULT_FINALITY_DEPTH))
         self.address = to_checksum_address(address)
+        # The shared scan entry indexes the reports of every reporter it scans under "reports"
+        self.shared = self.address == SHARED_SCAN_ADDRESS
         self.eligible = None
         self.single_tips: Optional[Dict[str, Any]] = None
-        self.freports = REPORTS_FILENAME
+        self.freports = CHAIN_REPORTS_FILENAME.format(chain=self.chain_name)
         self.fsingletips = "single_tips.json"
         self.ffeedtips = "feed_tips.json"
         # How many second ago we saved the JSON file
         self.last_save: int = 0
         self.date = datetime.today().strftime("%b-%d-%Y")
+        # Finds the block to start from when there is no saved state, scans set it
+        self.block_resolver = block_resolver
 
     def default_start_block(self) -> int:
-        url = CHAIN_ID_MAPPING[self.chain_id]["explorer_api"]
-        res = requests.get(url)
-        result = res.json()
-        return int(result["result"])
+        """The last block mined before midnight today"""
+        if self.block_resolver is None:
+            raise ValueError("No saved state and no starting block, a block resolver is needed to find today's block")
+        return self.block_resolver.block_at(start_of_today())
 
     def reset(self, starter_block: Optional[int] = None) -> None:
         """Create initial state of nothing scanned."""
@@ -53,18 +89,48 @@ class JSONifiedState:
             logging.info(f"Starting block was not selected so starting from: {starter_block}")
 
         self.state = {self.chain_name: {self.address: {"last_scanned_block": int(starter_block)}}}
+        if self.shared:
+            self.state[self.chain_name][self.address].update({"first_block": int(starter_block), "reports": {}})
         return None
 
+    def _read_saved(self) -> Any:
+        """Content of our chain's file, or of the file of all chains if it has none yet"""
+        path = self.freports if os.path.isfile(self.freports) else REPORTS_FILENAME
+        with open(path, "rt") as f:
+            return json.load(f)
+
+    def version(self) -> Optional[Tuple[str, int, int]]:
+        """Changes whenever the saved state may have: path, mtime and size of the file read, None without one"""
+        path = self.freports if os.path.isfile(self.freports) else REPORTS_FILENAME
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return path, stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> None:
+        """Read the saved state of every reporter, without resetting ours if it's missing."""
+        try:
+            self.state = self._read_saved() or {}
+        except (IOError, json.decoder.JSONDecodeError):
+            self.state = {}
+
     def restore(self) -> None:
         """Restore the last scan state from a file."""
         try:
-            self.state = json.load(open(self.freports, "rt"))
+            self.state = self._read_saved()
             if self.state is None:
                 logging.info("State starting from scratch")
                 self.reset()
             elif self.chain_name not in self.state or self.address not in self.state[self.chain_name]:
                 self.reset()
             else:
+                entry = compact_reports(self.state[self.chain_name][self.address])
+                if self.shared:
+                    entry["reports"] = {
+                        reporter: compact_reports(reports) for reporter, reports in entry.get("reports", {}).items()
+                    }
+                self.state[self.chain_name][self.address] = entry
                 logging.info(
                     "Restored existing state, last block scan ended at "
                     f"{self.state[self.chain_name][self.address]['last_scanned_block']}"
@@ -74,9 +140,32 @@ class JSONifiedState:
             self.reset()
 
     def save(self) -> None:
-        """Save everything we have scanned so far in a file."""
-        with open(self.freports, "wt") as f:
-            json.dump(self.state, f)
+        """Save everything we have scanned so far in our chain's file.
+
+        Only our reporter's entry is written over the latest file content,
+        so concurrent scans for other reporters (and other chains) don't overwrite each other.
+        """
+        with tracing.span("state_save", backend="json", chain=self.chain_name) as span:
+            with metrics.observe_seconds(metrics.STATE_SAVE_SECONDS.labels("json")):
+                self._save()
+            size = os.path.getsize(self.freports)
+            span.set(bytes=size)
+        metrics.STATE_SAVE_BYTES.labels("json").set(size)
+
+    def _save(self) -> None:
+        try:
+            saved = self._read_saved() or {}
+        except (IOError, json.decoder.JSONDecodeError):
+            saved = {}
+        # other chains have their own file
+        saved = {self.chain_name: saved.get(self.chain_name, {})}
+        saved[self.chain_name][self.address] = self.state[self.chain_name][self.address]
+        self.state = saved
+
+        tmp_file = f"{self.freports}.{os.getpid()}.{id(self)}.tmp"
+        with open(tmp_file, "wt") as f:
+            json.dump(self.state, f, default=json_default)
+        os.replace(tmp_file, self.freports)
         self.last_save = int(time())
 
     def reset_feedtips(self) -> None:
@@ -94,47 +183,23 @@ class JSONifiedState:
 
     def save_single_tips(self) -> None:
         with open(self.fsingletips, "wt") as f:
-            json.dump(self.single_tips, f)
+            json.dump(self.single_tips, f, default=json_default)
 
     def save_feed_tips(self) -> None:
         with open(self.ffeedtips, "wt") as f:
-            json.dump(self.feed_tips, f)
+            json.dump(self.feed_tips, f, default=json_default)
 
     def process_feed_timestamps(self, query_id: str, feed_id: str, timestamp: int) -> None:
         feed_tips = self.feed_tips["feed_tips"]
-        if query_id not in feed_tips:
-            feed_tips[query_id] = {}
-
-        if feed_id not in feed_tips[query_id]:
-            feed_tips[query_id][feed_id] = []
-            feed_tips[query_id][feed_id].append(timestamp)
-        else:
-            feed_tips[query_id][feed_id].append(timestamp)
-            feed_tips[query_id][feed_id] = [*set(feed_tips[query_id][feed_id])]
+        feed_tips.setdefault(query_id, {}).setdefault(feed_id, SortedTimestamps()).add(timestamp)
 
     def process_feed_timestamps_zero_balance(self, query_id: str, feed_id: str, timestamp: int) -> None:
-        feed_tips = self.feed_tips["feed_tips"]
-        if "feed_tips_no_balance" not in feed_tips:
-            feed_tips["feed_tips_no_balance"] = {}
-            feed_tips = feed_tips["feed_tips_no_balance"]
-        if query_id not in feed_tips:
-            feed_tips[query_id] = {}
-
-        if feed_id not in feed_tips[query_id]:
-            feed_tips[query_id][feed_id] = []
-            feed_tips[query_id][feed_id].append(timestamp)
-        else:
-            feed_tips[query_id][feed_id].append(timestamp)
-            feed_tips[query_id][feed_id] = [*set(feed_tips[query_id][feed_id])]
+        feed_tips = self.feed_tips["feed_tips"].setdefault("feed_tips_no_balance", {})
+        feed_tips.setdefault(query_id, {}).setdefault(feed_id, SortedTimestamps()).add(timestamp)
 
     def process_singletip_timestamps(self, query_id: str, timestamp: int) -> None:
         single_tips = self.single_tips["single_tips"]  # type: ignore
-        if query_id not in single_tips:
-            single_tips[query_id] = []
-            single_tips[query_id].append(timestamp)
-        else:
-            single_tips[query_id].append(timestamp)
-            single_tips[query_id] = [*set(single_tips[query_id])]
+        single_tips.setdefault(query_id, SortedTimestamps()).add(timestamp)
 
     def get_last_scanned_block(self) -> int:
         """The number of the last block we have stored."""
@@ -151,34 +216,171 @@ class JSONifiedState:
         if current_time - self.last_save > 60:
             self.save()
 
-    def process_event(self, event: EventData) -> str:
-        """Record NewReport event and tip eligible timestamps."""
+    def shared_reporters(self) -> Optional[List[ChecksumAddress]]:
+        """Reporters the shared scan indexes, None for all of them"""
+        return self.state[self.chain_name][self.address].get("reporters")
+
+    def set_shared_reporters(self, reporters: Optional[List[ChecksumAddress]]) -> None:
+        entry = self.state[self.chain_name][self.address]
+        if reporters is None:
+            entry.pop("reporters", None)
+        else:
+            entry["reporters"] = sorted(reporters)
+
+    def shared_first_block(self) -> int:
+        """The block the shared scan started from"""
+        entry = self.state[self.chain_name][self.address]
+        return int(entry.get("first_block", entry["last_scanned_block"]))
+
+    def _reports_of(self, reporter_addr: str) -> Dict[str, Any]:
+        """Where a reporter's timestamps by query id are recorded in our state"""
+        if self.shared:
+            return self.state[self.chain_name][self.address].setdefault("reports", {}).setdefault(reporter_addr, {})
+        return self.state[self.chain_name][reporter_addr]  # type: ignore
+
+    def process_event(self, event: EventData, final_block: Optional[int] = None) -> str:
+        """Record NewReport event and tip eligible timestamps.
+
+        Events of blocks up to `final_block` can't be reorged, they aren't journaled for rollbacks.
+        """
         log_index = event.logIndex  # Log index within the block
         txhash = event.transactionHash.hex()  # Transaction hash
         args = event.args
         reporter_addr = to_checksum_address(args._reporter)
         query_id = HexBytes(args._queryId).hex()
 
-        reporter = self.state[self.chain_name][reporter_addr]
+        reporter = self._reports_of(reporter_addr)
+        scan = self.state[self.chain_name][self.address]
 
         if query_id not in reporter:
-            reporter[query_id] = []  # type: ignore
+            reporter[query_id] = SortedTimestamps()
 
-        queryId: List[int] = reporter[query_id]  # type: ignore
-
-        queryId.append(args._time)
-        queryId = [*set(queryId)]
+        # rescanned blocks (fork rescan, restarts) hit timestamps we already have
+        added = reporter[query_id].add(args._time)
+        if final_block is None or event.blockNumber > final_block:
+            if added:
+                # journal it with its block so a reorg can roll it back
+                scan.setdefault("recent_reports", []).append([event.blockNumber, query_id, args._time, reporter_addr])
+            scan.setdefault("block_hashes", {})[str(event.blockNumber)] = HexBytes(event.blockHash).hex()
         return f"{txhash}-{log_index}"
 
+    def merge_reports(self, reporter_addr: str, reports: Dict[str, List[int]]) -> None:
+        """Add a reporter's timestamps by query id scanned by another state (e.g. a backfill partition)"""
+        recorded = self._reports_of(to_checksum_address(reporter_addr))
+        for query_id, timestamps in reports.items():
+            query_reports = recorded.setdefault(query_id, SortedTimestamps())
+            for timestamp in timestamps:
+                query_reports.add(timestamp)
+
+    def record_block_hash(self, block_number: int, block_hash: str) -> None:
+        """Checkpoint a scanned block, checked against the node on the next run to detect reorgs"""
+        reporter = self.state[self.chain_name][self.address]
+        reporter.setdefault("block_hashes", {})[str(block_number)] = HexBytes(block_hash).hex()
+
+    def block_checkpoints(self) -> List[Tuple[int, str]]:
+        """Recorded (block number, block hash), newest first"""
+        block_hashes = self.state[self.chain_name][self.address].get("block_hashes", {})
+        return sorted(((int(block), block_hash) for block, block_hash in block_hashes.items()), reverse=True)
+
+    def prune_reorg_journal(self, final_block: int) -> None:
+        """Forget checkpoints and journaled reports up to `final_block`, these can't be reorged anymore"""
+        reporter = self.state[self.chain_name][self.address]
+        reporter["block_hashes"] = {
+            block: block_hash
+            for block, block_hash in reporter.get("block_hashes", {}).items()
+            if int(block) > final_block
+        }
+        reporter["recent_reports"] = [
+            report for report in reporter.get("recent_reports", []) if report[0] > final_block
+        ]
+
+    def rollback_to(self, block_number: int) -> None:
+        """Drop the reports recorded from blocks after `block_number` (orphaned by a reorg) and resume from it"""
+        reporter = self.state[self.chain_name][self.address]
+        kept = []
+        for report in reporter.get("recent_reports", []):
+            orphan_block, query_id, timestamp, reporter_addr = report
+            if orphan_block > block_number:
+                reports = self._reports_of(reporter_addr)
+                if query_id in reports:
+                    reports[query_id].discard(timestamp)
+            else:
+                kept.append(report)
+        reporter["recent_reports"] = kept
+        reporter["block_hashes"] = {
+            block: block_hash
+            for block, block_hash in reporter.get("block_hashes", {}).items()
+            if int(block) <= block_number
+        }
+        reporter["last_scanned_block"] = block_number
+        self.save()
+
     def serve(self) -> Dict[ChecksumAddress, Any]:
         if self.chain_name in self.state:
-            return self.state[self.chain_name]
+            served = json.loads(json.dumps(self.state[self.chain_name], default=json_default))
+            # the shared scan's index is served under each reporter, merged with their own scans
+            shared_reports = served.get(SHARED_SCAN_ADDRESS, {}).pop("reports", {})
+            for reporter_addr, reports in shared_reports.items():
+                served_reports = served.setdefault(reporter_addr, {})
+                for query_id, timestamps in reports.items():
+                    served_reports[query_id] = sorted(set(served_reports.get(query_id, [])) | set(timestamps))
+            # reorg bookkeeping isn't part of the reports
+            for reports in served.values():
+                reports.pop("block_hashes", None)
+                reports.pop("recent_reports", None)
+            return served  # type: ignore
         return {}
 
+    def covered_by_shared_scan(self, reporters: Optional[List[str]]) -> bool:
+        """Whether a shared scan of `reporters` (None for all) indexes our reporter"""
+        return not self.shared and (reporters is None or self.address in reporters)
+
+    def _stored_reporter(self) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Our reporter's entry and the shared scan entry if it covers them, as currently saved in the file,
+        without touching the in-memory state"""
+        try:
+            reports = self._read_saved()
+        except (IOError, json.decoder.JSONDecodeError):
+            return None, None
+        reports_by_chain = (reports or {}).get(self.chain_name)
+        if reports_by_chain is None:
+            logging.info(f"No reports for chain {self.chain_name}")
+            return None, None
+        shared = reports_by_chain.get(SHARED_SCAN_ADDRESS)
+        if shared is not None and not self.covered_by_shared_scan(shared.get("reporters")):
+            shared = None
+        reports_by_address = reports_by_chain.get(self.address)
+        if reports_by_address is None and shared is None:
+            logging.info(f"No reports for address {self.address}")
+        return reports_by_address, shared
+
+    def read_reports(self) -> Optional[Dict[str, SortedTimestamps]]:
+        """Saved report timestamps of our reporter by query id, from their own and the shared scans"""
+        reports_by_address, shared = self._stored_reporter()
+        if reports_by_address is None and shared is None:
+            return None
+        reports = {
+            query_id: timestamps
+            for query_id, timestamps in (reports_by_address or {}).items()
+            if query_id not in SCAN_METADATA_KEYS
+        }
+        for query_id, timestamps in (shared or {}).get("reports", {}).get(self.address, {}).items():
+            reports[query_id] = reports.get(query_id, []) + timestamps
+        return compact_reports(reports)
+
+    def last_scanned_time(self) -> Optional[int]:
+        """When the latest saved scan of our reporter, their own or a shared one, ended"""
+        scan_times = [entry.get("last_scanned_time") for entry in self._stored_reporter() if entry is not None]
+        return max((scan_time for scan_time in scan_times if scan_time), default=None)
+
+    def close(self) -> None:
+        """Nothing to release, the file is only open while reading or saving it"""
+
     @staticmethod
     def delete_file() -> None:
-        if os.path.isfile(REPORTS_FILENAME):
-            try:
-                os.remove(REPORTS_FILENAME)
-            except Exception as e:
-                print(f"Error deleting the file {REPORTS_FILENAME}: {e}")
+        for path in [REPORTS_FILENAME, *glob.glob(CHAIN_REPORTS_FILENAME.format(chain="*"))]:
+            if os.path.isfile(path):
+                try:
+                    os.remove(path)
+                except Exception as e:
+                    print(f"Error deleting the file {path}: {e}")
@@ -0,0 +1,304 @@
+"""
+On-disk cache of raw `eth_getLogs` results.
+
+Logs are stored per filter (chain, contract address, topics) with the block ranges they cover,
+so a rescan of blocks we have seen (a reset state, a new `--start-block`, a rebuilt state)
+is answered locally and only the gaps go to the node.
+A filter can also be answered from a broader one, e.g. one reporter's NewReport logs
+from a scan of all reporters, by matching the topics locally.
+
+Only final blocks (see `finality_depth` in CHAIN_ID_MAPPING) are cached, logs of recent blocks may be reorged.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from time import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from web3.types import FilterParams
+from web3.types import LogReceipt
+
+from timestamps_tip_scanner.batch_rpc import format_logs
+from timestamps_tip_scanner.constants import LOG_CACHE
+from timestamps_tip_scanner.constants import LOG_CACHE_MAX_AGE
+from timestamps_tip_scanner.constants import LOG_CACHE_MAX_LOGS
+
+BlockRange = Tuple[int, int]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS filters (
+    key TEXT PRIMARY KEY,
+    chain_id INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    topics TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ranges (
+    key TEXT NOT NULL,
+    from_block INTEGER NOT NULL,
+    to_block INTEGER NOT NULL,
+    fetched_at INTEGER NOT NULL,
+    PRIMARY KEY (key, from_block)
+);
+
+CREATE TABLE IF NOT EXISTS logs (
+    key TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    log TEXT NOT NULL,
+    PRIMARY KEY (key, block_number, log_index)
+) WITHOUT ROWID;
+"""
+
+
+class LogCache:
+    """Block range cache of `eth_getLogs` results in a SQLite file.
+
+    `cached` returns the logs we have for a filter and the block ranges still missing,
+    `store` records what was fetched from the node for one of those ranges.
+    """
+
+    def __init__(self, path: str, chain_id: int, max_age: Optional[int] = None, max_logs: Optional[int] = None) -> None:
+        """
+        :param path: SQLite file
+        :param chain_id: Chain the cached logs belong to
+        :param max_age: Seconds after which a cached range is dropped
+        :param max_logs: Drop the oldest cached ranges beyond this many logs
+        """
+        self.path = path
+        self.chain_id = chain_id
+        self.max_age = max_age
+        self.max_logs = max_logs
+        # shared by the parallel scan workers
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def cached(self, filter_params: FilterParams) -> Tuple[List[LogReceipt], List[BlockRange]]:
+        """Logs of the filter's block range we have, and the block ranges we don't"""
+        address, topics = _normalized_filter(filter_params)
+        missing = [(int(filter_params["fromBlock"]), int(filter_params["toBlock"]))]  # type: ignore
+        logs: List[LogReceipt] = []
+        with self.lock:
+            for key, cached_topics in self._filters_covering(address, topics):
+                if not missing:
+                    break
+                covered = _intersect(missing, self._ranges(key))
+                for from_block, to_block in covered:
+                    rows = self.conn.execute(
+                        "SELECT log FROM logs WHERE key = ? AND block_number BETWEEN ? AND ? "
+                        "ORDER BY block_number, log_index",
+                        (key, from_block, to_block),
+                    )
+                    raw_logs = [json.loads(row[0]) for row in rows]
+                    if cached_topics != topics:
+                        raw_logs = [log for log in raw_logs if _topics_match(log["topics"], topics)]
+                    logs += format_logs(raw_logs)
+                missing = _subtract(missing, covered)
+        logging.debug("Log cache returned %d logs, missing block ranges %s", len(logs), missing)
+        return logs, missing
+
+    def store(self, filter_params: FilterParams, logs: Sequence[LogReceipt], final_block: Optional[int]) -> None:
+        """Record the logs fetched for the filter's block range, up to the last final block"""
+        from_block = int(filter_params["fromBlock"])  # type: ignore
+        to_block = int(filter_params["toBlock"])  # type: ignore
+        if final_block is None or from_block > final_block:
+            return
+        to_block = min(to_block, final_block)
+        address, topics = _normalized_filter(filter_params)
+        key = _filter_key(self.chain_id, address, topics)
+
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO filters VALUES (?, ?, ?, ?)",
+                (key, self.chain_id, address, json.dumps(topics)),
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO logs VALUES (?, ?, ?, ?)",
+                [
+                    (key, log["blockNumber"], log["logIndex"], json.dumps(_raw_log(log)))
+                    for log in logs
+                    if log["blockNumber"] <= to_block
+                ],
+            )
+            self._add_range(key, from_block, to_block)
+            self._evict()
+            self.conn.commit()
+
+    def clear(self) -> None:
+        with self.lock:
+            for table in ("filters", "ranges", "logs"):
+                self.conn.execute(f"DELETE FROM {table}")
+            self.conn.commit()
+
+    def _filters_covering(self, address: str, topics: List[Any]) -> List[Tuple[str, List[Any]]]:
+        """Cached filters whose logs include all of the filter's logs, the exact filter first"""
+        covering = []
+        for key, cached_topics in self.conn.execute(
+            "SELECT key, topics FROM filters WHERE chain_id = ? AND address = ?", (self.chain_id, address)
+        ):
+            cached_topics = json.loads(cached_topics)
+            if cached_topics == topics:
+                covering.insert(0, (key, cached_topics))
+            elif _topics_generalize(cached_topics, topics):
+                covering.append((key, cached_topics))
+        return covering
+
+    def _ranges(self, key: str) -> List[BlockRange]:
+        return self.conn.execute(
+            "SELECT from_block, to_block FROM ranges WHERE key = ? ORDER BY from_block", (key,)
+        ).fetchall()
+
+    def _add_range(self, key: str, from_block: int, to_block: int) -> None:
+        """Insert a covered range, merged with the ranges it overlaps or touches"""
+        overlapping = self.conn.execute(
+            "SELECT from_block, to_block FROM ranges WHERE key = ? AND to_block >= ? AND from_block <= ?",
+            (key, from_block - 1, to_block + 1),
+        ).fetchall()
+        for start, end in overlapping:
+            from_block, to_block = min(from_block, start), max(to_block, end)
+        self.conn.execute(
+            "DELETE FROM ranges WHERE key = ? AND to_block >= ? AND from_block <= ?",
+            (key, from_block - 1, to_block + 1),
+        )
+        self.conn.execute("INSERT INTO ranges VALUES (?, ?, ?, ?)", (key, from_block, to_block, int(time())))
+
+    def _drop_range(self, key: str, from_block: int, to_block: int) -> None:
+        self.conn.execute("DELETE FROM ranges WHERE key = ? AND from_block = ?", (key, from_block))
+        self.conn.execute(
+            "DELETE FROM logs WHERE key = ? AND block_number BETWEEN ? AND ?", (key, from_block, to_block)
+        )
+
+    def _evict(self) -> None:
+        """Drop ranges older than `max_age`, then the oldest ranges while we hold more than `max_logs`"""
+        if self.max_age is not None:
+            expired = self.conn.execute(
+                "SELECT key, from_block, to_block FROM ranges WHERE fetched_at < ?", (int(time()) - self.max_age,)
+            ).fetchall()
+            for key, from_block, to_block in expired:
+                self._drop_range(key, from_block, to_block)
+        if self.max_logs is not None:
+            (count,) = self.conn.execute("SELECT COUNT(*) FROM logs").fetchone()
+            oldest = self.conn.execute(
+                "SELECT key, from_block, to_block FROM ranges ORDER BY fetched_at, rowid"
+            ).fetchall()
+            for key, from_block, to_block in oldest:
+                if count <= self.max_logs:
+                    break
+                (dropped,) = self.conn.execute(
+                    "SELECT COUNT(*) FROM logs WHERE key = ? AND block_number BETWEEN ? AND ?",
+                    (key, from_block, to_block),
+                ).fetchone()
+                self._drop_range(key, from_block, to_block)
+                count -= dropped
+
+
+def open_log_cache(chain_id: int) -> Optional[LogCache]:
+    """Log cache configured by the LOG_CACHE env variable, None if caching is disabled"""
+    if not LOG_CACHE:
+        return None
+    return LogCache(LOG_CACHE, chain_id, max_age=LOG_CACHE_MAX_AGE, max_logs=LOG_CACHE_MAX_LOGS)
+
+
+def _normalized_filter(filter_params: FilterParams) -> Tuple[str, List[Any]]:
+    """Address and topics of `eth_getLogs` params as lowercase hex, topics without trailing wildcards"""
+    address = filter_params.get("address")
+    if isinstance(address, (list, tuple)):
+        address = ",".join(sorted(str(addr).lower() for addr in address))
+    topics: List[Any] = []
+    for topic in filter_params.get("topics") or []:
+        if topic is None:
+            topics.append(None)
+        elif isinstance(topic, (list, tuple)):
+            topics.append(sorted(_hex(t) for t in topic))
+        else:
+            topics.append(_hex(topic))
+    while topics and topics[-1] is None:
+        topics.pop()
+    return str(address or "").lower(), topics
+
+
+def _filter_key(chain_id: int, address: str, topics: List[Any]) -> str:
+    return hashlib.sha256(json.dumps([chain_id, address, topics]).encode()).hexdigest()
+
+
+def _hex(value: Any) -> str:
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    return str(value).lower()
+
+
+def _allowed(topic: Any) -> List[str]:
+    return topic if isinstance(topic, list) else [topic]
+
+
+def _topics_match(log_topics: List[str], topics: List[Any]) -> bool:
+    """Whether a raw log matches the `eth_getLogs` topics filter"""
+    for i, topic in enumerate(topics):
+        if topic is None:
+            continue
+        if i >= len(log_topics) or log_topics[i].lower() not in _allowed(topic):
+            return False
+    return True
+
+
+def _topics_generalize(broader: List[Any], topics: List[Any]) -> bool:
+    """Whether every log matching `topics` also matches `broader`"""
+    for i, topic in enumerate(broader):
+        if topic is None:
+            continue
+        if i >= len(topics) or topics[i] is None or not set(_allowed(topics[i])) <= set(_allowed(topic)):
+            return False
+    return True
+
+
+def _raw_log(log: LogReceipt) -> Dict[str, Any]:
+    """A web3 formatted log back to its JSON-RPC form, so `format_logs` can read it again"""
+    raw: Dict[str, Any] = {}
+    for field, value in log.items():
+        if isinstance(value, (bytes, bytearray)):
+            raw[field] = "0x" + bytes(value).hex()
+        elif isinstance(value, bool):
+            raw[field] = value
+        elif isinstance(value, int):
+            raw[field] = hex(value)
+        elif isinstance(value, (list, tuple)):
+            raw[field] = [_hex(item) for item in value]
+        else:
+            raw[field] = value
+    return raw
+
+
+def _intersect(ranges: List[BlockRange], covered: List[BlockRange]) -> List[BlockRange]:
+    """Parts of `ranges` inside the `covered` ranges (both sorted)"""
+    overlaps = []
+    for start, end in ranges:
+        for covered_start, covered_end in covered:
+            if covered_start <= end and covered_end >= start:
+                overlaps.append((max(start, covered_start), min(end, covered_end)))
+    return overlaps
+
+
+def _subtract(ranges: List[BlockRange], covered: List[BlockRange]) -> List[BlockRange]:
+    """Parts of `ranges` outside the `covered` ranges (both sorted)"""
+    remaining = []
+    for start, end in ranges:
+        for covered_start, covered_end in covered:
+            if covered_end < start or covered_start > end:
+                continue
+            if covered_start > start:
+                remaining.append((start, covered_start - 1))
+            start = covered_end + 1
+            if start > end:
+                break
+        if start <= end:
+            remaining.append((start, end))
+    return remaining
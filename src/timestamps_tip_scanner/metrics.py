@@ -0,0 +1,127 @@
+"""
+Prometheus metrics of the scanner, RPC, state store, multicall and claim hot paths.
+
+Scraped at /metrics on the API, or served on their own port by `scanner watch --metrics-port`.
+`prometheus_client` is optional (pip install timestamps_tip_scanner[metrics]),
+without it the metrics below record nothing.
+"""
+import time
+from contextlib import contextmanager
+from typing import Any
+from typing import Iterator
+from typing import Tuple
+from urllib.parse import urlparse
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+
+class _NoMetric:
+    """Stands in for a metric when prometheus_client isn't installed"""
+
+    def labels(self, *args: Any, **kwargs: Any) -> "_NoMetric":
+        return self
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+
+def _metric(kind: str, name: str, documentation: str, labelnames: Tuple[str, ...] = (), **kwargs: Any) -> Any:
+    if prometheus_client is None:
+        return _NoMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+BLOCKS_SCANNED = _metric("Counter", "scanner_blocks_scanned_total", "Blocks scanned", ("chain",))
+SCAN_SPEED = _metric("Gauge", "scanner_blocks_per_second", "Blocks scanned per second in the last chunk", ("chain",))
+CHUNK_SIZE = _metric("Gauge", "scanner_chunk_size_blocks", "Blocks requested per eth_getLogs chunk", ("chain",))
+CHUNK_EVENTS = _metric(
+    "Histogram",
+    "scanner_chunk_events",
+    "Events per chunk, decoded from the logs and kept in the state (new reports)",
+    ("chain", "stage"),
+    buckets=SIZE_BUCKETS,
+)
+RPC_LATENCY = _metric(
+    "Histogram",
+    "rpc_request_seconds",
+    "JSON-RPC request latency",
+    ("endpoint", "method"),
+    buckets=LATENCY_BUCKETS,
+)
+RPC_ERRORS = _metric("Counter", "rpc_request_errors_total", "Failed JSON-RPC requests", ("endpoint", "method"))
+RETRY_DECISIONS = _metric(
+    "Counter", "scanner_retry_decisions_total", "Decisions of the getLogs retry policy", ("decision",)
+)
+STATE_SAVE_SECONDS = _metric(
+    "Histogram", "state_save_seconds", "State store save duration", ("backend",), buckets=LATENCY_BUCKETS
+)
+STATE_SAVE_BYTES = _metric("Gauge", "state_save_bytes", "Size of the saved state store", ("backend",))
+MULTICALL_CALLS = _metric(
+    "Histogram", "multicall_batch_calls", "Calls per AutopayCalls multicall", ("call",), buckets=SIZE_BUCKETS
+)
+MULTICALL_SECONDS = _metric(
+    "Histogram", "multicall_seconds", "AutopayCalls multicall latency", ("call",), buckets=LATENCY_BUCKETS
+)
+MULTICALL_BATCHES = _metric(
+    "Histogram", "multicall_batches", "Batches an AutopayCalls multicall ran in", ("call",), buckets=SIZE_BUCKETS
+)
+MULTICALL_SPLITS = _metric("Counter", "multicall_batch_splits_total", "Failed multicall batches split", ("call",))
+CLAIM_CONFIRMATION_SECONDS = _metric(
+    "Histogram",
+    "claim_confirmation_seconds",
+    "Time from sending a claim transaction to its receipt",
+    ("tip",),
+    buckets=(1, 2, 5, 10, 15, 30, 60, 120, 300, 600),
+)
+
+
+def endpoint_label(url: str) -> str:
+    """The endpoint's host, urls often carry an API key in their path"""
+    return urlparse(url).netloc or url
+
+
+@contextmanager
+def observe_seconds(histogram: Any) -> Iterator[None]:
+    """Observe the duration of the block in `histogram` (already labelled), failed or not"""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        histogram.observe(time.monotonic() - started)
+
+
+def record_chunk(chain: str, start_block: int, end_block: int, seconds: float, decoded: int, kept: int) -> None:
+    """Metrics of a scanned chunk"""
+    blocks = end_block - start_block + 1
+    BLOCKS_SCANNED.labels(chain).inc(blocks)
+    CHUNK_SIZE.labels(chain).set(blocks)
+    if seconds > 0:
+        SCAN_SPEED.labels(chain).set(blocks / seconds)
+    CHUNK_EVENTS.labels(chain, "decoded").observe(decoded)
+    CHUNK_EVENTS.labels(chain, "kept").observe(kept)
+
+
+def latest() -> Tuple[bytes, str]:
+    """Exposition of every metric and its content type, for a scrape endpoint"""
+    if prometheus_client is None:
+        return b"# prometheus_client is not installed\n", "text/plain"
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def serve(port: int) -> None:
+    """Serve /metrics on its own port, in a background thread"""
+    if prometheus_client is None:
+        raise RuntimeError("Install prometheus_client to serve metrics")
+    prometheus_client.start_http_server(port)
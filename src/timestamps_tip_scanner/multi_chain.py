@@ -0,0 +1,66 @@
+"""
+Scans of a reporter on several chains at once, in a single process.
+
+Every chain gets its own scanner thread and its own state storage (see CHAIN_REPORTS_FILENAME),
+while the `eth_getLogs` requests in flight over all chains share one budget of workers,
+so scanning all chains takes about as long as the slowest of them instead of the sum.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from eth_typing import ChecksumAddress
+from web3 import Web3
+from web3.contract import Contract
+
+from timestamps_tip_scanner.jsonified_state import JSONifiedState
+from timestamps_tip_scanner.timestamps_scanner import new_report_scanner
+from timestamps_tip_scanner.timestamps_scanner import scan_to_head
+
+
+def scan_chains(
+    chains: Dict[int, Tuple[Web3, Contract]],
+    *,
+    reporter: ChecksumAddress,
+    workers: int = 4,
+    since: Optional[int] = None,
+    query_ids: Optional[List[str]] = None,
+) -> Dict[int, JSONifiedState]:
+    """Scan the reporter's NewReport events on every chain concurrently, see `timestamps_scanner.run`.
+
+    :param chains: Node connection and TellorFlex contract by chain id
+    :param workers: `eth_getLogs` requests in flight over all chains
+    :param since: Restart the scans from the first block mined at or after this unix timestamp
+    :return: The saved state by chain id, chains whose scan failed are logged and left out
+    """
+    fetch_slots = threading.BoundedSemaphore(workers)
+
+    def _scan_chain(chain_id: int) -> JSONifiedState:
+        w3, tellorflex_contract = chains[chain_id]
+        scanner = new_report_scanner(
+            w3=w3,
+            reporter=reporter,
+            tellorflex_contract=tellorflex_contract,
+            chain_id=chain_id,
+            query_ids=query_ids,
+            since=since,
+            fetch_slots=fetch_slots,
+        )
+        # a chain with a long backfill may take every worker the others leave free
+        state = scan_to_head(scanner, workers=workers, progress=False)
+        logging.info(f"Chain {chain_id} scanned up to block {state.get_last_scanned_block()}")
+        return state
+
+    states: Dict[int, JSONifiedState] = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(chains))) as executor:
+        futures = {chain_id: executor.submit(_scan_chain, chain_id) for chain_id in chains}
+        for chain_id, future in futures.items():
+            try:
+                states[chain_id] = future.result()
+            except Exception as e:
+                logging.error(f"Scan of chain {chain_id} failed: {e}")
+    return states
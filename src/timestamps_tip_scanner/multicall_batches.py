@@ -0,0 +1,179 @@
+"""
+Multicalls of many calls, run in batches the node can serve and in parallel.
+
+A single Multicall of all the calls of an evaluation is a single eth_call. For a busy reporter, four weeks of
+getDataBefore / retrieveData calls go over the node's eth_call gas cap or response size limit and fail as a whole,
+or hold one connection for tens of seconds. Instead the calls are packed, in order, into batches under
+MULTICALL_MAX_GAS of estimated gas and MULTICALL_MAX_BYTES of calldata and estimated response, and the batches
+run on MULTICALL_WORKERS threads. A batch that fails anyway is split in two and each half retried, down to the
+single call that fails. Results are merged back under the keys of their calls.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from multicall import Call
+
+from timestamps_tip_scanner import tracing
+from timestamps_tip_scanner.constants import MULTICALL_MAX_BYTES
+from timestamps_tip_scanner.constants import MULTICALL_MAX_GAS
+from timestamps_tip_scanner.constants import MULTICALL_WORKERS
+
+# Estimated gas of a call by function, the oracle reads binary search the reports of their query id
+CALL_GAS = {
+    "getDataBefore": 60_000,
+    "retrieveData": 15_000,
+    "getDataFeed": 25_000,
+    "getCurrentFeeds": 15_000,
+    "getPastTips": 30_000,
+    "getRewardClaimStatusList": 5_000,
+    "getQueryData": 20_000,
+}
+DEFAULT_CALL_GAS = 30_000
+# gas per element of an array argument (e.g. the timestamps of getRewardClaimStatusList)
+ARRAY_ELEMENT_GAS = 3_000
+# gas per calldata byte of the aggregate call
+CALLDATA_BYTE_GAS = 16
+# the aggregate's loop and the call to the target, and the encoded (target, calldata) / (success, result) tuples
+CALL_OVERHEAD_GAS = 5_000
+CALL_OVERHEAD_BYTES = 160
+WORD = 32
+# guessed length of a dynamic result (bytes, string, array) that can't be told from the arguments
+DYNAMIC_RESULT_WORDS = 8
+
+Run = Callable[[List[Call]], Dict[Any, Any]]
+
+
+@dataclass
+class BatchLimits:
+    """What a node serves in one eth_call"""
+
+    max_gas: int = MULTICALL_MAX_GAS
+    # calldata and estimated response of a batch
+    max_bytes: int = MULTICALL_MAX_BYTES
+
+
+def _split_types(types: str) -> List[str]:
+    """Top level types of a parenthesized type list, "(bytes,(uint256,uint256))" -> ["bytes", "(uint256,uint256)"]"""
+    inner = types[1:-1] if types.startswith("(") and types.endswith(")") else types
+    parts: List[str] = []
+    depth = 0
+    start = 0
+    for i, char in enumerate(inner):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(inner[start:i])
+            start = i + 1
+    if inner[start:]:
+        parts.append(inner[start:])
+    return parts
+
+
+def _signature(function: str) -> Tuple[str, List[str]]:
+    """Name and output types of a multicall signature, e.g. "getDataBefore(bytes32,uint256)(bytes,uint256)" """
+    name, _, rest = function.partition("(")
+    depth = 1
+    for end, char in enumerate(rest, 1):
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if depth == 0:
+            return name, _split_types(rest[end:])
+    return name, []
+
+
+def _words(typ: str) -> int:
+    """Words of a static type, or of an element of an array type"""
+    return typ.count(",") + 1 if typ.startswith("(") else 1
+
+
+def call_cost(call: Call) -> Tuple[int, int]:
+    """Estimated gas, and calldata plus response bytes, of a call in a multicall"""
+    name, outputs = _signature(call.function)
+    args = call.args or []
+    calldata = 4
+    elements = 0
+    for arg in args:
+        if isinstance(arg, (list, tuple)):
+            calldata += 2 * WORD + WORD * len(arg)
+            elements = max(elements, len(arg))
+        else:
+            # bytes32, uint256, address
+            calldata += WORD
+    response = 0
+    for typ in outputs:
+        if typ.endswith("[]"):
+            # the results of an array argument's elements, or a guess
+            response += 2 * WORD + (elements or DYNAMIC_RESULT_WORDS) * _words(typ[:-2]) * WORD
+        elif typ in ("bytes", "string"):
+            response += 2 * WORD + DYNAMIC_RESULT_WORDS * WORD
+        else:
+            response += _words(typ) * WORD
+    gas = CALL_GAS.get(name, DEFAULT_CALL_GAS) + ARRAY_ELEMENT_GAS * elements
+    gas += CALLDATA_BYTE_GAS * calldata + CALL_OVERHEAD_GAS
+    return gas, calldata + response + CALL_OVERHEAD_BYTES
+
+
+def plan_batches(calls: List[Call], limits: Optional[BatchLimits] = None) -> List[List[Call]]:
+    """Calls packed in order into batches under the limits, a call over them gets a batch of its own"""
+    limits = limits or BatchLimits()
+    batches: List[List[Call]] = []
+    batch: List[Call] = []
+    batch_gas = batch_bytes = 0
+    for call in calls:
+        gas, size = call_cost(call)
+        if batch and (batch_gas + gas > limits.max_gas or batch_bytes + size > limits.max_bytes):
+            batches.append(batch)
+            batch, batch_gas, batch_bytes = [], 0, 0
+        batch.append(call)
+        batch_gas += gas
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _run_bisecting(batch: List[Call], run: Run, on_split: Optional[Callable[[], None]] = None) -> Dict[Any, Any]:
+    """Results of a batch, of its halves if it fails, down to the single call that fails"""
+    with tracing.span("multicall_batch", calls=len(batch)):
+        try:
+            return run(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                raise
+            logging.info(f"Multicall of {len(batch)} calls failed, retrying it in two halves: {e}")
+    if on_split is not None:
+        on_split()
+    middle = len(batch) // 2
+    return {**_run_bisecting(batch[:middle], run, on_split), **_run_bisecting(batch[middle:], run, on_split)}
+
+
+def run_batches(
+    batches: List[List[Call]],
+    run: Run,
+    workers: int = MULTICALL_WORKERS,
+    on_split: Optional[Callable[[], None]] = None,
+) -> Dict[Any, Any]:
+    """Results of the batches' calls, `run` (a Multicall of a batch) on `workers` batches at once
+
+    :param on_split: Called whenever a failed batch is split
+    """
+    results: Dict[Any, Any] = {}
+    if len(batches) <= 1 or workers <= 1:
+        for batch in batches:
+            results.update(_run_bisecting(batch, run, on_split))
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(batches)), thread_name_prefix="multicall") as executor:
+        # a context per batch, spans of the batches are children of the caller's span
+        futures = [executor.submit(tracing.in_context(_run_bisecting), batch, run, on_split) for batch in batches]
+        for future in futures:
+            results.update(future.result())
+    return results
@@ -0,0 +1,63 @@
+"""
+Specialized decoder for TellorFlex `NewReport` logs.
+
+Everything the scanner needs (`_queryId`, `_time`, `_reporter`) is in the indexed topics,
+so we read it straight from the raw log instead of going through web3's generic `get_event_data`,
+and only ABI decode the `data` field (`_value`, `_nonce`, `_queryData`) when asked to.
+"""
+from functools import lru_cache
+from typing import Tuple
+
+from eth_abi.codec import ABICodec
+from eth_typing import ChecksumAddress
+from eth_utils import keccak
+from eth_utils import to_checksum_address
+from hexbytes import HexBytes
+from web3.types import LogReceipt
+
+from timestamps_tip_scanner.utils import Args
+from timestamps_tip_scanner.utils import EventData
+
+NEW_REPORT_SIGNATURE = "NewReport(bytes32,uint256,bytes,uint256,bytes,address)"
+NEW_REPORT_TOPIC = HexBytes(keccak(text=NEW_REPORT_SIGNATURE))
+NEW_REPORT_DATA_TYPES = ["bytes", "uint256", "bytes"]
+
+
+@lru_cache(maxsize=4096)
+def _reporter_address(topic: bytes) -> ChecksumAddress:
+    """Checksum the address in an indexed topic, there are only a handful of reporters so cache them"""
+    return to_checksum_address(topic[-20:])
+
+
+def is_new_report_log(log: LogReceipt) -> bool:
+    topics = log["topics"]
+    return len(topics) == 4 and HexBytes(topics[0]) == NEW_REPORT_TOPIC
+
+
+def decode_new_report(log: LogReceipt) -> EventData:
+    """Build a NewReport event from the topics of a raw log, `data` is kept as is"""
+    _, query_id, timestamp, reporter = log["topics"]
+    return EventData(
+        address=log["address"],
+        args=Args(
+            _reporter=_reporter_address(bytes(reporter)),
+            _time=int.from_bytes(timestamp, "big"),
+            _queryId=HexBytes(query_id),
+        ),
+        blockHash=log["blockHash"],
+        blockNumber=log["blockNumber"],
+        event="NewReport",
+        logIndex=log["logIndex"],
+        transactionHash=log["transactionHash"],
+        transactionIndex=log["transactionIndex"],
+        data=HexBytes(log["data"]),
+    )
+
+
+def decode_new_report_data(codec: ABICodec, event: EventData) -> Tuple[bytes, int, bytes]:
+    """Decode the non indexed NewReport fields on demand
+
+    Return: (_value, _nonce, _queryData)
+    """
+    value, nonce, query_data = codec.decode_abi(NEW_REPORT_DATA_TYPES, event.data)
+    return value, nonce, query_data
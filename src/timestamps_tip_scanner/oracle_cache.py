@@ -0,0 +1,178 @@
+"""
+On-disk cache of final `getDataBefore` and `retrieveData` results of reported timestamps.
+
+Once a report is older than the dispute window it can't be removed anymore, neither can the reports before it,
+so the value it was reported with and the value before it never change again. Tips checks read them for every
+timestamp of their windows, with this cache only the timestamps not seen yet are read from the autopay contract.
+Results are keyed like the multicall results they come from: (kind, query id, timestamp).
+
+`ValueRemoved` events of the oracle drop the results they change, in case a value is removed after all.
+"""
+import logging
+import sqlite3
+import threading
+from time import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from hexbytes import HexBytes
+from web3 import Web3
+
+from timestamps_tip_scanner.constants import ORACLE_CACHE
+from timestamps_tip_scanner.constants import TWELVE_HOURS
+
+# reports can be disputed, and their value removed, this long after they were submitted
+DISPUTE_WINDOW = TWELVE_HOURS
+# multicall result keys of getDataBefore (value, timestamp) and retrieveData (value)
+ORACLE_READS = ("before_values", "timestamps", "current_values")
+VALUE_REMOVED_TOPIC = Web3.keccak(text="ValueRemoved(bytes32,uint256)").hex()
+# blocks of ValueRemoved events read at once, the sync skips ahead of a longer gap
+MAX_REMOVED_VALUES_BLOCKS = 10_000
+
+ReadKey = Tuple[str, str, int]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reads (
+    chain_id INTEGER NOT NULL,
+    query_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    value,
+    PRIMARY KEY (chain_id, query_id, timestamp, kind)
+) WITHOUT ROWID;
+
+-- last block of the oracle's ValueRemoved events applied
+CREATE TABLE IF NOT EXISTS removed_values_synced (
+    chain_id INTEGER NOT NULL,
+    oracle TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    PRIMARY KEY (chain_id, oracle)
+);
+"""
+
+
+class OracleCache:
+    """Final oracle reads of a chain in a SQLite file"""
+
+    def __init__(self, path: str, chain_id: int) -> None:
+        self.path = path
+        self.chain_id = chain_id
+        # shared by the API's worker threads
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def lookup(self, reports: Dict[str, List[int]]) -> Dict[ReadKey, Any]:
+        """Cached reads of the reports' timestamps"""
+        cached: Dict[ReadKey, Any] = {}
+        with self.lock:
+            for query_id, timestamps in reports.items():
+                if not timestamps:
+                    continue
+                rows = self.conn.execute(
+                    "SELECT timestamp, kind, value FROM reads "
+                    "WHERE chain_id = ? AND query_id = ? AND timestamp BETWEEN ? AND ?",
+                    (self.chain_id, query_id, min(timestamps), max(timestamps)),
+                )
+                wanted = set(timestamps)
+                for timestamp, kind, value in rows:
+                    if timestamp in wanted:
+                        cached[kind, query_id, timestamp] = bytes(value) if isinstance(value, bytes) else value
+        return cached
+
+    def store(self, reads: Dict[Any, Any], now: Optional[int] = None) -> None:
+        """Record the oracle reads of a multicall result (other results are ignored), of final timestamps only"""
+        final_before = (now if now is not None else int(time())) - DISPUTE_WINDOW
+        rows = [
+            (self.chain_id, key[1], key[2], key[0], bytes(value) if isinstance(value, (bytes, bytearray)) else value)
+            for key, value in reads.items()
+            if isinstance(key, tuple)
+            and len(key) == 3
+            and key[0] in ORACLE_READS
+            and key[2] <= final_before
+            and value is not None
+        ]
+        if not rows:
+            return
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO reads VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.commit()
+
+    def remove_value(self, query_id: str, timestamp: int) -> None:
+        """Drop the reads a removed value changes: its own and the ones of the timestamps it was the value before"""
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM reads WHERE chain_id = ? AND query_id = ? AND timestamp IN ("
+                "SELECT timestamp FROM reads WHERE chain_id = ? AND query_id = ? AND kind = 'timestamps' AND value = ?"
+                ") AND kind IN ('before_values', 'timestamps')",
+                (self.chain_id, query_id, self.chain_id, query_id, timestamp),
+            )
+            self.conn.execute(
+                "DELETE FROM reads WHERE chain_id = ? AND query_id = ? AND timestamp = ? AND kind = 'current_values'",
+                (self.chain_id, query_id, timestamp),
+            )
+            self.conn.commit()
+
+    def sync_removed_values(self, w3: Web3, oracle_address: str) -> None:
+        """Apply the oracle's ValueRemoved events since the last sync (from the head on the first one)"""
+        oracle = oracle_address.lower()
+        head = w3.eth.block_number
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT block_number FROM removed_values_synced WHERE chain_id = ? AND oracle = ?",
+                (self.chain_id, oracle),
+            ).fetchone()
+        from_block = row[0] + 1 if row is not None else head + 1
+        # values older than the dispute window can't be removed, nor can the cached reads change
+        from_block = max(from_block, head - MAX_REMOVED_VALUES_BLOCKS)
+        if from_block <= head:
+            logs = w3.eth.get_logs(
+                {
+                    "address": Web3.toChecksumAddress(oracle_address),
+                    "topics": [VALUE_REMOVED_TOPIC],
+                    "fromBlock": from_block,
+                    "toBlock": head,
+                }
+            )
+            for log in logs:
+                # ValueRemoved(bytes32 _queryId, uint256 _timestamp), none of them indexed
+                data = HexBytes(log["data"])
+                query_id = "0x" + data[:32].hex()
+                timestamp = int.from_bytes(data[32:64], "big")
+                logging.info(f"Value of {query_id} at {timestamp} removed, dropping its cached oracle reads")
+                self.remove_value(query_id, timestamp)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO removed_values_synced VALUES (?, ?, ?)", (self.chain_id, oracle, head)
+            )
+            self.conn.commit()
+
+    def clear(self) -> None:
+        with self.lock:
+            for table in ("reads", "removed_values_synced"):
+                self.conn.execute(f"DELETE FROM {table}")
+            self.conn.commit()
+
+
+_caches: Dict[int, OracleCache] = {}
+_caches_lock = threading.Lock()
+
+
+def open_oracle_cache(chain_id: int) -> Optional[OracleCache]:
+    """The process wide oracle cache of a chain in the ORACLE_CACHE file, None if caching is disabled"""
+    if not ORACLE_CACHE:
+        return None
+    with _caches_lock:
+        if chain_id not in _caches:
+            _caches[chain_id] = OracleCache(ORACLE_CACHE, chain_id)
+        return _caches[chain_id]
+
+
+def clear_oracle_caches() -> None:
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.clear()
@@ -0,0 +1,151 @@
+"""
+Value decoders of query ids, resolved once.
+
+A query id the telliot query catalog doesn't know is resolved to its query type through the query data
+storage contract. Query data is immutable on chain, so the query types, and the query ids without
+query data, are kept in memory and in QUERY_TYPES_FILENAME, by chain and storage contract.
+"""
+import ast
+import json
+import os
+import threading
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from eth_abi import decode_single
+from telliot_feeds.queries.query_catalog import query_catalog
+
+from timestamps_tip_scanner.constants import QUERY_TYPES_FILENAME
+
+Decoder = Callable[[bytes], Any]
+
+
+def decode_typ_name(qdata: bytes) -> str:
+    """Decode query type name from query data
+
+    Args:
+    - qdata: query data in bytes
+
+    Return: string query type name
+    """
+    qtype_name: str
+    try:
+        qtype_name, _ = decode_single("(string,bytes)", qdata)
+    except OverflowError:
+        # string query for some reason encoding isn't the same as the others
+        qtype_name = ast.literal_eval(qdata.decode("utf-8"))["type"]
+    return qtype_name
+
+
+class DecoderRegistry:
+    """Value decoders by query id of a chain, from the catalog or the query types of the storage contract"""
+
+    def __init__(self, chain_id: int, storage_address: str, types_file: Optional[str] = QUERY_TYPES_FILENAME) -> None:
+        """
+        :param chain_id: Chain the query types are saved under
+        :param storage_address: Query data storage contract the query types are read from
+        :param types_file: JSON file keeping query types between runs, None to keep them in memory only
+        """
+        self.chain_id = chain_id
+        self.storage_address = storage_address
+        self.types_file = types_file
+        self.lock = threading.Lock()
+        # query type by query id, None if the storage contract has no (decodable) query data for it
+        self.types: Dict[str, Optional[str]] = self._load_types()
+        # decoder by query id, None if it has no catalog entry to decode with
+        self.decoders: Dict[str, Optional[Decoder]] = {}
+
+    def query_type(self, query_id: str) -> Optional[str]:
+        return self.types.get(query_id)
+
+    def unresolved(self, query_ids: Iterable[str]) -> List[str]:
+        """Query ids the catalog doesn't know and whose query type wasn't read yet"""
+        return [
+            query_id
+            for query_id in dict.fromkeys(query_ids)
+            if query_id not in self.types and self.decoder(query_id) is None
+        ]
+
+    def decoder(self, query_id: str) -> Optional[Decoder]:
+        """Value decoder of the query id, None if it has none or its query type is still to be read"""
+        if query_id in self.decoders:
+            return self.decoders[query_id]
+        entries = query_catalog.find(query_id=query_id)
+        if not entries:
+            if query_id not in self.types:
+                # not resolved, not cached either
+                return None
+            query_type = self.types[query_id]
+            entries = query_catalog.find(query_type=query_type) if query_type is not None else []
+        self.decoders[query_id] = entries[0].query.value_type.decode if entries else None
+        return self.decoders[query_id]
+
+    def record(self, query_data: Dict[str, Optional[bytes]]) -> None:
+        """Resolve query ids from their query data, None for a failed read (left to resolve again)"""
+        resolved: Dict[str, Optional[str]] = {}
+        for query_id, data in query_data.items():
+            if data is None:
+                continue
+            try:
+                resolved[query_id] = decode_typ_name(data)
+            except Exception:
+                # no query data stored for the query id
+                resolved[query_id] = None
+        if resolved:
+            with self.lock:
+                self.types.update(resolved)
+                self.save()
+
+    def _key(self) -> Tuple[str, str]:
+        return str(self.chain_id), self.storage_address
+
+    def _load_types(self) -> Dict[str, Optional[str]]:
+        if self.types_file is None:
+            return {}
+        try:
+            with open(self.types_file, "r") as f:
+                saved = json.load(f) or {}
+        except (IOError, json.decoder.JSONDecodeError):
+            return {}
+        chain, storage = self._key()
+        return dict(saved.get(chain, {}).get(storage, {}))
+
+    def save(self) -> None:
+        """Merge our query types into the query types file, written atomically like the reports state"""
+        if self.types_file is None:
+            return
+        try:
+            with open(self.types_file, "r") as f:
+                saved = json.load(f) or {}
+        except (IOError, json.decoder.JSONDecodeError):
+            saved = {}
+        chain, storage = self._key()
+        saved.setdefault(chain, {}).setdefault(storage, {}).update(self.types)
+
+        tmp_file = f"{self.types_file}.{os.getpid()}.{id(self)}.tmp"
+        with open(tmp_file, "wt") as f:
+            json.dump(saved, f)
+        os.replace(tmp_file, self.types_file)
+
+
+_registries: Dict[Tuple[int, str], DecoderRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def decoder_registry(chain_id: int, storage_address: str) -> DecoderRegistry:
+    """The process wide registry of a chain's storage contract"""
+    with _registries_lock:
+        key = (chain_id, storage_address)
+        if key not in _registries:
+            _registries[key] = DecoderRegistry(chain_id, storage_address)
+        return _registries[key]
+
+
+def clear_registries() -> None:
+    with _registries_lock:
+        _registries.clear()
@@ -0,0 +1,228 @@
+"""
+Client-side pacing of JSON-RPC requests under the request-per-second and compute-unit caps of hosted RPC plans.
+
+Each endpoint url gets one `RateLimiter`, shared by every pool, transport and async provider talking to it,
+so the scanner, the multicalls and the claims of a process draw from the same buckets.
+Requests wait for their tokens instead of bouncing off a 429 and backing off.
+Limits are read from the JSON file RPC_LIMITS points at, e.g.
+
+    {
+        "default": {"requests_per_second": 25},
+        "https://polygon-mainnet.g.alchemy.com/v2/KEY": {
+            "compute_units_per_second": 330,
+            "budget": 5000000,
+            "method_costs": {"eth_getLogs": 75}
+        }
+    }
+"""
+import asyncio
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from dataclasses import field
+from time import monotonic
+from time import sleep
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from web3 import AsyncHTTPProvider
+from web3.types import RPCEndpoint
+from web3.types import RPCResponse
+
+from timestamps_tip_scanner import metrics
+from timestamps_tip_scanner.constants import RPC_LIMITS
+
+# Compute units of a request, eth_getLogs scans many blocks and costs several eth_calls
+METHOD_COSTS = {
+    "eth_getLogs": 75,
+    "eth_call": 26,
+    "eth_estimateGas": 87,
+    "eth_sendRawTransaction": 250,
+    "eth_getBlockByNumber": 16,
+    "eth_getBlockByHash": 16,
+    "eth_getTransactionReceipt": 15,
+    "eth_getTransactionCount": 26,
+    "eth_getBalance": 19,
+    "eth_gasPrice": 19,
+    "eth_blockNumber": 10,
+    "eth_chainId": 0,
+    "net_version": 0,
+}
+DEFAULT_METHOD_COST = 20
+
+
+class RPCBudgetExceeded(Exception):
+    """A request would spend more compute units than the endpoint's budget for this process"""
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`.
+
+    Tokens are reserved ahead: a reservation may take the bucket below zero,
+    the caller then waits until the refill covers it, so waiting requests are served in order.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = monotonic()
+
+    def reserve(self, tokens: float, now: float) -> float:
+        """Take `tokens`, return the seconds to wait before using them"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= tokens
+        return max(0.0, -self.tokens / self.rate)
+
+    def drain(self, now: float) -> None:
+        """Empty the bucket, the node told us we went too fast"""
+        self.reserve(max(0.0, self.tokens), now)
+
+
+@dataclass
+class RateLimiter:
+    """Request and compute-unit buckets of one endpoint, and what was spent through them"""
+
+    name: str = ""
+    requests_per_second: Optional[float] = None
+    compute_units_per_second: Optional[float] = None
+    # compute units this process may spend on the endpoint, None for no budget
+    budget: Optional[int] = None
+    method_costs: Dict[str, int] = field(default_factory=dict)
+    requests: int = 0
+    compute_units: int = 0
+    throttled: int = 0
+    waited: float = 0.0
+
+    def __post_init__(self) -> None:
+        self.lock = threading.Lock()
+        self.buckets: List[TokenBucket] = []
+        if self.requests_per_second:
+            self.request_bucket: Optional[TokenBucket] = TokenBucket(self.requests_per_second)
+            self.buckets.append(self.request_bucket)
+        else:
+            self.request_bucket = None
+        if self.compute_units_per_second:
+            self.compute_unit_bucket: Optional[TokenBucket] = TokenBucket(self.compute_units_per_second)
+            self.buckets.append(self.compute_unit_bucket)
+        else:
+            self.compute_unit_bucket = None
+
+    def cost(self, method: str) -> int:
+        return self.method_costs.get(method, METHOD_COSTS.get(method, DEFAULT_METHOD_COST))
+
+    def reserve(self, method: str, count: int = 1) -> float:
+        """Account for `count` requests of `method`, return the seconds to wait before sending them"""
+        cost = self.cost(method) * count
+        with self.lock:
+            if self.budget is not None and self.compute_units + cost > self.budget:
+                raise RPCBudgetExceeded(
+                    f"{method} would spend {cost} compute units on {self.name}, "
+                    f"{self.compute_units} of the {self.budget} budget are spent"
+                )
+            now = monotonic()
+            delay = 0.0
+            if self.request_bucket is not None:
+                delay = max(delay, self.request_bucket.reserve(count, now))
+            if self.compute_unit_bucket is not None:
+                delay = max(delay, self.compute_unit_bucket.reserve(cost, now))
+            self.requests += count
+            self.compute_units += cost
+            self.waited += delay
+        return delay
+
+    def acquire(self, method: str, count: int = 1) -> None:
+        """Wait until `count` requests of `method` fit under the limits"""
+        delay = self.reserve(method, count)
+        if delay:
+            sleep(delay)
+
+    def record_throttled(self) -> None:
+        """The node rate limited us anyway (limits set too high, or shared with other clients), slow down"""
+        with self.lock:
+            self.throttled += 1
+            now = monotonic()
+            for bucket in self.buckets:
+                bucket.drain(now)
+
+    def usage(self) -> Dict[str, Any]:
+        """What was spent so far, and the share of the budget it is"""
+        with self.lock:
+            return {
+                "endpoint": metrics.endpoint_label(self.name),
+                "requests": self.requests,
+                "compute_units": self.compute_units,
+                "budget": self.budget,
+                "budget_used": self.compute_units / self.budget if self.budget else None,
+                "throttled": self.throttled,
+                "waited_seconds": round(self.waited, 3),
+            }
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+_limits: Optional[Dict[str, Dict[str, Any]]] = None
+
+
+def load_limits(path: Optional[str] = RPC_LIMITS) -> Dict[str, Dict[str, Any]]:
+    """Limits per endpoint url (and "default") from the RPC_LIMITS file, none if it isn't set"""
+    if not path:
+        return {}
+    with open(path) as f:
+        limits: Dict[str, Dict[str, Any]] = json.load(f)
+    return limits
+
+
+def limiter_for(url: str) -> RateLimiter:
+    """The process wide limiter of an endpoint"""
+    global _limits
+    with _limiters_lock:
+        if url not in _limiters:
+            if _limits is None:
+                _limits = load_limits()
+            _limiters[url] = RateLimiter(name=url, **_limits.get(url, _limits.get("default", {})))
+        return _limiters[url]
+
+
+def usage_report() -> List[Dict[str, Any]]:
+    """Usage of every endpoint requested so far"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.usage() for limiter in limiters if limiter.requests]
+
+
+def log_usage() -> None:
+    for usage in usage_report():
+        budget = f", {usage['budget_used']:.1%} of the budget" if usage["budget"] else ""
+        logging.info(
+            f"RPC usage of {usage['endpoint']}: {usage['requests']} requests, "
+            f"{usage['compute_units']} compute units{budget}, "
+            f"waited {usage['waited_seconds']}s, throttled {usage['throttled']} times"
+        )
+
+
+class RateLimitedAsyncHTTPProvider(AsyncHTTPProvider):
+    """`AsyncHTTPProvider` pacing its requests with the endpoint's limiter"""
+
+    def __init__(self, endpoint_uri: str, **kwargs: Any) -> None:
+        super().__init__(endpoint_uri, **kwargs)
+        self.limiter = limiter_for(endpoint_uri)
+        self.endpoint_label = metrics.endpoint_label(endpoint_uri)
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        delay = self.limiter.reserve(method)
+        if delay:
+            await asyncio.sleep(delay)
+        try:
+            with metrics.observe_seconds(metrics.RPC_LATENCY.labels(self.endpoint_label, method)):
+                response = await super().make_request(method, params)
+        except Exception:
+            metrics.RPC_ERRORS.labels(self.endpoint_label, method).inc()
+            raise
+        if "error" in response:
+            metrics.RPC_ERRORS.labels(self.endpoint_label, method).inc()
+        return response
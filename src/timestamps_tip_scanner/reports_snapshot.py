@@ -0,0 +1,73 @@
+"""
+Parsed report timestamps shared by the reads of a tips evaluation, and by the evaluations of a process.
+
+Reading the saved reports parses the whole state file (or queries every report of the database),
+and an evaluation of a wallet's tips reads them several times, every API request once more.
+A snapshot is read once and kept until the state's `version` (the saved file's mtime and size) changes.
+"""
+import threading
+from dataclasses import dataclass
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from timestamps_tip_scanner.jsonified_state import JSONifiedState
+from timestamps_tip_scanner.timestamps import SortedTimestamps
+
+# snapshots of the most recently read reporters kept in memory
+MAX_SNAPSHOTS = 128
+
+
+@dataclass(frozen=True)
+class ReportsSnapshot:
+    """A reporter's saved reports by query id (None if never scanned) at one version of the state"""
+
+    reports: Optional[Dict[str, SortedTimestamps]]
+    version: Any
+
+    def between(self, after: int, before: int) -> Optional[Dict[str, List[int]]]:
+        """Timestamps strictly between `after` and `before` by query id, query ids without any left out"""
+        if self.reports is None:
+            return None
+        window = {query_id: timestamps.between(after, before) for query_id, timestamps in self.reports.items()}
+        return {query_id: timestamps for query_id, timestamps in window.items() if timestamps}
+
+    def before(self, before: int) -> Optional[Dict[str, List[int]]]:
+        """Timestamps strictly before `before` by query id, query ids without any left out"""
+        if self.reports is None:
+            return None
+        window = {query_id: timestamps.before(before) for query_id, timestamps in self.reports.items()}
+        return {query_id: timestamps for query_id, timestamps in window.items() if timestamps}
+
+
+_snapshots: Dict[Tuple[str, int, str], ReportsSnapshot] = {}
+_snapshots_lock = threading.Lock()
+
+
+def reports_snapshot(state: JSONifiedState) -> ReportsSnapshot:
+    """Latest snapshot of the state's reporter, read again only if the state changed since the last one.
+
+    Snapshots are shared, their reports must not be modified.
+    """
+    key = (type(state).__name__, state.chain_id, state.address)
+    # taken before reading, a save in between makes the next call read again rather than miss it
+    version = state.version()
+    with _snapshots_lock:
+        snapshot = _snapshots.get(key)
+    if snapshot is not None and version is not None and snapshot.version == version:
+        return snapshot
+
+    snapshot = ReportsSnapshot(reports=state.read_reports(), version=version)
+    with _snapshots_lock:
+        _snapshots.pop(key, None)
+        _snapshots[key] = snapshot
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            del _snapshots[next(iter(_snapshots))]
+    return snapshot
+
+
+def clear_snapshots() -> None:
+    with _snapshots_lock:
+        _snapshots.clear()
@@ -0,0 +1,200 @@
+"""
+Retries of `eth_getLogs` block ranges, deciding what to do from the kind of error the provider raised.
+
+* a range the node refuses (too many blocks or results) or times out on is split, and both halves are fetched
+* a rate limit backs off with jitter
+* a dropped connection or a node hiccup is retried right away, the endpoint pool or a fresh connection serves it
+* anything else (a bug, a spent RPC budget) is raised at once
+
+Every decision is counted in the `scanner_retry_decisions_total` metric.
+"""
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from enum import Enum
+from time import sleep
+from typing import Awaitable
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import requests
+
+from timestamps_tip_scanner import metrics
+from timestamps_tip_scanner.endpoint_pool import BlockRangeError
+from timestamps_tip_scanner.endpoint_pool import EndpointError
+from timestamps_tip_scanner.endpoint_pool import RANGE_LIMIT_ERRORS
+from timestamps_tip_scanner.endpoint_pool import RATE_LIMIT_ERRORS
+from timestamps_tip_scanner.utils import EventData
+
+# Error messages of nodes that failed a request they would serve on a retry
+TRANSIENT_ERRORS = (
+    "header not found",
+    "internal error",
+    "service unavailable",
+    "bad gateway",
+    "gateway timeout",
+    "try again",
+    "connection reset",
+)
+
+
+class ErrorClass(Enum):
+    RANGE_TOO_LARGE = "split"
+    RATE_LIMITED = "backoff"
+    TRANSIENT = "retry"
+    FATAL = "raise"
+
+
+def classify(error: BaseException) -> ErrorClass:
+    """What a failed `eth_getLogs` calls for"""
+    if isinstance(error, BlockRangeError):
+        return ErrorClass.RANGE_TOO_LARGE
+    if isinstance(error, EndpointError) and error.__cause__ is not None:
+        # the endpoint pool wraps the transport's exception, which tells what went wrong
+        cause_class = classify(error.__cause__)
+        if cause_class is not ErrorClass.FATAL:
+            return cause_class
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        if status == 429:
+            return ErrorClass.RATE_LIMITED
+        if status == 413:
+            return ErrorClass.RANGE_TOO_LARGE
+        if status >= 500:
+            return ErrorClass.TRANSIENT
+    if isinstance(error, requests.ConnectTimeout):
+        return ErrorClass.TRANSIENT
+    # Go Ethereum gives up on large ranges with a read timeout ("context was cancelled" on the server side)
+    # https://github.com/ethereum/go-ethereum/issues/20426
+    if isinstance(error, (requests.Timeout, asyncio.TimeoutError)):
+        return ErrorClass.RANGE_TOO_LARGE
+
+    message = str(error).lower()
+    if any(text in message for text in RANGE_LIMIT_ERRORS):
+        return ErrorClass.RANGE_TOO_LARGE
+    if any(text in message for text in RATE_LIMIT_ERRORS) or "429" in message:
+        return ErrorClass.RATE_LIMITED
+    if isinstance(error, (requests.ConnectionError, ConnectionError, EndpointError)):
+        return ErrorClass.TRANSIENT
+    if type(error).__module__.startswith("aiohttp") or any(text in message for text in TRANSIENT_ERRORS):
+        return ErrorClass.TRANSIENT
+    # web3 raises JSON-RPC errors as ValueError({"code": ..., "message": ...}), the node may serve a retry
+    if type(error) is ValueError and error.args and isinstance(error.args[0], dict) and "code" in error.args[0]:
+        return ErrorClass.TRANSIENT
+    return ErrorClass.FATAL
+
+
+@dataclass
+class RetryPolicy:
+    """How a scanner retries the block ranges it fetches"""
+
+    # attempts of one block range, splits don't count
+    retries: int = 30
+    # first rate limit backoff, doubled on every retry
+    backoff_seconds: float = 3.0
+    max_backoff_seconds: float = 60.0
+    # transient errors are retried right away this many times, then backed off
+    immediate_retries: int = 2
+    # the range limit doubles after this many ranges fetched in a row without a split
+    recovery_fetches: int = 10
+
+    def __post_init__(self) -> None:
+        # chunk size (blocks past the start block) of the pieces of the smallest range we had to split,
+        # the scanner keeps its chunks below it until the node serves wider ones again
+        self.range_limit: Optional[int] = None
+        self._fetched_since_split = 0
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter exponential backoff"""
+        return random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2**attempt))
+
+    def decide(self, error: BaseException, start_block: int, end_block: int, attempt: int) -> Tuple[ErrorClass, float]:
+        """The class of the error and the seconds to wait before retrying, raise `error` if we shouldn't"""
+        error_class = classify(error)
+        if error_class is ErrorClass.RANGE_TOO_LARGE and start_block == end_block:
+            # a single block can't be split, the node may serve it later
+            error_class = ErrorClass.TRANSIENT
+        if error_class is ErrorClass.FATAL or attempt >= self.retries - 1:
+            metrics.RETRY_DECISIONS.labels("raise").inc()
+            if error_class is not ErrorClass.FATAL:
+                logging.warning("Out of retries")
+            raise error
+
+        metrics.RETRY_DECISIONS.labels(error_class.value).inc()
+        delay = 0.0
+        if error_class is ErrorClass.RATE_LIMITED:
+            delay = self.backoff(attempt)
+        elif error_class is ErrorClass.TRANSIENT and attempt >= self.immediate_retries:
+            delay = self.backoff(attempt - self.immediate_retries)
+        elif error_class is ErrorClass.RANGE_TOO_LARGE:
+            piece = (end_block - start_block) // 2
+            self.range_limit = piece if self.range_limit is None else min(self.range_limit, piece)
+            self._fetched_since_split = 0
+        logging.warning(
+            "Fetching events for block range %d - %d (%d) failed with %s, %s in %.1f seconds",
+            start_block,
+            end_block,
+            end_block - start_block,
+            error,
+            "splitting it" if error_class is ErrorClass.RANGE_TOO_LARGE else "retrying",
+            delay,
+        )
+        return error_class, delay
+
+    def split(self, error: BaseException, start_block: int, end_block: int) -> List[Tuple[int, int]]:
+        """Sub ranges to fetch instead of a refused range"""
+        size = end_block - start_block + 1
+        piece = (size + 1) // 2
+        if isinstance(error, BlockRangeError):
+            piece = max(1, min(piece, error.max_block_range))
+        return [(block, min(block + piece - 1, end_block)) for block in range(start_block, end_block + 1, piece)]
+
+    def fetch(self, func: Callable[[int, int], List[EventData]], start_block: int, end_block: int) -> List[EventData]:
+        """Events of the whole block range, fetched in as many sub ranges as the node needs"""
+        for attempt in range(self.retries):
+            try:
+                events = func(start_block, end_block)
+                self.fetched()
+                return events
+            except Exception as e:
+                error_class, delay = self.decide(e, start_block, end_block, attempt)
+                if error_class is ErrorClass.RANGE_TOO_LARGE:
+                    events = []
+                    for sub_start, sub_end in self.split(e, start_block, end_block):
+                        events += self.fetch(func, sub_start, sub_end)
+                    return events
+                if delay:
+                    sleep(delay)
+        raise AssertionError("unreachable, the last attempt raises")
+
+    def fetched(self) -> None:
+        """A range was fetched whole, a timeout or a busy node shouldn't keep the chunks small for good"""
+        if self.range_limit is None:
+            return
+        self._fetched_since_split += 1
+        if self._fetched_since_split >= self.recovery_fetches:
+            self.range_limit = 2 * self.range_limit + 1
+            self._fetched_since_split = 0
+
+    async def async_fetch(
+        self, func: Callable[[int, int], Awaitable[List[EventData]]], start_block: int, end_block: int
+    ) -> List[EventData]:
+        """`fetch` for an async `func`"""
+        for attempt in range(self.retries):
+            try:
+                events = await func(start_block, end_block)
+                self.fetched()
+                return events
+            except Exception as e:
+                error_class, delay = self.decide(e, start_block, end_block, attempt)
+                if error_class is ErrorClass.RANGE_TOO_LARGE:
+                    events = []
+                    for sub_start, sub_end in self.split(e, start_block, end_block):
+                        events += await self.async_fetch(func, sub_start, sub_end)
+                    return events
+                if delay:
+                    await asyncio.sleep(delay)
+        raise AssertionError("unreachable, the last attempt raises")
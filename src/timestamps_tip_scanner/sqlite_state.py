@@ -0,0 +1,361 @@
+import json
+import logging
+import os
+import sqlite3
+from time import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from eth_typing.evm import ChecksumAddress
+from eth_utils import to_checksum_address
+from hexbytes import HexBytes
+
+from timestamps_tip_scanner import metrics
+from timestamps_tip_scanner import tracing
+from timestamps_tip_scanner.block_resolver import BlockResolver
+from timestamps_tip_scanner.constants import REPORTS_DB_FILENAME
+from timestamps_tip_scanner.constants import SHARED_SCAN_ADDRESS
+from timestamps_tip_scanner.constants import STATE_BACKEND
+from timestamps_tip_scanner.jsonified_state import JSONifiedState
+from timestamps_tip_scanner.timestamps import SortedTimestamps
+from timestamps_tip_scanner.utils import EventData
+
+# by the scan that indexed them (a reporter's own or the shared one), a reset drops only its own scan's reports
+REPORTS_TABLE = """
+CREATE TABLE IF NOT EXISTS reports (
+    chain TEXT NOT NULL,
+    reporter TEXT NOT NULL,
+    query_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    scanner TEXT NOT NULL,
+    PRIMARY KEY (chain, reporter, query_id, timestamp, scanner)
+) WITHOUT ROWID;
+"""
+
+SCHEMA = (
+    REPORTS_TABLE
+    + """
+CREATE TABLE IF NOT EXISTS scan_progress (
+    chain TEXT NOT NULL,
+    reporter TEXT NOT NULL,
+    last_scanned_block INTEGER NOT NULL,
+    last_scanned_time INTEGER,
+    PRIMARY KEY (chain, reporter)
+);
+
+-- checkpoints and reports of the last, not yet final, blocks, to detect and roll back reorgs,
+-- by scan (a reporter's own or the shared one)
+CREATE TABLE IF NOT EXISTS block_hashes (
+    chain TEXT NOT NULL,
+    scanner TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    block_hash TEXT NOT NULL,
+    PRIMARY KEY (chain, scanner, block_number)
+);
+
+CREATE TABLE IF NOT EXISTS recent_reports (
+    chain TEXT NOT NULL,
+    scanner TEXT NOT NULL,
+    reporter TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    query_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (chain, scanner, reporter, query_id, timestamp)
+);
+
+-- the shared scan of many reporters, its progress is in scan_progress under SHARED_SCAN_ADDRESS
+CREATE TABLE IF NOT EXISTS shared_scans (
+    chain TEXT PRIMARY KEY,
+    first_block INTEGER NOT NULL,
+    -- JSON list of the reporters scanned, NULL for all of them
+    reporters TEXT
+);
+"""
+)
+
+
+class SQLiteState(JSONifiedState):
+    """Store the state of scanned blocks and all events in SQLite.
+
+    Same interface as `JSONifiedState`, but events are inserted as they come,
+    every chunk is committed as a small transaction and reads are indexed queries,
+    instead of rewriting and re-parsing one big JSON file.
+    """
+
+    def __init__(
+        self,
+        chain_id: int,
+        address: str,
+        db_path: str = REPORTS_DB_FILENAME,
+        block_resolver: Optional[BlockResolver] = None,
+    ) -> None:
+        super().__init__(chain_id=chain_id, address=address, block_resolver=block_resolver)
+        self.db_path = db_path
+        # scans of other chains write to the same file concurrently, wait for their commits
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        # readers (API, claims) don't block the scanner writing
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.last_scanned_block: Optional[int] = None
+
+    def _migrate(self) -> None:
+        """Record the scans of the reports of a database from before reports had one.
+
+        Which scan indexed them is unknown, they are kept for the reporter's own scan and the chain's shared scan.
+        """
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(reports)")]
+        if "scanner" in columns:
+            return
+        logging.info(f"Recording the scans of the reports in {self.db_path}")
+        self.conn.execute("ALTER TABLE reports RENAME TO unscoped_reports")
+        self.conn.execute(REPORTS_TABLE)
+        self.conn.execute(
+            "INSERT INTO reports SELECT chain, reporter, query_id, timestamp, reporter FROM unscoped_reports"
+        )
+        self.conn.execute(
+            "INSERT OR IGNORE INTO reports SELECT unscoped.chain, reporter, query_id, timestamp, ? "
+            "FROM unscoped_reports AS unscoped JOIN shared_scans ON shared_scans.chain = unscoped.chain",
+            (SHARED_SCAN_ADDRESS,),
+        )
+        self.conn.execute("DROP TABLE unscoped_reports")
+        self.conn.commit()
+
+    def reset(self, starter_block: Optional[int] = None) -> None:
+        """Create initial state of nothing scanned, committed with the first chunk."""
+        if starter_block is not None:
+            logging.info(f"Scan starting from block: {starter_block}")
+        else:
+            starter_block = self.default_start_block()
+            logging.info(f"Starting block was not selected so starting from: {starter_block}")
+
+        for table in ("reports", "block_hashes", "recent_reports"):
+            self.conn.execute(f"DELETE FROM {table} WHERE chain = ? AND scanner = ?", (self.chain_name, self.address))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO scan_progress VALUES (?, ?, ?, NULL)",
+            (self.chain_name, self.address, int(starter_block)),
+        )
+        if self.shared:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO shared_scans VALUES (?, ?, NULL)", (self.chain_name, int(starter_block))
+            )
+        self.last_scanned_block = int(starter_block)
+
+    def load(self) -> None:
+        """Reads are queries on the database, nothing to load."""
+
+    def restore(self) -> None:
+        """Restore the last scan state from the database."""
+        row = self.conn.execute(
+            "SELECT last_scanned_block FROM scan_progress WHERE chain = ? AND reporter = ?",
+            (self.chain_name, self.address),
+        ).fetchone()
+        if row is None:
+            logging.info("State starting from scratch")
+            self.reset()
+        else:
+            self.last_scanned_block = row[0]
+            logging.info(f"Restored existing state, last block scan ended at {self.last_scanned_block}")
+
+    def save(self) -> None:
+        """Commit everything we have scanned so far."""
+        with tracing.span("state_save", backend="sqlite", chain=self.chain_name) as span:
+            with metrics.observe_seconds(metrics.STATE_SAVE_SECONDS.labels("sqlite")):
+                self.conn.commit()
+            if os.path.isfile(self.db_path):
+                size = os.path.getsize(self.db_path)
+                span.set(bytes=size)
+                metrics.STATE_SAVE_BYTES.labels("sqlite").set(size)
+        self.last_save = int(time())
+
+    def version(self) -> Optional[Tuple[str, int, int]]:
+        """Changes whenever a commit may have changed the database: mtimes and sizes of the database and its WAL"""
+        try:
+            stats = [os.stat(path) for path in (self.db_path, f"{self.db_path}-wal") if os.path.isfile(path)]
+        except OSError:
+            return None
+        if not stats:
+            return None
+        return self.db_path, max(stat.st_mtime_ns for stat in stats), sum(stat.st_size for stat in stats)
+
+    def get_last_scanned_block(self) -> int:
+        """The number of the last block we have stored."""
+        assert self.last_scanned_block is not None, "State was not restored or reset"
+        return self.last_scanned_block
+
+    def end_chunk(self, block_number: int) -> None:
+        """Commit the chunk, so we can resume in the case of a crash or CTRL+C"""
+        current_time = int(time())
+        self.conn.execute(
+            "UPDATE scan_progress SET last_scanned_block = ?, last_scanned_time = ? WHERE chain = ? AND reporter = ?",
+            (block_number, current_time, self.chain_name, self.address),
+        )
+        self.last_scanned_block = block_number
+        self.save()
+
+    def shared_reporters(self) -> Optional[List[ChecksumAddress]]:
+        """Reporters the shared scan indexes, None for all of them"""
+        row = self.conn.execute("SELECT reporters FROM shared_scans WHERE chain = ?", (self.chain_name,)).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def set_shared_reporters(self, reporters: Optional[List[ChecksumAddress]]) -> None:
+        self.conn.execute(
+            "UPDATE shared_scans SET reporters = ? WHERE chain = ?",
+            (None if reporters is None else json.dumps(sorted(reporters)), self.chain_name),
+        )
+
+    def shared_first_block(self) -> int:
+        """The block the shared scan started from"""
+        row = self.conn.execute("SELECT first_block FROM shared_scans WHERE chain = ?", (self.chain_name,)).fetchone()
+        return row[0] if row else self.get_last_scanned_block()
+
+    def process_event(self, event: EventData, final_block: Optional[int] = None) -> str:
+        """Record NewReport event and tip eligible timestamps, see `JSONifiedState.process_event`."""
+        args = event.args
+        report = (self.chain_name, to_checksum_address(args._reporter), HexBytes(args._queryId).hex(), args._time)
+        inserted = self.conn.execute(
+            "INSERT OR IGNORE INTO reports VALUES (?, ?, ?, ?, ?)", (*report, self.address)
+        ).rowcount
+        if final_block is None or event.blockNumber > final_block:
+            if inserted:
+                # journal it with its block so a reorg can roll it back
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO recent_reports VALUES (?, ?, ?, ?, ?, ?)",
+                    (report[0], self.address, report[1], event.blockNumber, *report[2:]),
+                )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO block_hashes VALUES (?, ?, ?, ?)",
+                (self.chain_name, self.address, event.blockNumber, HexBytes(event.blockHash).hex()),
+            )
+        return f"{event.transactionHash.hex()}-{event.logIndex}"
+
+    def merge_reports(self, reporter_addr: str, reports: Dict[str, List[int]]) -> None:
+        """Add a reporter's timestamps by query id scanned by another state (e.g. a backfill partition)"""
+        reporter_addr = to_checksum_address(reporter_addr)
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO reports VALUES (?, ?, ?, ?, ?)",
+            (
+                (self.chain_name, reporter_addr, query_id, timestamp, self.address)
+                for query_id, timestamps in reports.items()
+                for timestamp in timestamps
+            ),
+        )
+
+    def record_block_hash(self, block_number: int, block_hash: str) -> None:
+        """Checkpoint a scanned block, checked against the node on the next run to detect reorgs"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO block_hashes VALUES (?, ?, ?, ?)",
+            (self.chain_name, self.address, block_number, HexBytes(block_hash).hex()),
+        )
+
+    def block_checkpoints(self) -> List[Tuple[int, str]]:
+        """Recorded (block number, block hash), newest first"""
+        return self.conn.execute(
+            "SELECT block_number, block_hash FROM block_hashes WHERE chain = ? AND scanner = ? "
+            "ORDER BY block_number DESC",
+            (self.chain_name, self.address),
+        ).fetchall()
+
+    def prune_reorg_journal(self, final_block: int) -> None:
+        """Forget checkpoints and journaled reports up to `final_block`, these can't be reorged anymore"""
+        for table in ("block_hashes", "recent_reports"):
+            self.conn.execute(
+                f"DELETE FROM {table} WHERE chain = ? AND scanner = ? AND block_number <= ?",
+                (self.chain_name, self.address, final_block),
+            )
+
+    def rollback_to(self, block_number: int) -> None:
+        """Drop the reports recorded from blocks after `block_number` (orphaned by a reorg) and resume from it"""
+        params = (self.chain_name, self.address, block_number)
+        self.conn.execute(
+            "DELETE FROM reports WHERE (chain, reporter, query_id, timestamp, scanner) IN ("
+            "SELECT chain, reporter, query_id, timestamp, scanner FROM recent_reports "
+            "WHERE chain = ? AND scanner = ? AND block_number > ?)",
+            params,
+        )
+        for table in ("block_hashes", "recent_reports"):
+            self.conn.execute(f"DELETE FROM {table} WHERE chain = ? AND scanner = ? AND block_number > ?", params)
+        self.conn.execute(
+            "UPDATE scan_progress SET last_scanned_block = ? WHERE chain = ? AND reporter = ?",
+            (block_number, self.chain_name, self.address),
+        )
+        self.last_scanned_block = block_number
+        self.save()
+
+    def _reports_by_reporter(self, reporter: Optional[str] = None) -> Dict[ChecksumAddress, Dict[str, Any]]:
+        """Saved reports in the same layout as the JSON state: {reporter: {query_id: [timestamps], ...}}"""
+        where, params = "chain = ?", [self.chain_name]
+        if reporter is not None:
+            where, params = "chain = ? AND reporter = ?", [self.chain_name, reporter]
+
+        served: Dict[ChecksumAddress, Dict[str, Any]] = {}
+        for reporter_addr, last_block, last_time in self.conn.execute(
+            f"SELECT reporter, last_scanned_block, last_scanned_time FROM scan_progress WHERE {where}", params
+        ):
+            served[reporter_addr] = {"last_scanned_block": last_block, "last_scanned_time": last_time}
+        for reporter_addr, query_id, timestamp in self.conn.execute(
+            f"SELECT DISTINCT reporter, query_id, timestamp FROM reports WHERE {where} "
+            "ORDER BY reporter, query_id, timestamp",
+            params,
+        ):
+            served.setdefault(reporter_addr, {}).setdefault(query_id, []).append(timestamp)
+        return served
+
+    def serve(self) -> Dict[ChecksumAddress, Any]:
+        return self._reports_by_reporter()
+
+    def timestampsperEOA(self, EOA: ChecksumAddress) -> Any:
+        return self._reports_by_reporter(EOA).get(EOA)
+
+    def read_reports(self) -> Optional[Dict[str, SortedTimestamps]]:
+        """Saved report timestamps of our reporter by query id, from their own and the shared scans"""
+        rows: Dict[str, List[int]] = {}
+        for query_id, timestamp in self.conn.execute(
+            "SELECT DISTINCT query_id, timestamp FROM reports WHERE chain = ? AND reporter = ? "
+            "ORDER BY query_id, timestamp",
+            (self.chain_name, self.address),
+        ):
+            rows.setdefault(query_id, []).append(timestamp)
+        # DISTINCT keeps them unique (own and shared scans) and ORDER BY sorted
+        reports = {query_id: SortedTimestamps.from_sorted(timestamps) for query_id, timestamps in rows.items()}
+        if not reports and not self._scans_of_reporter():
+            logging.info(f"No reports for address {self.address}")
+            return None
+        return reports
+
+    def _scans_of_reporter(self) -> List[Optional[int]]:
+        """`last_scanned_time` of our reporter's own scan and of the shared scan if it covers them"""
+        scan_times = []
+        for reporter_addr, last_time in self.conn.execute(
+            "SELECT reporter, last_scanned_time FROM scan_progress WHERE chain = ? AND reporter IN (?, ?)",
+            (self.chain_name, self.address, SHARED_SCAN_ADDRESS),
+        ):
+            if reporter_addr == self.address or self.covered_by_shared_scan(self.shared_reporters()):
+                scan_times.append(last_time)
+        return scan_times
+
+    def last_scanned_time(self) -> Optional[int]:
+        """When the latest saved scan of our reporter, their own or a shared one, ended"""
+        return max((scan_time for scan_time in self._scans_of_reporter() if scan_time), default=None)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    @staticmethod
+    def delete_file() -> None:
+        for path in (REPORTS_DB_FILENAME, f"{REPORTS_DB_FILENAME}-wal", f"{REPORTS_DB_FILENAME}-shm"):
+            if os.path.isfile(path):
+                try:
+                    os.remove(path)
+                except Exception as e:
+                    print(f"Error deleting the file {path}: {e}")
+
+
+def open_state(chain_id: int, address: str, block_resolver: Optional[BlockResolver] = None) -> JSONifiedState:
+    """State store selected by the STATE_BACKEND env variable"""
+    if STATE_BACKEND == "sqlite":
+        return SQLiteState(chain_id=chain_id, address=address, block_resolver=block_resolver)
+    return JSONifiedState(chain_id=chain_id, address=address, block_resolver=block_resolver)
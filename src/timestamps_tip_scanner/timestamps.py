@@ -0,0 +1,111 @@
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Set
+
+
+class SortedTimestamps:
+    """Sorted, deduplicated report timestamps stored as a compact unsigned 64 bit array.
+
+    Lookups are binary searches, and inserting in scan order (the common case) is an append.
+    Timestamps inserted out of order (a rescan, merged partitions) are O(log n) each: they are held
+    apart and merged into the array in one pass of O(n + k log k) on the next read.
+    Serialized to JSON as a plain sorted list.
+    """
+
+    __slots__ = ("_timestamps", "_pending")
+
+    def __init__(self, timestamps: Iterable[int] = ()) -> None:
+        self._timestamps = array("Q", sorted(set(timestamps)))
+        # inserted out of order, all below the array's last timestamp
+        self._pending: Set[int] = set()
+
+    @classmethod
+    def from_sorted(cls, timestamps: Iterable[int]) -> "SortedTimestamps":
+        """Build from timestamps already sorted and deduplicated (e.g. an ORDER BY query)"""
+        instance = cls()
+        instance._timestamps.extend(timestamps)
+        return instance
+
+    def add(self, timestamp: int) -> bool:
+        """Insert a timestamp, return False if it was already there"""
+        timestamps = self._timestamps
+        if not timestamps or timestamp > timestamps[-1]:
+            timestamps.append(timestamp)
+            return True
+        if timestamp in self:
+            return False
+        self._pending.add(timestamp)
+        return True
+
+    def _merged(self) -> "array[int]":
+        """The array with the timestamps inserted out of order merged in"""
+        if self._pending:
+            timestamps = self._timestamps
+            merged = array("Q")
+            start = 0
+            for timestamp in sorted(self._pending):
+                end = bisect_left(timestamps, timestamp, start)
+                merged += timestamps[start:end]
+                merged.append(timestamp)
+                start = end
+            merged += timestamps[start:]
+            self._timestamps = merged
+            self._pending.clear()
+        return self._timestamps
+
+    def discard(self, timestamp: int) -> None:
+        timestamps = self._merged()
+        i = bisect_left(timestamps, timestamp)
+        if i < len(timestamps) and timestamps[i] == timestamp:
+            del timestamps[i]
+
+    def between(self, after: int, before: int) -> List[int]:
+        """Timestamps strictly after `after` and strictly before `before`"""
+        timestamps = self._merged()
+        start = bisect_right(timestamps, after)
+        end = bisect_left(timestamps, before)
+        return timestamps[start:end].tolist()
+
+    def before(self, before: int) -> List[int]:
+        """Timestamps strictly before `before`"""
+        timestamps = self._merged()
+        return timestamps[: bisect_left(timestamps, before)].tolist()
+
+    def tolist(self) -> List[int]:
+        return self._merged().tolist()
+
+    def __contains__(self, timestamp: object) -> bool:
+        if not isinstance(timestamp, int):
+            return False
+        if timestamp in self._pending:
+            return True
+        i = bisect_left(self._timestamps, timestamp)
+        return i < len(self._timestamps) and self._timestamps[i] == timestamp
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._merged())
+
+    def __len__(self) -> int:
+        return len(self._timestamps) + len(self._pending)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, SortedTimestamps):
+            return self._merged() == other._merged()
+        if isinstance(other, list):
+            return self.tolist() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"SortedTimestamps({self.tolist()})"
+
+
+def json_default(obj: Any) -> Any:
+    """`default` for json.dump(s), so states holding SortedTimestamps serialize as lists"""
+    if isinstance(obj, SortedTimestamps):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
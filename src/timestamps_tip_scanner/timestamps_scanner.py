@@ -1,59 +1,286 @@
+import asyncio
 import logging
 import os
+import threading
 import time
+from typing import Any
+from typing import Dict
+from typing import List
 from typing import Optional
+from typing import Tuple
 
 from eth_typing import ChecksumAddress
+from eth_utils import to_checksum_address
+from hexbytes import HexBytes
 from tqdm import tqdm
 from web3 import Web3
 from web3.contract import Contract
 
+from timestamps_tip_scanner.async_event_scanner import AsyncEventScanner
+from timestamps_tip_scanner.block_resolver import BlockResolver
+from timestamps_tip_scanner.constants import SHARED_SCAN_ADDRESS
 from timestamps_tip_scanner.event_scanner import EventScanner
 from timestamps_tip_scanner.jsonified_state import JSONifiedState
+from timestamps_tip_scanner.log_cache import open_log_cache
+from timestamps_tip_scanner.sqlite_state import open_state
 
 
-def run(
+def new_report_filters(
+    tellorflex_contract: Contract,
+    reporter: Any,
+    query_ids: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """getLogs filters for NewReport events of a reporter, of a list of reporters or of all (None),
+    optionally restricted to some query ids"""
+    filters: Dict[str, Any] = {"address": tellorflex_contract.address}
+    if reporter is not None:
+        filters["_reporter"] = reporter
+    if query_ids:
+        filters["_queryId"] = [HexBytes(query_id) for query_id in query_ids]
+    return filters
+
+
+def new_report_scanner(
     *,
     w3: Web3,
     reporter: ChecksumAddress,
     tellorflex_contract: Contract,
     chain_id: int,
     starting_block: Optional[int] = None,
-) -> JSONifiedState:
-    """Scan the Ethereum blockchain for events and store them in a JSON file."""
+    query_ids: Optional[List[str]] = None,
+    batch_size: Optional[int] = None,
+    since: Optional[int] = None,
+    fetch_slots: Optional[threading.Semaphore] = None,
+) -> EventScanner:
+    """Restore the reporter's state and build a NewReport scanner over it.
+
+    The state is reset to start from `starting_block`, or from the first block at or after the `since` timestamp.
+    `fetch_slots` bounds the `eth_getLogs` requests in flight together with other scanners (see `EventScanner`).
+    """
+    block_resolver = BlockResolver(w3, chain_id)
+    if starting_block is None and since is not None:
+        starting_block = block_resolver.first_block_since(since)
 
     # Restore/create our persistent state
-    state = JSONifiedState(chain_id=chain_id, address=reporter)
+    state = open_state(chain_id=chain_id, address=reporter, block_resolver=block_resolver)
     if starting_block is None:
         state.restore()
     else:
         state.reset(starting_block)
 
-    max_batch_scan_size = int(os.getenv("BATCH_SIZE", 100000))
+    return _event_scanner(
+        w3=w3,
+        state=state,
+        reporter=reporter,
+        tellorflex_contract=tellorflex_contract,
+        filters=new_report_filters(tellorflex_contract, reporter, query_ids),
+        batch_size=batch_size,
+        fetch_slots=fetch_slots,
+    )
+
+
+def _event_scanner(
+    *,
+    w3: Web3,
+    state: JSONifiedState,
+    reporter: Optional[ChecksumAddress],
+    tellorflex_contract: Contract,
+    filters: Dict[str, Any],
+    batch_size: Optional[int] = None,
+    fetch_slots: Optional[threading.Semaphore] = None,
+) -> EventScanner:
+    if batch_size is None:
+        batch_size = int(os.getenv("RPC_BATCH_SIZE", 1))
 
-    scanner = EventScanner(
+    return EventScanner(
         web3=w3,
         state=state,
         reporter=reporter,
         contract=tellorflex_contract,
         events=[tellorflex_contract.events.NewReport],
-        filters={"address": tellorflex_contract.address},
+        filters=filters,
         # Infura max block ranger
-        max_chunk_scan_size=max_batch_scan_size,
+        max_chunk_scan_size=int(os.getenv("BATCH_SIZE", 100000)),
+        batch_size=batch_size,
+        log_cache=open_log_cache(state.chain_id),
+        fetch_slots=fetch_slots,
+    )
+
+
+def parse_reporters(value: str) -> Optional[List[ChecksumAddress]]:
+    """Reporters of a shared scan from "all" (None) or comma separated addresses"""
+    if value.strip().lower() == "all":
+        return None
+    reporters = sorted({to_checksum_address(address.strip()) for address in value.split(",") if address.strip()})
+    if not reporters:
+        raise ValueError("No reporter addresses for the shared scan")
+    return reporters
+
+
+def shared_scan_backfill(
+    state: JSONifiedState, reporters: Optional[List[ChecksumAddress]]
+) -> Optional[Tuple[int, int, Optional[List[ChecksumAddress]]]]:
+    """Switch the shared scan state to `reporters` (None for all).
+
+    Reporters it didn't scan so far miss the blocks it already covered,
+    return that block range and those reporters (None for all), or None if there is nothing to backfill.
+    """
+    scanned = state.shared_reporters()
+    state.set_shared_reporters(reporters)
+    if scanned is None:
+        return None
+    added: Optional[List[ChecksumAddress]] = None
+    if reporters is not None:
+        added = sorted(set(reporters) - set(scanned))
+        if not added:
+            return None
+    # the next scan starts at the last scanned block, with the added reporters
+    start_block, end_block = state.shared_first_block(), state.get_last_scanned_block() - 1
+    if start_block > end_block:
+        return None
+    return start_block, end_block, added
+
+
+def new_shared_report_scanner(
+    *,
+    w3: Web3,
+    tellorflex_contract: Contract,
+    chain_id: int,
+    reporters: Optional[List[ChecksumAddress]] = None,
+    starting_block: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    since: Optional[int] = None,
+) -> EventScanner:
+    """Restore the shared scan state and build a NewReport scanner of `reporters` (None for all) over it.
+
+    One scan indexes the reports of every reporter by address, so the RPC cost grows with the chain
+    rather than with the chain times the reporters. Reporters added since the last run are first backfilled
+    over the blocks already scanned, from the log cache if one covers them.
+    """
+    block_resolver = BlockResolver(w3, chain_id)
+    if starting_block is None and since is not None:
+        starting_block = block_resolver.first_block_since(since)
+
+    state = open_state(chain_id=chain_id, address=SHARED_SCAN_ADDRESS, block_resolver=block_resolver)
+    if starting_block is None:
+        state.restore()
+    else:
+        state.reset(starting_block)
+
+    backfill = shared_scan_backfill(state, reporters)
+    if backfill is not None:
+        start_block, end_block, added = backfill
+        logging.info(f"Backfilling reports of {added or 'all reporters'} from blocks {start_block} - {end_block}")
+        backfill_scanner = _event_scanner(
+            w3=w3,
+            state=state,
+            reporter=None,
+            tellorflex_contract=tellorflex_contract,
+            filters=new_report_filters(tellorflex_contract, added),
+            batch_size=batch_size,
+        )
+        # the head query sets the last final block, logs fetched up to it go to the log cache
+        backfill_scanner.get_suggested_scan_end_block()
+        backfill_scanner.process_events(backfill_scanner.fetch_range(start_block, end_block))
+        state.save()
+
+    return _event_scanner(
+        w3=w3,
+        state=state,
+        reporter=None,
+        tellorflex_contract=tellorflex_contract,
+        filters=new_report_filters(tellorflex_contract, reporters),
+        batch_size=batch_size,
+    )
+
+
+def run(
+    *,
+    w3: Web3,
+    reporter: ChecksumAddress,
+    tellorflex_contract: Contract,
+    chain_id: int,
+    starting_block: Optional[int] = None,
+    query_ids: Optional[List[str]] = None,
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    since: Optional[int] = None,
+) -> JSONifiedState:
+    """Scan the Ethereum blockchain for events and store them in the state backend (JSON file or SQLite).
+
+    Reports are filtered by reporter (and by `query_ids` if given) on the node through the indexed
+    `_reporter` and `_queryId` topics of `NewReport`.
+    With more than one worker, block ranges are fetched concurrently (see `EventScanner.scan_parallel`),
+    otherwise `batch_size` chunks are fetched per JSON-RPC batch request.
+    `since` (a unix timestamp) restarts the scan from the first block mined at or after it.
+    """
+    scanner = new_report_scanner(
+        w3=w3,
+        reporter=reporter,
+        tellorflex_contract=tellorflex_contract,
+        chain_id=chain_id,
+        starting_block=starting_block,
+        query_ids=query_ids,
+        batch_size=batch_size,
+        since=since,
+    )
+    return scan_to_head(scanner, workers)
+
+
+def run_shared(
+    *,
+    w3: Web3,
+    tellorflex_contract: Contract,
+    chain_id: int,
+    reporters: Optional[List[ChecksumAddress]] = None,
+    starting_block: Optional[int] = None,
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    since: Optional[int] = None,
+) -> JSONifiedState:
+    """Same as `run`, for the NewReport events of all `reporters` (None for every reporter) in one pass.
+
+    See `new_shared_report_scanner`, the reports are served per reporter by any state of them.
+    """
+    scanner = new_shared_report_scanner(
+        w3=w3,
+        tellorflex_contract=tellorflex_contract,
+        chain_id=chain_id,
+        reporters=reporters,
+        starting_block=starting_block,
+        batch_size=batch_size,
+        since=since,
     )
+    return scan_to_head(scanner, workers)
+
+
+def scan_to_head(scanner: EventScanner, workers: Optional[int] = None, progress: bool = True) -> JSONifiedState:
+    """Scan from the last scanned block to the chain head and save the scanner's state
+
+    `progress` renders a progress bar in the console.
+    """
+    state = scanner.state
+    max_batch_scan_size = scanner.max_scan_chunk_size
+    if workers is None:
+        workers = int(os.getenv("SCAN_WORKERS", 1))
+
     # Scan from [last block scanned] - [latest ethereum block]
-    # Note that our chain reorg safety blocks cannot go negative
 
-    start_block = state.get_last_scanned_block()
+    # Rolls back reports from orphaned blocks if the chain was reorganised since the last scan
+    start_block = scanner.get_suggested_scan_start_block()
     end_block = scanner.get_suggested_scan_end_block()
 
-    blocks_to_scan = end_block - start_block
-
     logging.info(f"Scanning events from blocks {start_block} - {end_block}")
+    if start_block > end_block:
+        # the head hasn't moved past the last scanned block
+        state.save()
+        return state
+
+    blocks_to_scan = end_block - start_block
 
     # Render a progress bar in the console
     start = time.time()
-    with tqdm(total=blocks_to_scan) as progress_bar:
+    with tqdm(total=blocks_to_scan, disable=not progress) as progress_bar:
 
         def _update_progress(current: int, chunk_size: int, events_count: int) -> None:
             progress_bar.set_description(
@@ -63,12 +290,21 @@ def run(
             progress_bar.update(chunk_size)
 
         # Run the scan
-        result, total_chunks_scanned = scanner.scan(
-            start_block,
-            end_block,
-            progress_callback=_update_progress,
-            start_chunk_size=max_batch_scan_size,
-        )
+        if workers > 1:
+            result, total_chunks_scanned = scanner.scan_parallel(
+                start_block,
+                end_block,
+                chunk_size=max_batch_scan_size,
+                max_workers=workers,
+                progress_callback=_update_progress,
+            )
+        else:
+            result, total_chunks_scanned = scanner.scan(
+                start_block,
+                end_block,
+                progress_callback=_update_progress,
+                start_chunk_size=max_batch_scan_size,
+            )
 
     state.save()
     duration = time.time() - start
@@ -78,3 +314,126 @@ def run(
     )
 
     return state
+
+
+async def async_run(
+    *,
+    w3: Web3,
+    reporter: ChecksumAddress,
+    tellorflex_contract: Contract,
+    chain_id: int,
+    starting_block: Optional[int] = None,
+    query_ids: Optional[List[str]] = None,
+    workers: Optional[int] = None,
+    block_resolver: Optional[BlockResolver] = None,
+) -> JSONifiedState:
+    """Same as `run` but awaitable, `w3` must be an async Web3 (see `async_event_scanner.async_web3`).
+
+    `block_resolver` (over a sync Web3) finds the start block when there is no saved state.
+    Loading and saving the state, and the block resolver's search, run in the threadpool.
+    """
+
+    state = open_state(chain_id=chain_id, address=reporter, block_resolver=block_resolver)
+    if starting_block is None:
+        await asyncio.to_thread(state.restore)
+    else:
+        await asyncio.to_thread(state.reset, starting_block)
+
+    scanner = _async_event_scanner(
+        w3=w3,
+        state=state,
+        reporter=reporter,
+        tellorflex_contract=tellorflex_contract,
+        filters=new_report_filters(tellorflex_contract, reporter, query_ids),
+    )
+    return await async_scan_to_head(scanner, workers)
+
+
+async def async_run_shared(
+    *,
+    w3: Web3,
+    tellorflex_contract: Contract,
+    chain_id: int,
+    reporters: Optional[List[ChecksumAddress]] = None,
+    workers: Optional[int] = None,
+    block_resolver: Optional[BlockResolver] = None,
+) -> JSONifiedState:
+    """Same as `run_shared` but awaitable, resuming the shared scan (see `async_run`)"""
+    state = open_state(chain_id=chain_id, address=SHARED_SCAN_ADDRESS, block_resolver=block_resolver)
+    await asyncio.to_thread(state.restore)
+
+    backfill = shared_scan_backfill(state, reporters)
+    if backfill is not None:
+        start_block, end_block, added = backfill
+        logging.info(f"Backfilling reports of {added or 'all reporters'} from blocks {start_block} - {end_block}")
+        backfill_scanner = _async_event_scanner(
+            w3=w3,
+            state=state,
+            reporter=None,
+            tellorflex_contract=tellorflex_contract,
+            filters=new_report_filters(tellorflex_contract, added),
+        )
+        await backfill_scanner.get_suggested_scan_end_block()
+        backfill_scanner.process_events(await backfill_scanner.fetch_range(start_block, end_block))
+        await asyncio.to_thread(state.save)
+
+    scanner = _async_event_scanner(
+        w3=w3,
+        state=state,
+        reporter=None,
+        tellorflex_contract=tellorflex_contract,
+        filters=new_report_filters(tellorflex_contract, reporters),
+    )
+    return await async_scan_to_head(scanner, workers)
+
+
+def _async_event_scanner(
+    *,
+    w3: Web3,
+    state: JSONifiedState,
+    reporter: Optional[ChecksumAddress],
+    tellorflex_contract: Contract,
+    filters: Dict[str, Any],
+) -> AsyncEventScanner:
+    return AsyncEventScanner(
+        web3=w3,
+        state=state,
+        reporter=reporter,
+        contract=tellorflex_contract,
+        events=[tellorflex_contract.events.NewReport],
+        filters=filters,
+        max_chunk_scan_size=int(os.getenv("BATCH_SIZE", 100000)),
+        log_cache=open_log_cache(state.chain_id),
+    )
+
+
+async def async_scan_to_head(scanner: AsyncEventScanner, workers: Optional[int] = None) -> JSONifiedState:
+    """Same as `scan_to_head` but awaitable"""
+    state = scanner.state
+    max_batch_scan_size = scanner.max_scan_chunk_size
+    if workers is None:
+        workers = int(os.getenv("SCAN_WORKERS", 1))
+
+    start_block = await scanner.get_suggested_scan_start_block()
+    end_block = await scanner.get_suggested_scan_end_block()
+    logging.info(f"Scanning events from blocks {start_block} - {end_block}")
+
+    start = time.time()
+    if start_block > end_block:
+        result: List[str] = []
+        total_chunks_scanned = 0
+    elif workers > 1:
+        result, total_chunks_scanned = await scanner.scan_parallel(
+            start_block, end_block, chunk_size=max_batch_scan_size, max_workers=workers
+        )
+    else:
+        result, total_chunks_scanned = await scanner.scan(start_block, end_block, start_chunk_size=max_batch_scan_size)
+
+    await asyncio.to_thread(state.save)
+    duration = time.time() - start
+    logging.info(
+        f"Scanned total {len(result)} TellorFlex NewReport events, in {duration} seconds, "
+        f"total {total_chunks_scanned} chunk scans performed"
+    )
+
+    return state
@@ -0,0 +1,172 @@
+"""
+Spans of the scan and tip eligibility pipelines, to break a slow request or scan down after the fact.
+
+Spans are exported in the Zipkin v2 JSON format, one per line to the file TRACE_FILE points at,
+and/or posted in batches to the collector at TRACE_COLLECTOR (Zipkin, Jaeger and the OpenTelemetry
+collector accept it, e.g. http://localhost:9411/api/v2/spans). With neither set, spans cost nothing.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import TypeVar
+
+import requests
+
+from timestamps_tip_scanner.constants import TRACE_COLLECTOR
+from timestamps_tip_scanner.constants import TRACE_FILE
+
+SERVICE_NAME = "timestamps-tip-scanner"
+
+T = TypeVar("T")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    # unix time in seconds
+    start: float
+    duration: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_zipkin(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "id": self.span_id,
+            "name": self.name,
+            "timestamp": int(self.start * 1_000_000),
+            "duration": max(1, int(self.duration * 1_000_000)),
+            "localEndpoint": {"serviceName": SERVICE_NAME},
+            "tags": {key: str(value) for key, value in self.attributes.items()},
+        }
+        if self.parent_id is not None:
+            span["parentId"] = self.parent_id
+        return span
+
+
+class _NoSpan:
+    """Handed out when tracing is off"""
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+
+class SpanExporter:
+    """Writes finished spans from a background thread, so the traced code doesn't wait on disk or network"""
+
+    def __init__(self, path: Optional[str] = None, collector: Optional[str] = None, batch_size: int = 100) -> None:
+        self.path = path
+        self.collector = collector
+        self.batch_size = batch_size
+        self.queue: "queue.Queue[Optional[Span]]" = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self.thread.start()
+
+    def export(self, span: Span) -> None:
+        self.queue.put(span)
+
+    def close(self) -> None:
+        """Export the queued spans and stop"""
+        self.queue.put(None)
+        self.thread.join(timeout=10)
+
+    def _run(self) -> None:
+        stopped = False
+        while not stopped:
+            batch: List[Span] = []
+            item = self.queue.get()
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get(timeout=1)
+                except queue.Empty:
+                    break
+            stopped = item is None
+            if batch:
+                self._write([span.to_zipkin() for span in batch])
+
+    def _write(self, spans: List[Dict[str, Any]]) -> None:
+        try:
+            if self.path:
+                with open(self.path, "at") as f:
+                    f.writelines(json.dumps(span) + "\n" for span in spans)
+            if self.collector:
+                requests.post(self.collector, json=spans, timeout=10).raise_for_status()
+        except Exception as e:
+            logging.warning(f"Exporting {len(spans)} spans failed: {e}")
+
+
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("current_span", default=None)
+_exporter: Optional[SpanExporter] = None
+
+
+def configure(path: Optional[str] = None, collector: Optional[str] = None) -> None:
+    """Export spans to `path` and/or `collector` from now on, neither turns tracing off"""
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+    _exporter = SpanExporter(path, collector) if path or collector else None
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """Time the block as a span, child of the current span of this context (thread or task).
+
+    The yielded span takes more attributes with `set`, an exception raised in the block is recorded as `error`.
+    """
+    exporter = _exporter
+    if exporter is None:
+        yield _NoSpan()
+        return
+
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else secrets.token_hex(16),
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        start=time.time(),
+        attributes=attributes,
+    )
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        exporter.export(current)
+
+
+def in_context(func: Callable[..., T]) -> Callable[..., T]:
+    """`func` bound to the current context, so spans it opens on another thread keep their parent"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+configure(TRACE_FILE, TRACE_COLLECTOR)
+atexit.register(lambda: _exporter.close() if _exporter is not None else None)
@@ -30,6 +30,8 @@ class EventData:
     logIndex: int
     transactionHash: HexBytes
     transactionIndex: int
+    # raw non indexed event data, only set by the NewReport fast decoder
+    data: HexBytes = HexBytes(b"")
 
 
 @dataclass
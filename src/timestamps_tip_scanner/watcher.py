@@ -0,0 +1,79 @@
+"""
+Resident scanner following the chain head.
+
+`run` pays for restoring the state, building the contract and scanner on every call,
+for a continuous scan of a few new blocks that setup is most of the work,
+so `Watcher` keeps the `EventScanner` and its state in memory between polls.
+"""
+import logging
+from time import sleep
+from time import time
+from typing import Callable
+from typing import List
+from typing import Optional
+
+from timestamps_tip_scanner.event_scanner import EventScanner
+
+
+class Watcher:
+    """Follow the chain head with small incremental scans at a fixed cadence.
+
+    Every poll checks the reorg checkpoints, scans the blocks mined since the last poll and
+    bumps `last_scanned_time` even when there was nothing new, so the API (see `api.main.reports_file`)
+    keeps serving the saved state instead of rescanning per request.
+    """
+
+    def __init__(self, scanner: EventScanner, interval: float = 15.0) -> None:
+        """
+        :param scanner: Scanner built over a restored (or reset) state, see `timestamps_scanner.new_report_scanner`
+        :param interval: Seconds between the start of two polls
+        """
+        self.scanner = scanner
+        self.state = scanner.state
+        self.interval = interval
+        # a reset state's last block is where to start from, a restored state's was scanned already
+        self.include_last_block = True
+
+    def poll(self) -> List[str]:
+        """Scan from the last scanned block to the head, return the processed events"""
+        start_block = self.scanner.get_suggested_scan_start_block()
+        if not self.include_last_block:
+            start_block += 1
+        end_block = self.scanner.get_suggested_scan_end_block()
+
+        if start_block > end_block:
+            # no new block, only refresh the scan time
+            self.state.end_chunk(self.state.get_last_scanned_block())
+            return []
+
+        processed, chunks = self.scanner.scan(start_block, end_block, start_chunk_size=self.scanner.max_scan_chunk_size)
+        self.include_last_block = False
+        if processed:
+            self.state.save()
+        logging.info(f"Scanned blocks {start_block} - {end_block}, {len(processed)} new reports in {chunks} chunks")
+        return processed
+
+    def follow(
+        self,
+        max_polls: Optional[int] = None,
+        on_poll: Optional[Callable[[List[str]], None]] = None,
+    ) -> None:
+        """Poll every `interval` seconds, until `max_polls` polls are done if given.
+
+        A failed poll is logged and retried on the next tick, the state is saved on the way out.
+        """
+        polls = 0
+        try:
+            while max_polls is None or polls < max_polls:
+                started = time()
+                try:
+                    processed = self.poll()
+                    if on_poll:
+                        on_poll(processed)
+                except Exception as e:
+                    logging.error(f"Scan poll failed, retrying in {self.interval} seconds: {e}")
+                polls += 1
+                if max_polls is None or polls < max_polls:
+                    sleep(max(0.0, self.interval - (time() - started)))
+        finally:
+            self.state.save()
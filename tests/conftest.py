@@ -1,3 +1,4 @@
+import os
 from collections import namedtuple
 from dataclasses import dataclass
 
@@ -21,10 +22,18 @@ from telliot_core.directory import ContractInfo
 from telliot_core.model.endpoints import RPCEndpoint
 from telliot_core.tellor.tellor360.autopay import contract_directory
 from telliot_core.tellor.tellor360.autopay import Tellor360AutopayContract
+from web3 import Web3
 
+from timestamps_tip_scanner.claim_ledger import clear_claim_ledgers
+from timestamps_tip_scanner.constants import BLOCK_ANCHORS_FILENAME
 from timestamps_tip_scanner.constants import CHAIN_ID_MAPPING
+from timestamps_tip_scanner.constants import QUERY_TYPES_FILENAME
 from timestamps_tip_scanner.jsonified_state import JSONifiedState
 from timestamps_tip_scanner.logger import setup_logger
+from timestamps_tip_scanner.oracle_cache import clear_oracle_caches
+from timestamps_tip_scanner.query_types import clear_registries
+from timestamps_tip_scanner.utils import Args
+from timestamps_tip_scanner.utils import EventData
 
 CHAIN_ID_MAPPING[1337] = {"name": "localhost"}
 setup_logger()
@@ -40,6 +49,15 @@ def reset_chain(chain):
 @pytest.fixture(scope="function", autouse=True)
 def remove_jsonified_state_file():
     JSONifiedState.delete_file()
+    # block timestamps change with every chain reset
+    if os.path.isfile(BLOCK_ANCHORS_FILENAME):
+        os.remove(BLOCK_ANCHORS_FILENAME)
+    # so are the contracts deployed at the same addresses
+    clear_registries()
+    if os.path.isfile(QUERY_TYPES_FILENAME):
+        os.remove(QUERY_TYPES_FILENAME)
+    clear_oracle_caches()
+    clear_claim_ledgers()
 
 
 @pytest.fixture(scope="function")
@@ -142,6 +160,44 @@ def tellor_autopay(contracts):
     return autopay
 
 
+@pytest.fixture(scope="function")
+def submit_reports(contracts):
+    """Submits a report for each feed a few blocks apart and returns the reported timestamps"""
+
+    def submit(reporter, feeds):
+        timestamps = []
+        for feed in feeds:
+            chain.mine(5, timedelta=1)
+            contracts.tellorflex.submitValue(
+                feed.query.query_id, Web3.toHex(1800), 0, feed.query.query_data, {"from": reporter}
+            )
+            timestamps.append(chain[-1].timestamp)
+            chain.sleep(43201)
+        chain.mine(2)
+        return timestamps
+
+    return submit
+
+
+def new_report(
+    timestamp,
+    block_number,
+    reporter="0x33A4622B82D4c04a53e170c638B944ce27cffce3",
+    query_id="0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992",
+):
+    """A NewReport event of the reporter in the block, without a chain (of the ETH/USD query id by default)"""
+    return EventData(
+        address=reporter,
+        args=Args(_reporter=reporter, _time=timestamp, _queryId=HexBytes(query_id)),
+        blockHash=HexBytes(block_number.to_bytes(32, "big")),
+        blockNumber=block_number,
+        event="NewReport",
+        logIndex=0,
+        transactionHash=HexBytes(block_number.to_bytes(32, "big")),
+        transactionIndex=0,
+    )
+
+
 @pytest.fixture(scope="module", autouse=True)
 def accts():
     accounts = [
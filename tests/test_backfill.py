@@ -0,0 +1,138 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from web3 import HTTPProvider
+from web3 import Web3
+
+from conftest import new_report
+from timestamps_tip_scanner import backfill as backfill_module
+from timestamps_tip_scanner.backfill import backfill
+from timestamps_tip_scanner.backfill import merge_partitions
+from timestamps_tip_scanner.backfill import Partition
+from timestamps_tip_scanner.backfill import partition
+from timestamps_tip_scanner.backfill import partition_path
+from timestamps_tip_scanner.backfill import partition_state
+from timestamps_tip_scanner.backfill import saved_partitions
+from timestamps_tip_scanner.jsonified_state import JSONifiedState
+
+reporter = "0x33A4622B82D4c04a53e170c638B944ce27cffce3"
+query_id = "0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992"
+
+
+def test_partition():
+    assert partition(0, 9, 3) == [(0, 3), (4, 6), (7, 9)]
+    assert partition(5, 6, 8) == [(5, 5), (6, 6)]
+    assert partition(100, 100, 4) == [(100, 100)]
+
+
+def scanned_partition(start_block, end_block, timestamps, scanned_to):
+    os.makedirs("backfill", exist_ok=True)
+    part = Partition(
+        chain_id=1,
+        node_urls=[],
+        contract_address=reporter,
+        abi=[],
+        reporter=reporter,
+        query_ids=None,
+        start_block=start_block,
+        end_block=end_block,
+        path=partition_path(1, reporter, start_block, end_block),
+    )
+    state = partition_state(part)
+    for block_number, timestamp in enumerate(timestamps, start_block):
+        state.process_event(new_report(timestamp, block_number))
+    state.end_chunk(scanned_to)
+    state.save()
+    return part
+
+
+def test_merge_partitions(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    main = JSONifiedState(chain_id=1, address=reporter)
+    main.reset(150)
+    main.process_event(new_report(1500, 150))
+    main.save()
+
+    parts = [scanned_partition(0, 99, [10, 20], 99), scanned_partition(100, 199, [1000, 1500], 199)]
+    assert saved_partitions(1, reporter) == [(0, 99), (100, 199)]
+    # a partition resumes from its saved state
+    assert partition_state(parts[1]).get_last_scanned_block() == 199
+
+    state = merge_partitions(1, reporter, parts, 0, 199)
+    assert state.get_last_scanned_block() == 199
+    assert list(state.read_reports()[query_id]) == [10, 20, 1000, 1500]
+    assert saved_partitions(1, reporter) == []
+
+
+def test_merge_leaves_a_gap_to_the_scan(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    main = JSONifiedState(chain_id=1, address=reporter)
+    main.reset(50)
+    main.save()
+
+    parts = [scanned_partition(100, 199, [1000], 199)]
+    state = merge_partitions(1, reporter, parts, 100, 199)
+    # blocks 50 - 99 are still to scan
+    assert state.get_last_scanned_block() == 50
+    assert list(state.read_reports()[query_id]) == [1000]
+
+
+class FakeScanner:
+    """Scans the reports of `reports` (block number -> timestamp), failing on the blocks of `failing`"""
+
+    max_scan_chunk_size = 100
+
+    def __init__(self, state, reports, failing):
+        self.state = state
+        self.reports = reports
+        self.failing = failing
+
+    def scan(self, start_block, end_block, start_chunk_size):
+        if any(start_block <= block <= end_block for block in self.failing):
+            raise ConnectionError("node unavailable")
+        events = []
+        for block_number, timestamp in sorted(self.reports.items()):
+            if start_block <= block_number <= end_block:
+                events.append(new_report(timestamp, block_number))
+                self.state.process_event(events[-1])
+        self.state.end_chunk(end_block)
+        return events, None
+
+
+def fake_backfill(monkeypatch, reports, failing=(), **kwargs):
+    # threads share the fake scanner, worker processes wouldn't
+    monkeypatch.setattr(backfill_module, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(backfill_module, "_event_scanner", lambda *, state, **_: FakeScanner(state, reports, failing))
+    return backfill(
+        w3=Web3(HTTPProvider("http://localhost:8545")),
+        reporter=reporter,
+        tellorflex_contract=SimpleNamespace(address=reporter, abi=[]),
+        chain_id=1,
+        **kwargs,
+    )
+
+
+def test_backfill_of_one_block(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    state, failed = fake_backfill(monkeypatch, {5: 50}, start_block=5, end_block=5)
+
+    assert failed == []
+    assert state.get_last_scanned_block() == 5
+    assert list(state.read_reports()[query_id]) == [50]
+
+
+def test_partition_failing_before_its_first_save_is_scanned_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    reports = {10: 100, 150: 1500}
+    state, failed = fake_backfill(monkeypatch, reports, failing=[150], start_block=0, end_block=199, partitions=2)
+
+    assert state is None
+    assert failed == [(100, 199)]
+    assert saved_partitions(1, reporter) == [(0, 99), (100, 199)]
+
+    state, failed = fake_backfill(monkeypatch, reports, start_block=0, partitions=2)
+    assert failed == []
+    assert state.get_last_scanned_block() == 199
+    assert list(state.read_reports()[query_id]) == [100, 1500]
+    assert saved_partitions(1, reporter) == []
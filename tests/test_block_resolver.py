@@ -0,0 +1,75 @@
+from timestamps_tip_scanner.block_resolver import BlockResolver
+from timestamps_tip_scanner.block_resolver import parse_timestamp
+from timestamps_tip_scanner.block_resolver import prune_anchors
+
+
+class FakeEth:
+    """Chain of 100000 blocks, 2 seconds apart with a slow stretch in the middle"""
+
+    def __init__(self):
+        self.timestamps = []
+        timestamp = 1_600_000_000
+        for block in range(100_000):
+            self.timestamps.append(timestamp)
+            timestamp += 30 if 40_000 <= block < 45_000 else 2
+        self.block_number = len(self.timestamps) - 1
+
+    def get_block(self, block_number):
+        return {"timestamp": self.timestamps[block_number]}
+
+
+class FakeWeb3:
+    def __init__(self):
+        self.eth = FakeEth()
+
+
+def test_block_resolver_finds_last_block_before_timestamp(tmp_path):
+    w3 = FakeWeb3()
+    timestamps = w3.eth.timestamps
+    resolver = BlockResolver(w3, chain_id=137, anchors_file=str(tmp_path / "anchors.json"))
+
+    for block in (0, 1, 39_999, 42_000, 45_001, 99_998, 99_999):
+        assert resolver.block_at(timestamps[block]) == block
+        # between two blocks resolves to the earlier one
+        assert resolver.block_at(timestamps[block] + 1) == block
+    assert resolver.block_at(timestamps[0] - 1) == 0
+    assert resolver.first_block_since(timestamps[42_000] + 1) == 42_001
+
+    # anchors are kept, the same lookup is answered without searching again
+    resolver = BlockResolver(w3, chain_id=137, anchors_file=str(tmp_path / "anchors.json"))
+    resolver.block_at(timestamps[42_000] + 1)
+    assert resolver.rpc_calls == 0
+    resolver.block_at(timestamps[43_210])
+    assert resolver.rpc_calls <= 3
+
+
+def test_anchors_are_pruned_to_recent_and_evenly_spaced_ones():
+    anchors = {block: 2 * block for block in range(10_000)}
+    pruned = prune_anchors(anchors, max_anchors=110, recent=10)
+
+    assert len(pruned) <= 110
+    assert all(block in pruned for block in range(9_990, 10_000))
+    older = sorted(pruned)[:-10]
+    assert older[0] == 0
+    assert max(b - a for a, b in zip(older, older[1:])) <= 2 * (9_990 // 100 + 1)
+    assert prune_anchors({1: 2}, max_anchors=110, recent=10) == {1: 2}
+
+
+def test_block_resolver_anchors_file_is_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr("timestamps_tip_scanner.block_resolver.BLOCK_ANCHORS_MAX", 50)
+    monkeypatch.setattr("timestamps_tip_scanner.block_resolver.BLOCK_ANCHORS_RECENT", 10)
+    w3 = FakeWeb3()
+    timestamps = w3.eth.timestamps
+    resolver = BlockResolver(w3, chain_id=137, anchors_file=str(tmp_path / "anchors.json"))
+    for block in range(0, 100_000, 997):
+        assert resolver.block_at(timestamps[block]) == block
+
+    # the anchors saved are pruned
+    resolver = BlockResolver(w3, chain_id=137, anchors_file=str(tmp_path / "anchors.json"))
+    assert 0 < len(resolver.anchors) <= 50
+    assert resolver.block_at(timestamps[43_210]) == 43_210
+
+
+def test_parse_timestamp():
+    assert parse_timestamp("1683037267") == 1683037267
+    assert parse_timestamp("2023-05-02T14:21:07+00:00") == 1683037267
@@ -0,0 +1,112 @@
+from eth_abi import encode_abi
+from web3 import Web3
+
+from timestamps_tip_scanner.claim_ledger import CLAIM_ONE_TIME_TIP_SELECTOR
+from timestamps_tip_scanner.claim_ledger import CLAIM_TIP_SELECTOR
+from timestamps_tip_scanner.claim_ledger import ClaimLedger
+
+autopay = "0x3b87b3d58E97F6dB2C7E79b7B1bBd3C08A1E5A1c"
+reporter = "0x33A4622B82D4c04a53e170c638B944ce27cffce3"
+other_reporter = Web3.toChecksumAddress("0x0d9a2bd4d8fba3f67c79cbad5bd57c9d27b9a1a3")
+query_id = "0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992"
+feed_id = "0x" + "ab" * 32
+
+
+def test_claimed_timestamps_are_skipped(tmp_path):
+    ledger = ClaimLedger(str(tmp_path / "claims.db"), chain_id=1337)
+    ledger.record(autopay, query_id, [1, 2], feed_id=feed_id)
+    ledger.record(autopay, query_id, [3])
+
+    assert ledger.unclaimed_feed_tips(autopay, {(feed_id, query_id): [1, 2, 3]}) == {(feed_id, query_id): [3]}
+    assert ledger.unclaimed_feed_tips(autopay, {(feed_id, query_id): [1, 2]}) == {}
+    # one-time tips are claimed apart from the feed tips
+    assert ledger.unclaimed_one_time_tips(autopay, {query_id: [1, 3]}) == {query_id: [1]}
+    # as are the claims of other chains
+    other_chain = ClaimLedger(str(tmp_path / "claims.db"), chain_id=1)
+    assert other_chain.unclaimed_one_time_tips(autopay, {query_id: [3]}) == {query_id: [3]}
+
+
+# the claim events of contracts/Autopay.sol
+TIP_CLAIMED = {
+    "name": "TipClaimed",
+    "inputs": [
+        {"name": "_feedId", "type": "bytes32", "indexed": True},
+        {"name": "_queryId", "type": "bytes32", "indexed": True},
+        {"name": "_amount", "type": "uint256", "indexed": True},
+        {"name": "_reporter", "type": "address", "indexed": False},
+    ],
+}
+ONE_TIME_TIP_CLAIMED = {
+    "name": "OneTimeTipClaimed",
+    "inputs": [
+        {"name": "_queryId", "type": "bytes32", "indexed": True},
+        {"name": "_amount", "type": "uint256", "indexed": True},
+        {"name": "_reporter", "type": "address", "indexed": True},
+    ],
+}
+
+
+def event_log(event, tx_hash, *args):
+    """A log of the event emitted with `args`, encoded as the contract does"""
+    signature = f"{event['name']}({','.join(arg['type'] for arg in event['inputs'])})"
+    topics = [Web3.keccak(text=signature).hex()]
+    data_types, data = [], []
+    for arg, value in zip(event["inputs"], args):
+        if arg["indexed"]:
+            topics.append("0x" + encode_abi([arg["type"]], [value]).hex())
+        else:
+            data_types.append(arg["type"])
+            data.append(value)
+    return {"topics": topics, "data": "0x" + encode_abi(data_types, data).hex(), "transactionHash": tx_hash}
+
+
+class FakeEth:
+    block_number = 100
+
+    def __init__(self, logs, transactions):
+        self.logs = logs
+        self.transactions = transactions
+
+    def get_logs(self, params):
+        """The logs whose topics match the filter's, a None topic matches any"""
+        return [
+            log
+            for log in self.logs
+            if len(params["topics"]) <= len(log["topics"])
+            and all(topic is None or topic == log["topics"][i] for i, topic in enumerate(params["topics"]))
+        ]
+
+    def get_transaction(self, tx_hash):
+        return {"input": self.transactions[bytes(tx_hash)]}
+
+
+class FakeWeb3:
+    def __init__(self, logs, transactions):
+        self.eth = FakeEth(logs, transactions)
+
+
+def test_sync_reads_claimed_timestamps_of_claim_transactions(tmp_path):
+    ledger = ClaimLedger(str(tmp_path / "claims.db"), chain_id=1337)
+    feed, query = bytes.fromhex(feed_id[2:]), bytes.fromhex(query_id[2:])
+    claim_tip = CLAIM_TIP_SELECTOR + encode_abi(["bytes32", "bytes32", "uint256[]"], [feed, query, [5, 6]])
+    claim_one_time_tip = CLAIM_ONE_TIME_TIP_SELECTOR + encode_abi(["bytes32", "uint256[]"], [query, [7]])
+    other_claim_tip = CLAIM_TIP_SELECTOR + encode_abi(["bytes32", "bytes32", "uint256[]"], [feed, query, [8]])
+    other_claim_one_time_tip = CLAIM_ONE_TIME_TIP_SELECTOR + encode_abi(["bytes32", "uint256[]"], [query, [9]])
+    logs = [
+        event_log(TIP_CLAIMED, b"\x01" * 32, feed, query, 10**18, reporter),
+        event_log(ONE_TIME_TIP_CLAIMED, b"\x02" * 32, query, 10**18, reporter),
+        # claims of another reporter
+        event_log(TIP_CLAIMED, b"\x03" * 32, feed, query, 10**18, other_reporter),
+        event_log(ONE_TIME_TIP_CLAIMED, b"\x04" * 32, query, 10**18, other_reporter),
+    ]
+    transactions = {
+        b"\x01" * 32: claim_tip,
+        b"\x02" * 32: claim_one_time_tip,
+        b"\x03" * 32: other_claim_tip,
+        b"\x04" * 32: other_claim_one_time_tip,
+    }
+    ledger.sync(FakeWeb3(logs, transactions), autopay, reporter, from_block=10)
+
+    assert ledger.claimed(autopay, query_id, feed_id) == {5, 6}
+    assert ledger.claimed(autopay, query_id) == {7}
+    assert ledger.synced_block(autopay, reporter) == 100
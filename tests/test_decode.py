@@ -1,8 +1,15 @@
 from hexbytes import HexBytes
+from telliot_feeds.feeds import eth_usd_median_feed
+from web3 import Web3
+from web3._utils.events import get_event_data
 
 from timestamps_tip_scanner.autopay_calls import AutopayCalls
-from timestamps_tip_scanner.autopay_calls import decode_typ_name
 from timestamps_tip_scanner.constants import QUERYDATASTORAGEMAPPING
+from timestamps_tip_scanner.new_report import decode_new_report
+from timestamps_tip_scanner.new_report import decode_new_report_data
+from timestamps_tip_scanner.new_report import is_new_report_log
+from timestamps_tip_scanner.new_report import NEW_REPORT_TOPIC
+from timestamps_tip_scanner.query_types import decode_typ_name
 
 
 def test_decode_typ_not_in_catalog(contracts, tellor_autopay):
@@ -36,3 +43,30 @@ def test_decode_value_for_type_in_catalog(tellor_autopay):
     )
     assert values[0] == 10.0
     assert values[1] == 20.0
+
+
+def test_fast_new_report_decoder_matches_get_event_data(contracts, tellor_autopay):
+    feed = eth_usd_median_feed
+    reporter = contracts.keys.reporter1
+    contracts.tellorflex.submitValue(
+        feed.query.query_id, Web3.toHex(1800), 0, feed.query.query_data, {"from": reporter}
+    )
+    w3 = tellor_autopay.node._web3
+    tellorflex = w3.eth.contract(address=contracts.tellorflex.address, abi=contracts.tellorflex.abi)
+    event_abi = tellorflex.events.NewReport._get_event_abi()
+    (log,) = w3.eth.get_logs({"address": tellorflex.address, "fromBlock": 0, "topics": [NEW_REPORT_TOPIC.hex()]})
+
+    expected = get_event_data(w3.codec, event_abi, log)
+    assert is_new_report_log(log)
+    decoded = decode_new_report(log)
+
+    assert decoded.args._reporter == expected.args._reporter == reporter.address
+    assert decoded.args._time == expected.args._time
+    assert decoded.args._queryId == expected.args._queryId
+    assert decoded.blockNumber == expected.blockNumber
+    assert decoded.logIndex == expected.logIndex
+    assert decoded.transactionHash == expected.transactionHash
+    value, nonce, query_data = decode_new_report_data(w3.codec, decoded)
+    assert value == expected.args._value
+    assert nonce == expected.args._nonce
+    assert query_data == expected.args._queryData
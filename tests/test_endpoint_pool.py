@@ -0,0 +1,151 @@
+import asyncio
+from time import sleep
+
+import pytest
+import requests
+from web3.providers.base import BaseProvider
+
+from timestamps_tip_scanner.endpoint_pool import AsyncEndpointPool
+from timestamps_tip_scanner.endpoint_pool import BlockRangeError
+from timestamps_tip_scanner.endpoint_pool import EndpointError
+from timestamps_tip_scanner.endpoint_pool import EndpointPool
+from timestamps_tip_scanner.event_scanner import _retry_web3_call
+from timestamps_tip_scanner.retry_policy import RetryPolicy
+
+
+class FakeProvider(BaseProvider):
+    def __init__(self, delay=0.0, fail=False, max_block_range=None, timeout_block_range=None):
+        self.delay = delay
+        self.fail = fail
+        self.max_block_range = max_block_range
+        # wider eth_getLogs ranges time out, like Go Ethereum's read timeout
+        self.timeout_block_range = timeout_block_range
+        self.requests = []
+
+    def make_request(self, method, params):
+        self.requests.append((method, params))
+        sleep(self.delay)
+        if isinstance(self.fail, Exception):
+            raise self.fail
+        if self.fail:
+            raise ConnectionError("endpoint down")
+        if method == "eth_getLogs":
+            block_range = int(params[0]["toBlock"], 16) - int(params[0]["fromBlock"], 16) + 1
+            if self.timeout_block_range is not None and block_range > self.timeout_block_range:
+                raise requests.ReadTimeout("read timed out")
+            if self.max_block_range is not None and block_range > self.max_block_range:
+                return {"jsonrpc": "2.0", "id": 1, "error": {"code": -32005, "message": "block range too large"}}
+        return {"jsonrpc": "2.0", "id": 1, "result": []}
+
+
+class AsyncFakeProvider(FakeProvider):
+    async def make_request(self, method, params):
+        return super().make_request(method, params)
+
+
+def get_logs(from_block, to_block):
+    return "eth_getLogs", [{"fromBlock": hex(from_block), "toBlock": hex(to_block)}]
+
+
+def test_fails_over_to_the_next_endpoint():
+    down, up = FakeProvider(fail=True), FakeProvider()
+    pool = EndpointPool([down, up], min_hedge_delay=10)
+
+    assert pool.make_request("eth_chainId", [])["result"] == []
+    assert pool.health[0].failures == 1
+    # the failed endpoint is not preferred anymore
+    pool.make_request("eth_chainId", [])
+    assert len(down.requests) == 1
+    assert len(up.requests) == 2
+
+
+def test_sent_transactions_are_not_sent_again():
+    down, up = FakeProvider(fail=True), FakeProvider()
+    pool = EndpointPool([down, up], min_hedge_delay=10)
+
+    # the first endpoint may have received it before failing
+    with pytest.raises(EndpointError):
+        pool.make_request("eth_sendRawTransaction", ["0x01"])
+    assert up.requests == []
+
+    # it could not have, nothing connected
+    down.fail = requests.ConnectTimeout("connect timed out")
+    pool.health[0].latency = 0.0
+    assert pool.make_request("eth_sendRawTransaction", ["0x01"])["result"] == []
+    assert len(up.requests) == 1
+
+
+def test_hedges_slow_reads():
+    slow, fast = FakeProvider(delay=0.5), FakeProvider()
+    pool = EndpointPool([slow, fast], min_hedge_delay=0.05, hedge_factor=0.01)
+
+    pool.make_request("eth_call", [])
+    assert pool.health[0].hedged == 1
+    assert len(fast.requests) == 1
+
+
+def test_routes_wide_ranges_to_endpoints_accepting_them():
+    limited, unlimited = FakeProvider(max_block_range=100), FakeProvider(delay=0.01)
+    pool = EndpointPool([limited, unlimited], min_hedge_delay=10)
+
+    pool.make_request(*get_logs(0, 999))
+    assert pool.health[0].max_block_range == 500
+    assert len(unlimited.requests) == 1
+
+    # the limited endpoint is faster but not asked for ranges it refuses
+    pool.make_request(*get_logs(1000, 1999))
+    assert len(limited.requests) == 1
+    assert len(unlimited.requests) == 2
+    assert pool.max_block_range() is None
+
+
+def test_range_no_endpoint_accepts_is_cut_to_the_widest_accepted():
+    pool = EndpointPool([FakeProvider(max_block_range=100), FakeProvider(max_block_range=300)], min_hedge_delay=10)
+    with pytest.raises(BlockRangeError):
+        pool.make_request(*get_logs(0, 999))
+
+    ranges = []
+
+    def fetch(start_block, end_block):
+        ranges.append((start_block, end_block))
+        pool.make_request(*get_logs(start_block, end_block))
+        return []
+
+    end_block, _ = _retry_web3_call(fetch, start_block=1000, end_block=1999, policy=RetryPolicy(backoff_seconds=0))
+    # limits are learned from refused ranges, the range is fetched in pieces of the widest accepted range
+    assert end_block == 1999
+    served = [(start, end) for start, end in ranges if end - start + 1 <= 250]
+    assert sum(end - start + 1 for start, end in served) == 1000
+    assert len(ranges) < 10
+
+
+def test_timeouts_through_the_pool_split_the_range():
+    pool = EndpointPool([FakeProvider(timeout_block_range=100)], min_hedge_delay=10)
+    ranges = []
+
+    def fetch(start_block, end_block):
+        ranges.append((start_block, end_block))
+        pool.make_request(*get_logs(start_block, end_block))
+        return [(start_block, end_block)]
+
+    policy = RetryPolicy(backoff_seconds=0)
+    fetched = policy.fetch(fetch, 0, 399)
+    assert fetched == [(0, 99), (100, 199), (200, 299), (300, 399)]
+    assert policy.range_limit == 99
+    # split right away, not retried as a transient failure
+    assert len(ranges) == 7
+
+
+def test_async_pool_fails_over_and_sticks_to_the_endpoint_that_served():
+    down, up = AsyncFakeProvider(fail=True), AsyncFakeProvider()
+    pool = AsyncEndpointPool(["http://localhost:1", "http://localhost:2"])
+    pool.providers = [down, up]
+
+    assert asyncio.run(pool.make_request("eth_chainId", []))["result"] == []
+    asyncio.run(pool.make_request("eth_chainId", []))
+    assert len(down.requests) == 1
+    assert len(up.requests) == 2
+
+    up.fail = True
+    with pytest.raises(EndpointError):
+        asyncio.run(pool.make_request("eth_chainId", []))
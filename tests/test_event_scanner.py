@@ -0,0 +1,212 @@
+import asyncio
+from types import SimpleNamespace
+
+from brownie import chain
+from hexbytes import HexBytes
+from telliot_feeds.feeds import btc_usd_median_feed
+from telliot_feeds.feeds import eth_usd_median_feed
+
+from timestamps_tip_scanner.async_event_scanner import async_web3
+from timestamps_tip_scanner.sqlite_state import open_state
+from timestamps_tip_scanner.sqlite_state import SQLiteState
+from timestamps_tip_scanner.timestamps_scanner import async_run
+from timestamps_tip_scanner.timestamps_scanner import run
+from timestamps_tip_scanner.timestamps_scanner import run_shared
+from timestamps_tip_scanner.timestamps_scanner import scan_to_head
+
+
+def test_parallel_scan_matches_sequential_scan(tellor_autopay, contracts, submit_reports, monkeypatch):
+    keys = contracts.keys
+    w3 = tellor_autopay.node._web3
+    submit_reports(keys.reporter1, (eth_usd_median_feed, btc_usd_median_feed, eth_usd_median_feed))
+    # force several small ranges so they are fetched out of order
+    monkeypatch.setenv("BATCH_SIZE", "3")
+
+    sequential = run(
+        w3=w3,
+        tellorflex_contract=contracts.tellorflex,
+        reporter=keys.reporter1.address,
+        chain_id=1337,
+        starting_block=0,
+    )
+    sequential_reports = dict(sequential.state["localhost"][keys.reporter1.address])
+
+    parallel = run(
+        w3=w3,
+        tellorflex_contract=contracts.tellorflex,
+        reporter=keys.reporter1.address,
+        chain_id=1337,
+        starting_block=0,
+        workers=4,
+    )
+    parallel_reports = parallel.state["localhost"][keys.reporter1.address]
+
+    assert parallel_reports["last_scanned_block"] == sequential_reports["last_scanned_block"]
+    for query_id in (eth_usd_median_feed.query.query_id, btc_usd_median_feed.query.query_id):
+        query_id = HexBytes(query_id).hex()
+        assert sorted(set(parallel_reports[query_id])) == sorted(set(sequential_reports[query_id]))
+
+
+def test_async_scan_matches_sync_scan(tellor_autopay, contracts, submit_reports):
+    keys = contracts.keys
+    w3 = tellor_autopay.node._web3
+    submit_reports(keys.reporter1, (eth_usd_median_feed, btc_usd_median_feed))
+
+    sync_state = run(
+        w3=w3,
+        tellorflex_contract=contracts.tellorflex,
+        reporter=keys.reporter1.address,
+        chain_id=1337,
+        starting_block=0,
+    )
+    sync_reports = dict(sync_state.state["localhost"][keys.reporter1.address])
+
+    async_state = asyncio.run(
+        async_run(
+            w3=async_web3("http://localhost:8545"),
+            tellorflex_contract=contracts.tellorflex,
+            reporter=keys.reporter1.address,
+            chain_id=1337,
+            starting_block=0,
+        )
+    )
+    async_reports = async_state.state["localhost"][keys.reporter1.address]
+
+    assert async_reports["last_scanned_block"] == sync_reports["last_scanned_block"]
+    for query_id in (eth_usd_median_feed.query.query_id, btc_usd_median_feed.query.query_id):
+        query_id = HexBytes(query_id).hex()
+        assert sorted(set(async_reports[query_id])) == sorted(set(sync_reports[query_id]))
+
+
+def test_batched_scan_matches_sequential_scan(tellor_autopay, contracts, submit_reports, monkeypatch):
+    keys = contracts.keys
+    w3 = tellor_autopay.node._web3
+    submit_reports(keys.reporter1, (eth_usd_median_feed, btc_usd_median_feed, eth_usd_median_feed))
+    monkeypatch.setenv("BATCH_SIZE", "3")
+
+    sequential = run(
+        w3=w3,
+        tellorflex_contract=contracts.tellorflex,
+        reporter=keys.reporter1.address,
+        chain_id=1337,
+        starting_block=0,
+    )
+    sequential_reports = dict(sequential.state["localhost"][keys.reporter1.address])
+
+    batched = run(
+        w3=w3,
+        tellorflex_contract=contracts.tellorflex,
+        reporter=keys.reporter1.address,
+        chain_id=1337,
+        starting_block=0,
+        batch_size=5,
+    )
+    batched_reports = batched.state["localhost"][keys.reporter1.address]
+
+    assert batched_reports["last_scanned_block"] == sequential_reports["last_scanned_block"]
+    for query_id in (eth_usd_median_feed.query.query_id, btc_usd_median_feed.query.query_id):
+        query_id = HexBytes(query_id).hex()
+        assert sorted(set(batched_reports[query_id])) == sorted(set(sequential_reports[query_id]))
+
+
+def test_reorged_reports_are_rolled_back(tellor_autopay, contracts, submit_reports):
+    keys = contracts.keys
+    w3 = tellor_autopay.node._web3
+    submit_reports(keys.reporter1, (eth_usd_median_feed,))
+    state = run(
+        w3=w3,
+        tellorflex_contract=contracts.tellorflex,
+        reporter=keys.reporter1.address,
+        chain_id=1337,
+        starting_block=0,
+    )
+    query_id = HexBytes(btc_usd_median_feed.query.query_id).hex()
+    scanned_block = state.get_last_scanned_block()
+
+    # the btc report lands in blocks that get replaced by a reorg
+    chain.snapshot()
+    orphaned = submit_reports(keys.reporter1, (btc_usd_median_feed,))
+    state = run(w3=w3, tellorflex_contract=contracts.tellorflex, reporter=keys.reporter1.address, chain_id=1337)
+    assert state.state["localhost"][keys.reporter1.address][query_id] == orphaned
+
+    chain.revert()
+    chain.mine(10, timedelta=1)
+    state = run(w3=w3, tellorflex_contract=contracts.tellorflex, reporter=keys.reporter1.address, chain_id=1337)
+    assert len(state.state["localhost"][keys.reporter1.address][query_id]) == 0
+    assert state.get_last_scanned_block() > scanned_block
+
+
+def test_reorg_to_a_shorter_chain_is_rolled_back(tellor_autopay, contracts, submit_reports):
+    keys = contracts.keys
+    w3 = tellor_autopay.node._web3
+    query_id = HexBytes(btc_usd_median_feed.query.query_id).hex()
+    run(
+        w3=w3,
+        tellorflex_contract=contracts.tellorflex,
+        reporter=keys.reporter1.address,
+        chain_id=1337,
+        starting_block=0,
+    )
+
+    chain.snapshot()
+    orphaned = submit_reports(keys.reporter1, (btc_usd_median_feed,))
+    state = run(w3=w3, tellorflex_contract=contracts.tellorflex, reporter=keys.reporter1.address, chain_id=1337)
+    assert state.state["localhost"][keys.reporter1.address][query_id] == orphaned
+
+    # the checkpointed blocks are past the new head, the node doesn't find them
+    chain.revert()
+    chain.mine(1)
+    state = run(w3=w3, tellorflex_contract=contracts.tellorflex, reporter=keys.reporter1.address, chain_id=1337)
+    assert len(state.state["localhost"][keys.reporter1.address][query_id]) == 0
+
+
+def test_shared_scan_indexes_reports_by_reporter(tellor_autopay, contracts, submit_reports):
+    keys = contracts.keys
+    w3 = tellor_autopay.node._web3
+    query_id = HexBytes(eth_usd_median_feed.query.query_id).hex()
+    first = submit_reports(keys.reporter1, (eth_usd_median_feed,))
+    second = submit_reports(keys.reporter2, (eth_usd_median_feed,))
+
+    run_shared(
+        w3=w3,
+        tellorflex_contract=contracts.tellorflex,
+        chain_id=1337,
+        reporters=[keys.reporter1.address],
+        starting_block=0,
+    )
+    assert open_state(1337, keys.reporter1.address).read_reports() == {query_id: first}
+    assert open_state(1337, keys.reporter2.address).read_reports() is None
+
+    # an added reporter is backfilled over the blocks already scanned
+    third = submit_reports(keys.reporter2, (eth_usd_median_feed,))
+    run_shared(
+        w3=w3,
+        tellorflex_contract=contracts.tellorflex,
+        chain_id=1337,
+        reporters=[keys.reporter1.address, keys.reporter2.address],
+    )
+    assert open_state(1337, keys.reporter1.address).read_reports() == {query_id: first}
+    assert open_state(1337, keys.reporter2.address).read_reports() == {query_id: second + third}
+
+
+def test_scan_to_head_without_new_blocks(tmp_path):
+    state = SQLiteState(
+        chain_id=1337, address="0x33A4622B82D4c04a53e170c638B944ce27cffce3", db_path=str(tmp_path / "reports.db")
+    )
+    state.reset(100)
+
+    def scan(*args, **kwargs):
+        raise AssertionError("nothing to scan")
+
+    # the head is still the last scanned block
+    scanner = SimpleNamespace(
+        state=state,
+        max_scan_chunk_size=100,
+        get_suggested_scan_start_block=lambda: 101,
+        get_suggested_scan_end_block=lambda: 100,
+        scan=scan,
+        scan_parallel=scan,
+    )
+    for workers in (1, 2):
+        assert scan_to_head(scanner, workers=workers, progress=False) is state
+        assert state.get_last_scanned_block() == 100
@@ -0,0 +1,108 @@
+import random
+
+import pytest
+from telliot_feeds.reporters.tips.listener.funded_feeds_filter import _get_price_change
+from telliot_feeds.reporters.tips.listener.funded_feeds_filter import FundedFeedFilter
+
+from timestamps_tip_scanner.feed_eligibility import eligible_timestamps
+from timestamps_tip_scanner.utils import FeedDetails
+
+ETHER = 10**18
+NOW = 1_700_000_000
+
+
+def checked_one_by_one(timestamps, before_timestamps, feed, decode_values):
+    """The loop of `AutopayCalls.get_valid_timestamps` before the eligibility engine, for one feed"""
+    filtr = FundedFeedFilter()
+    eligible = []
+    for timestamp, timestamp_before in zip(timestamps, before_timestamps):
+        reward_amount = feed.reward
+        balance = feed.balance
+        first_in_window, time_diff = filtr.is_timestamp_first_in_window(
+            timestamp_before=timestamp_before,
+            timestamp_to_check=timestamp,
+            feed_start_timestamp=feed.startTime,
+            feed_window=feed.window,
+            feed_interval=feed.interval,
+        )
+        reward_amount += feed.rewardIncreasePerSecond * time_diff
+        if balance < reward_amount:
+            break
+        if first_in_window:
+            eligible.append(timestamp)
+        elif feed.priceThreshold > 0:
+            decoded_values = decode_values(timestamp)
+            if decoded_values == (None, None):
+                continue
+            if _get_price_change(decoded_values[0], decoded_values[1]) > feed.priceThreshold:
+                eligible.append(timestamp)
+    return eligible
+
+
+def corpus(seed, count=200):
+    """Feeds of all kinds with a month of reports each, their timestamps before and decoded values"""
+    rng = random.Random(seed)
+    cases = []
+    for _ in range(count):
+        interval = rng.choice([60, 300, 3600, 86400])
+        feed = FeedDetails(
+            reward=rng.choice([0, 1, ETHER // 10, ETHER]),
+            balance=rng.choice([ETHER // 2, 10 * ETHER, 10_000 * ETHER, 10**30]),
+            startTime=NOW - rng.randint(0, 60 * 86400),
+            interval=interval,
+            window=rng.choice([0, interval // 10, interval // 2, interval]),
+            priceThreshold=rng.choice([0, 0, 50, 100, 1000]),
+            rewardIncreasePerSecond=rng.choice([0, 0, 10**12, 10**15, ETHER]),
+            feedsWithFundingIndex=1,
+        )
+        timestamps = sorted(rng.sample(range(NOW - 28 * 86400, NOW), rng.randint(1, 3000)))
+        before_timestamps = [0] + timestamps[:-1]
+        if rng.random() < 0.3:
+            # other reporters' reports in between
+            before_timestamps = [max(0, before - rng.randint(0, interval)) for before in before_timestamps]
+        values = {}
+        for timestamp in timestamps:
+            kind = rng.random()
+            if kind < 0.05:
+                values[timestamp] = (None, None)
+            elif kind < 0.1:
+                values[timestamp] = (0.0, rng.uniform(1000, 2000))
+            elif kind < 0.2:
+                values[timestamp] = (rng.randint(0, 10**22), rng.randint(0, 10**22))
+            else:
+                before = rng.uniform(1000, 2000)
+                values[timestamp] = (before, before * rng.uniform(0.95, 1.05))
+        cases.append((timestamps, before_timestamps, feed, values))
+    return cases
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_checking_timestamps_one_by_one(seed):
+    for timestamps, before_timestamps, feed, values in corpus(seed):
+        expected = checked_one_by_one(timestamps, before_timestamps, feed, values.__getitem__)
+        assert eligible_timestamps(timestamps, before_timestamps, feed, values.__getitem__) == expected
+
+
+def test_values_are_only_decoded_for_funded_price_threshold_candidates():
+    feed = FeedDetails(
+        reward=ETHER,
+        balance=ETHER + 100,
+        startTime=NOW - 1000,
+        interval=100,
+        window=10,
+        priceThreshold=100,
+        rewardIncreasePerSecond=10,
+        feedsWithFundingIndex=1,
+    )
+    decoded = []
+
+    def decode_values(timestamp):
+        decoded.append(timestamp)
+        return 1000.0, 1100.0
+
+    # first in its window, not first but moved 10%, then its reward grew past the balance 15 seconds into the window
+    timestamps = [NOW - 1000, NOW - 995, NOW - 985, NOW - 950]
+    eligible = eligible_timestamps(timestamps, [0, NOW - 1000, NOW - 995, NOW - 985], feed, decode_values)
+
+    assert eligible == [NOW - 1000, NOW - 995]
+    assert decoded == [NOW - 995]
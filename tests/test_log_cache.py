@@ -0,0 +1,67 @@
+from timestamps_tip_scanner.batch_rpc import format_logs
+from timestamps_tip_scanner.log_cache import LogCache
+
+address = "0xd9157453E2668B2fc45b7A803D3FEF3642430cC0"
+signature = "0x" + "48" * 32
+reporters = ["0x" + "00" * 12 + "33" * 20, "0x" + "00" * 12 + "44" * 20]
+
+
+def raw_log(block_number, reporter):
+    return {
+        "address": address,
+        "topics": [signature, "0x" + "83" * 32, hex(block_number).ljust(66, "0"), reporter],
+        "data": "0x",
+        "blockNumber": hex(block_number),
+        "blockHash": "0x" + block_number.to_bytes(32, "big").hex(),
+        "transactionHash": "0x" + block_number.to_bytes(32, "big").hex(),
+        "transactionIndex": "0x0",
+        "logIndex": "0x0",
+        "removed": False,
+    }
+
+
+def params(from_block, to_block, reporter=None):
+    return {
+        "address": address,
+        "topics": [signature, None, None, reporter],
+        "fromBlock": from_block,
+        "toBlock": to_block,
+    }
+
+
+def test_log_cache_serves_covered_ranges_and_returns_gaps(tmp_path):
+    cache = LogCache(str(tmp_path / "logs.db"), chain_id=137)
+    logs = format_logs([raw_log(105, reporters[0]), raw_log(150, reporters[0])])
+
+    assert cache.cached(params(100, 200, reporters[0])) == ([], [(100, 200)])
+    # blocks after the final block aren't cached
+    cache.store(params(100, 200, reporters[0]), logs, final_block=160)
+
+    cached, missing = cache.cached(params(90, 200, reporters[0]))
+    assert cached == logs
+    assert missing == [(90, 99), (161, 200)]
+
+    cache.store(params(161, 180, reporters[0]), [], final_block=190)
+    assert cache.cached(params(120, 170, reporters[0])) == (logs[1:], [])
+
+
+def test_log_cache_answers_narrower_filters(tmp_path):
+    cache = LogCache(str(tmp_path / "logs.db"), chain_id=137)
+    logs = format_logs([raw_log(105, reporters[0]), raw_log(106, reporters[1])])
+    # all reporters
+    cache.store(params(100, 200), logs, final_block=200)
+
+    cached, missing = cache.cached(params(100, 200, reporters[1]))
+    assert cached == logs[1:]
+    assert missing == []
+    # another chain
+    assert LogCache(str(tmp_path / "logs.db"), chain_id=1).cached(params(100, 200)) == ([], [(100, 200)])
+
+
+def test_log_cache_evicts_oldest_ranges(tmp_path):
+    cache = LogCache(str(tmp_path / "logs.db"), chain_id=137, max_logs=1)
+    cache.store(params(100, 110), format_logs([raw_log(105, reporters[0])]), final_block=300)
+    cache.store(params(200, 210), format_logs([raw_log(205, reporters[0])]), final_block=300)
+
+    assert cache.cached(params(100, 110))[1] == [(100, 110)]
+    assert len(cache.cached(params(200, 210))[0]) == 1
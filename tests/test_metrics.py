@@ -0,0 +1,20 @@
+import pytest
+
+from timestamps_tip_scanner import metrics
+
+
+def test_endpoint_label_hides_url_path():
+    assert metrics.endpoint_label("https://polygon-mainnet.g.alchemy.com/v2/secret") == "polygon-mainnet.g.alchemy.com"
+
+
+def test_record_chunk():
+    prometheus_client = pytest.importorskip("prometheus_client")
+    registry = prometheus_client.REGISTRY
+    before = registry.get_sample_value("scanner_blocks_scanned_total", {"chain": "test"}) or 0
+
+    metrics.record_chunk("test", 100, 199, 2.0, decoded=5, kept=3)
+    assert registry.get_sample_value("scanner_blocks_scanned_total", {"chain": "test"}) == before + 100
+    assert registry.get_sample_value("scanner_blocks_per_second", {"chain": "test"}) == 50
+    assert registry.get_sample_value("scanner_chunk_size_blocks", {"chain": "test"}) == 100
+    assert registry.get_sample_value("scanner_chunk_events_sum", {"chain": "test", "stage": "kept"}) >= 3
+    assert b"scanner_blocks_scanned_total" in metrics.latest()[0]
@@ -0,0 +1,46 @@
+import json
+
+from hexbytes import HexBytes
+from telliot_feeds.feeds import eth_usd_median_feed
+
+from timestamps_tip_scanner.constants import REPORTS_FILENAME
+from timestamps_tip_scanner.jsonified_state import JSONifiedState
+from timestamps_tip_scanner.multi_chain import scan_chains
+
+reporter = "0x33A4622B82D4c04a53e170c638B944ce27cffce3"
+
+
+def test_chains_are_saved_in_their_own_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # a file of all chains from before, still read for chains without their own file
+    with open(REPORTS_FILENAME, "w") as f:
+        json.dump({"polygon": {reporter: {"last_scanned_block": 7}}}, f)
+
+    mainnet = JSONifiedState(chain_id=1, address=reporter)
+    mainnet.reset(100)
+    polygon = JSONifiedState(chain_id=137, address=reporter)
+    polygon.restore()
+    assert polygon.get_last_scanned_block() == 7
+
+    mainnet.end_chunk(110)
+    polygon.end_chunk(20)
+    mainnet.save()
+    polygon.save()
+
+    with open(mainnet.freports) as f:
+        assert list(json.load(f)) == ["mainnet"]
+    with open(polygon.freports) as f:
+        assert json.load(f)["polygon"][reporter]["last_scanned_block"] == 20
+    assert mainnet.freports != polygon.freports
+
+
+def test_scan_chains(tellor_autopay, contracts, submit_reports):
+    keys = contracts.keys
+    timestamps = submit_reports(keys.reporter1, (eth_usd_median_feed,))
+
+    states = scan_chains(
+        {1337: (tellor_autopay.node._web3, contracts.tellorflex)}, reporter=keys.reporter1.address, workers=2, since=0
+    )
+
+    query_id = HexBytes(eth_usd_median_feed.query.query_id).hex()
+    assert states[1337].read_reports() == {query_id: timestamps}
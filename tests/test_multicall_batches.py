@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import List
+
+import pytest
+
+from timestamps_tip_scanner.multicall_batches import BatchLimits
+from timestamps_tip_scanner.multicall_batches import call_cost
+from timestamps_tip_scanner.multicall_batches import plan_batches
+from timestamps_tip_scanner.multicall_batches import run_batches
+
+query_id = bytes.fromhex("83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992")
+
+
+@dataclass
+class FakeCall:
+    """The parts of a multicall `Call` the batches are planned with"""
+
+    function: str
+    args: List[Any] = field(default_factory=list)
+
+
+def data_before_calls(count):
+    return [FakeCall("getDataBefore(bytes32,uint256)(bytes,uint256)", [query_id, i]) for i in range(count)]
+
+
+def run(batch):
+    return {call.args[1]: call.args[1] * 2 for call in batch}
+
+
+def test_batches_stay_under_the_limits_in_order():
+    calls = data_before_calls(10_000)
+    limits = BatchLimits(max_gas=5_000_000, max_bytes=64 * 1024)
+    batches = plan_batches(calls, limits)
+
+    assert len(batches) > 1
+    assert [call for batch in batches for call in batch] == calls
+    for batch in batches:
+        assert sum(call_cost(call)[0] for call in batch) <= limits.max_gas
+        assert sum(call_cost(call)[1] for call in batch) <= limits.max_bytes
+
+
+def test_array_arguments_weigh_on_the_estimates():
+    status = "getRewardClaimStatusList(bytes32,bytes32,uint256[])(bool[])"
+    one = call_cost(FakeCall(status, [query_id, query_id, [1]]))
+    many = call_cost(FakeCall(status, [query_id, query_id, list(range(100))]))
+
+    assert many[0] > one[0] and many[1] > one[1]
+
+
+def test_batches_run_in_parallel_and_merge_results():
+    calls = data_before_calls(1000)
+    batches = plan_batches(calls, BatchLimits(max_gas=2_000_000))
+
+    assert run_batches(batches, run, workers=4) == {i: i * 2 for i in range(1000)}
+
+
+def test_failed_batches_are_split():
+    splits = []
+
+    def run_small(batch):
+        if len(batch) > 10:
+            raise ValueError("response size exceeded")
+        return run(batch)
+
+    calls = data_before_calls(100)
+    results = run_batches([calls], run_small, on_split=lambda: splits.append(1))
+
+    assert results == {i: i * 2 for i in range(100)}
+    assert splits
+
+
+def test_failing_call_raises():
+    def run_reverting(batch):
+        if any(call.args[1] == 7 for call in batch):
+            raise ValueError("execution reverted")
+        return run(batch)
+
+    with pytest.raises(ValueError, match="execution reverted"):
+        run_batches([data_before_calls(16)], run_reverting)
@@ -0,0 +1,38 @@
+from timestamps_tip_scanner.oracle_cache import DISPUTE_WINDOW
+from timestamps_tip_scanner.oracle_cache import OracleCache
+
+query_id = "0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992"
+now = 1_700_000_000
+
+
+def reads(timestamp, before_timestamp):
+    return {
+        ("before_values", query_id, timestamp): b"before",
+        ("timestamps", query_id, timestamp): before_timestamp,
+        ("current_values", query_id, timestamp): b"current",
+    }
+
+
+def test_caches_final_reads_only(tmp_path):
+    cache = OracleCache(str(tmp_path / "oracle.db"), chain_id=1337)
+    final, recent = now - DISPUTE_WINDOW - 10, now - 10
+    cache.store({**reads(final, final - 100), **reads(recent, final), ("past_tips", query_id): []}, now=now)
+
+    assert cache.lookup({query_id: [final, recent]}) == reads(final, final - 100)
+    # other chains have their own reads
+    assert OracleCache(str(tmp_path / "oracle.db"), chain_id=1).lookup({query_id: [final]}) == {}
+
+
+def test_removed_value_drops_the_reads_it_changes(tmp_path):
+    cache = OracleCache(str(tmp_path / "oracle.db"), chain_id=1337)
+    first, second, third = now - 3 * DISPUTE_WINDOW, now - 2 * DISPUTE_WINDOW, now - DISPUTE_WINDOW
+    cache.store({**reads(first, 0), **reads(second, first), **reads(third, second)}, now=now)
+
+    cache.remove_value(query_id, second)
+    cached = cache.lookup({query_id: [first, second, third]})
+    assert cached == {
+        **reads(first, 0),
+        ("before_values", query_id, second): b"before",
+        ("timestamps", query_id, second): first,
+        ("current_values", query_id, third): b"current",
+    }
@@ -0,0 +1,37 @@
+from eth_abi import encode_single
+
+from timestamps_tip_scanner.query_types import DecoderRegistry
+
+storage = "0x96918F58e0D34DC1f69d0ef724D5207C28919010"
+eth_usd_query_id = "0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992"
+unknown_query_id = "0x" + "11" * 32
+no_data_query_id = "0x" + "22" * 32
+
+
+def test_resolves_query_ids_once_and_remembers_them(tmp_path):
+    types_file = str(tmp_path / "query_types.json")
+    registry = DecoderRegistry(1337, storage, types_file=types_file)
+
+    # catalog query ids need no query data
+    assert registry.unresolved([eth_usd_query_id, unknown_query_id, no_data_query_id, unknown_query_id]) == [
+        unknown_query_id,
+        no_data_query_id,
+    ]
+    assert registry.decoder(eth_usd_query_id)(int(10e18).to_bytes(32, "big")) == 10.0
+
+    query_data = encode_single("(string,bytes)", ["SpotPrice", encode_single("(string,string)", ["eth", "usd"])])
+    # a failed read stays unresolved
+    registry.record({unknown_query_id: query_data, no_data_query_id: b"", "0x" + "33" * 32: None})
+    assert registry.query_type(unknown_query_id) == "SpotPrice"
+    assert registry.decoder(unknown_query_id) is not None
+    assert registry.query_type(no_data_query_id) is None
+    assert registry.decoder(no_data_query_id) is None
+    assert registry.unresolved([unknown_query_id, no_data_query_id, "0x" + "33" * 32]) == ["0x" + "33" * 32]
+
+    restored = DecoderRegistry(1337, storage, types_file=types_file)
+    assert restored.unresolved([unknown_query_id, no_data_query_id]) == []
+    assert restored.query_type(unknown_query_id) == "SpotPrice"
+    # query types are kept per storage contract
+    assert DecoderRegistry(1337, "0x" + "44" * 20, types_file=types_file).unresolved([unknown_query_id]) == [
+        unknown_query_id
+    ]
@@ -0,0 +1,44 @@
+from time import monotonic
+
+import pytest
+
+from timestamps_tip_scanner.rate_limiter import RateLimiter
+from timestamps_tip_scanner.rate_limiter import RPCBudgetExceeded
+from timestamps_tip_scanner.rate_limiter import TokenBucket
+
+
+def test_token_bucket_reserves_ahead():
+    bucket = TokenBucket(rate=10)
+    now = monotonic()
+    assert bucket.reserve(10, now) == 0
+    # an empty bucket makes the next requests wait in order
+    assert bucket.reserve(5, now) == pytest.approx(0.5)
+    assert bucket.reserve(5, now) == pytest.approx(1.0)
+    assert bucket.reserve(5, now + 2) == pytest.approx(0.0)
+
+
+def test_get_logs_costs_more_than_calls():
+    limiter = RateLimiter(compute_units_per_second=100, method_costs={"eth_call": 10})
+    assert limiter.reserve("eth_call") == 0
+    # eth_getLogs default cost (75) still fits, the next one waits
+    assert limiter.reserve("eth_getLogs") == 0
+    assert limiter.reserve("eth_getLogs") > 0
+    assert limiter.usage()["compute_units"] == 160
+    assert limiter.usage()["requests"] == 3
+
+
+def test_budget():
+    limiter = RateLimiter(name="node", budget=100)
+    limiter.reserve("eth_getLogs")
+    assert limiter.usage()["budget_used"] == pytest.approx(0.75)
+    with pytest.raises(RPCBudgetExceeded):
+        limiter.reserve("eth_getLogs")
+    # a refused request isn't spent
+    assert limiter.usage()["compute_units"] == 75
+
+
+def test_throttled_drains_buckets():
+    limiter = RateLimiter(requests_per_second=10)
+    limiter.record_throttled()
+    assert limiter.reserve("eth_call") > 0
+    assert limiter.usage()["throttled"] == 1
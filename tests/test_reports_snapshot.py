@@ -0,0 +1,40 @@
+from conftest import new_report
+from timestamps_tip_scanner.reports_snapshot import clear_snapshots
+from timestamps_tip_scanner.reports_snapshot import reports_snapshot
+from timestamps_tip_scanner.sqlite_state import SQLiteState
+
+reporter = "0x33A4622B82D4c04a53e170c638B944ce27cffce3"
+query_id = "0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992"
+
+
+def test_snapshot_is_read_again_only_after_a_commit(tmp_path):
+    clear_snapshots()
+    state = SQLiteState(chain_id=1337, address=reporter, db_path=str(tmp_path / "reports.db"))
+    state.reset(100)
+    state.process_event(new_report(1683037267, 101))
+    state.end_chunk(110)
+
+    snapshot = reports_snapshot(state)
+    assert snapshot.reports == {query_id: [1683037267]}
+    assert reports_snapshot(state) is snapshot
+
+    state.process_event(new_report(1683037300, 111))
+    state.end_chunk(120)
+    refreshed = reports_snapshot(state)
+    assert refreshed is not snapshot
+    assert refreshed.reports == {query_id: [1683037267, 1683037300]}
+
+
+def test_snapshot_windows(tmp_path):
+    clear_snapshots()
+    state = SQLiteState(chain_id=1337, address=reporter, db_path=str(tmp_path / "reports.db"))
+    assert reports_snapshot(state).between(0, 2**63) is None
+
+    state.reset(100)
+    for block_number, timestamp in enumerate([10, 20, 30], start=101):
+        state.process_event(new_report(timestamp, block_number))
+    state.end_chunk(110)
+    snapshot = reports_snapshot(state)
+    assert snapshot.between(10, 30) == {query_id: [20]}
+    assert snapshot.before(30) == {query_id: [10, 20]}
+    assert snapshot.before(10) == {}
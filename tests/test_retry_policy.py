@@ -0,0 +1,117 @@
+import pytest
+import requests
+
+from timestamps_tip_scanner.endpoint_pool import BlockRangeError
+from timestamps_tip_scanner.endpoint_pool import EndpointError
+from timestamps_tip_scanner.retry_policy import classify
+from timestamps_tip_scanner.retry_policy import ErrorClass
+from timestamps_tip_scanner.retry_policy import RetryPolicy
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+def wrapped(error):
+    """`error` as the endpoint pool raises it"""
+    try:
+        raise EndpointError(f"{type(error).__name__}: {error}") from error
+    except EndpointError as e:
+        return e
+
+
+@pytest.mark.parametrize(
+    "error,error_class",
+    [
+        (ValueError({"code": -32005, "message": "query returned more than 10000 results"}), ErrorClass.RANGE_TOO_LARGE),
+        (BlockRangeError("too wide", 100), ErrorClass.RANGE_TOO_LARGE),
+        (requests.ReadTimeout("read timed out"), ErrorClass.RANGE_TOO_LARGE),
+        (http_error(429), ErrorClass.RATE_LIMITED),
+        (ValueError({"code": -32005, "message": "Too Many Requests"}), ErrorClass.RATE_LIMITED),
+        (requests.ConnectionError("connection reset by peer"), ErrorClass.TRANSIENT),
+        (http_error(502), ErrorClass.TRANSIENT),
+        (ValueError({"code": -32000, "message": "header not found"}), ErrorClass.TRANSIENT),
+        (KeyError("topics"), ErrorClass.FATAL),
+        (wrapped(requests.ReadTimeout("read timed out")), ErrorClass.RANGE_TOO_LARGE),
+        (wrapped(http_error(429)), ErrorClass.RATE_LIMITED),
+        (wrapped(http_error(413)), ErrorClass.RANGE_TOO_LARGE),
+        (wrapped(KeyError("topics")), ErrorClass.TRANSIENT),
+    ],
+)
+def test_classify(error, error_class):
+    assert classify(error) is error_class
+
+
+def test_too_large_ranges_are_split_and_fully_fetched():
+    def fetch(start_block, end_block):
+        if end_block - start_block >= 100:
+            raise ValueError({"code": -32005, "message": "block range is too large"})
+        return [(start_block, end_block)]
+
+    policy = RetryPolicy()
+    ranges = policy.fetch(fetch, 0, 399)
+    assert ranges == [(0, 99), (100, 199), (200, 299), (300, 399)]
+    assert policy.range_limit == 99
+
+
+def test_range_limit_recovers_after_fetches_without_splits():
+    timed_out = []
+
+    def fetch(start_block, end_block):
+        if not timed_out:
+            timed_out.append((start_block, end_block))
+            raise requests.ReadTimeout("read timed out")
+        return []
+
+    policy = RetryPolicy(recovery_fetches=3)
+    policy.fetch(fetch, 0, 399)
+    assert policy.range_limit == 199
+    policy.fetch(fetch, 400, 599)
+    assert policy.range_limit == 399
+    for block in range(600, 900, 100):
+        policy.fetch(fetch, block, block + 99)
+    assert policy.range_limit == 799
+
+
+def test_transient_errors_retry_the_same_range():
+    calls = []
+
+    def fetch(start_block, end_block):
+        calls.append((start_block, end_block))
+        if len(calls) < 3:
+            raise requests.ConnectionError("connection reset by peer")
+        return ["event"]
+
+    assert RetryPolicy(backoff_seconds=100).fetch(fetch, 0, 99) == ["event"]
+    assert calls == [(0, 99)] * 3
+
+
+def test_rate_limits_back_off(monkeypatch):
+    delays = []
+    monkeypatch.setattr("timestamps_tip_scanner.retry_policy.sleep", delays.append)
+    calls = []
+
+    def fetch(start_block, end_block):
+        calls.append((start_block, end_block))
+        if len(calls) < 4:
+            raise http_error(429)
+        return []
+
+    RetryPolicy(backoff_seconds=1).fetch(fetch, 0, 99)
+    assert calls == [(0, 99)] * 4
+    assert len(delays) == 3
+    assert all(0 <= delay <= 2**attempt for attempt, delay in enumerate(delays))
+
+
+def test_bugs_are_not_retried():
+    calls = []
+
+    def fetch(start_block, end_block):
+        calls.append((start_block, end_block))
+        raise KeyError("topics")
+
+    with pytest.raises(KeyError):
+        RetryPolicy().fetch(fetch, 0, 99)
+    assert len(calls) == 1
@@ -0,0 +1,89 @@
+import pytest
+from eth_utils import to_checksum_address
+
+from conftest import new_report
+from timestamps_tip_scanner.constants import SHARED_SCAN_ADDRESS
+from timestamps_tip_scanner.jsonified_state import JSONifiedState
+from timestamps_tip_scanner.sqlite_state import SQLiteState
+from timestamps_tip_scanner.timestamps_scanner import parse_reporters
+from timestamps_tip_scanner.timestamps_scanner import shared_scan_backfill
+
+reporter1 = "0x33A4622B82D4c04a53e170c638B944ce27cffce3"
+reporter2 = to_checksum_address("0x0d9a2bd4d8fba3f67c79cbad5bd57c9d27b9a1a3")
+query_id = "0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992"
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def open_state(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def _open_state(address):
+        if request.param == "sqlite":
+            return SQLiteState(chain_id=1337, address=address, db_path=str(tmp_path / "reports.db"))
+        return JSONifiedState(chain_id=1337, address=address)
+
+    return _open_state
+
+
+def test_shared_scan_serves_every_reporter(open_state):
+    shared = open_state(SHARED_SCAN_ADDRESS)
+    shared.reset(100)
+    shared.set_shared_reporters([reporter1, reporter2])
+    shared.process_event(new_report(1683037267, 101, reporter1))
+    shared.process_event(new_report(1683037300, 105, reporter2))
+    shared.end_chunk(110)
+    shared.save()
+
+    assert open_state(reporter1).read_reports() == {query_id: [1683037267]}
+    assert open_state(reporter2).read_reports() == {query_id: [1683037300]}
+    assert open_state(reporter2).last_scanned_time() is not None
+    # not in the shared scan
+    other = open_state("0x000000000000000000000000000000000000dEaD")
+    assert other.read_reports() is None
+    assert other.last_scanned_time() is None
+
+    # a reorg rolls back the reports of every reporter in the orphaned blocks
+    shared.rollback_to(101)
+    assert open_state(reporter1).read_reports() == {query_id: [1683037267]}
+    assert not open_state(reporter2).read_reports().get(query_id)
+
+
+def test_shared_scan_backfills_added_reporters(open_state):
+    shared = open_state(SHARED_SCAN_ADDRESS)
+    shared.reset(100)
+    # a fresh scan has nothing to backfill
+    assert shared_scan_backfill(shared, [reporter1]) is None
+    shared.end_chunk(200)
+
+    assert shared_scan_backfill(shared, [reporter1]) is None
+    assert shared_scan_backfill(shared, [reporter1, reporter2]) == (100, 199, [reporter2])
+    assert shared.shared_reporters() == sorted([reporter1, reporter2])
+    assert shared_scan_backfill(shared, None) == (100, 199, None)
+    # every reporter was scanned already
+    assert shared_scan_backfill(shared, [reporter1]) is None
+
+
+def test_parse_reporters():
+    assert parse_reporters("all") is None
+    assert parse_reporters(f"{reporter2.lower()}, {reporter1}") == sorted([reporter1, reporter2])
+    with pytest.raises(ValueError):
+        parse_reporters(" , ")
+
+
+def test_resetting_a_reporters_scan_keeps_the_shared_scans_reports(tmp_path):
+    db_path = str(tmp_path / "reports.db")
+    shared = SQLiteState(chain_id=1337, address=SHARED_SCAN_ADDRESS, db_path=db_path)
+    shared.reset(100)
+    shared.process_event(new_report(1683037267, 101, reporter1))
+    shared.end_chunk(110)
+    own = SQLiteState(chain_id=1337, address=reporter1, db_path=db_path)
+    own.reset(100)
+    own.process_event(new_report(1683037267, 101, reporter1))
+    own.process_event(new_report(1683037300, 105, reporter1))
+    own.end_chunk(110)
+    assert own.read_reports() == {query_id: [1683037267, 1683037300]}
+
+    own.reset(100)
+    own.save()
+    assert own.read_reports() == {query_id: [1683037267]}
+    assert shared.serve()[reporter1][query_id] == [1683037267]
@@ -0,0 +1,82 @@
+import sqlite3
+
+from conftest import new_report
+from timestamps_tip_scanner.sqlite_state import SQLiteState
+
+reporter = "0x33A4622B82D4c04a53e170c638B944ce27cffce3"
+query_id = "0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992"
+
+
+def test_sqlite_state_restores_and_serves_like_json_state(tmp_path):
+    db_path = str(tmp_path / "reports.db")
+    state = SQLiteState(chain_id=1337, address=reporter, db_path=db_path)
+    state.reset(100)
+    state.process_event(new_report(1683037267, 101))
+    state.process_event(new_report(1683037300, 105))
+    # rescanned blocks don't duplicate timestamps
+    state.process_event(new_report(1683037267, 101))
+    state.end_chunk(110)
+
+    restored = SQLiteState(chain_id=1337, address=reporter, db_path=db_path)
+    restored.restore()
+    assert restored.get_last_scanned_block() == 110
+    assert restored.read_reports() == {query_id: [1683037267, 1683037300]}
+    served = restored.serve()[reporter]
+    assert served["last_scanned_block"] == 110
+    assert served[query_id] == [1683037267, 1683037300]
+
+
+def test_sqlite_state_unknown_reporter(tmp_path):
+    state = SQLiteState(chain_id=1337, address=reporter, db_path=str(tmp_path / "reports.db"))
+    assert state.read_reports() is None
+    assert state.last_scanned_time() is None
+
+
+def test_sqlite_state_rolls_back_orphaned_reports(tmp_path):
+    state = SQLiteState(chain_id=1337, address=reporter, db_path=str(tmp_path / "reports.db"))
+    state.reset(100)
+    state.process_event(new_report(1683037267, 101))
+    state.process_event(new_report(1683037300, 105))
+    state.record_block_hash(110, "0x" + "11" * 32)
+    state.end_chunk(110)
+    assert [block for block, _ in state.block_checkpoints()] == [110, 105, 101]
+
+    # block 105 was orphaned, 101 is still canonical
+    state.rollback_to(101)
+    assert state.get_last_scanned_block() == 101
+    assert state.read_reports() == {query_id: [1683037267]}
+    assert [block for block, _ in state.block_checkpoints()] == [101]
+
+    state.prune_reorg_journal(101)
+    assert state.block_checkpoints() == []
+
+
+def test_sqlite_state_only_journals_reports_above_the_final_block(tmp_path):
+    state = SQLiteState(chain_id=1337, address=reporter, db_path=str(tmp_path / "reports.db"))
+    state.reset(100)
+    state.process_event(new_report(1683037267, 101), final_block=101)
+    state.process_event(new_report(1683037300, 105), final_block=101)
+    state.end_chunk(110)
+    assert [block for block, _ in state.block_checkpoints()] == [105]
+
+    # a reorg can't reach a final block
+    state.rollback_to(101)
+    assert state.read_reports() == {query_id: [1683037267]}
+
+
+def test_sqlite_state_migrates_reports_without_their_scan(tmp_path):
+    db_path = str(tmp_path / "reports.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE reports (chain TEXT NOT NULL, reporter TEXT NOT NULL, query_id TEXT NOT NULL, "
+        "timestamp INTEGER NOT NULL, PRIMARY KEY (chain, reporter, query_id, timestamp)) WITHOUT ROWID"
+    )
+    conn.execute("INSERT INTO reports VALUES (?, ?, ?, ?)", ("mainnet", reporter, query_id, 1683037267))
+    conn.commit()
+    conn.close()
+
+    state = SQLiteState(chain_id=1, address=reporter, db_path=db_path)
+    assert state.read_reports() == {query_id: [1683037267]}
+    state.reset(100)
+    state.save()
+    assert state.read_reports() == {}
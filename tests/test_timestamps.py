@@ -0,0 +1,40 @@
+import json
+
+from timestamps_tip_scanner.timestamps import json_default
+from timestamps_tip_scanner.timestamps import SortedTimestamps
+
+
+def test_sorted_timestamps_dedupes_and_bisects():
+    timestamps = SortedTimestamps([1683037300, 1683037267, 1683037300])
+    assert timestamps == [1683037267, 1683037300]
+    assert timestamps.add(1683037400)
+    assert timestamps.add(1683037280)
+    assert not timestamps.add(1683037267)
+    assert timestamps.tolist() == [1683037267, 1683037280, 1683037300, 1683037400]
+    assert 1683037280 in timestamps
+    # bounds are exclusive, like the eligibility windows
+    assert timestamps.between(1683037267, 1683037400) == [1683037280, 1683037300]
+    assert timestamps.before(1683037300) == [1683037267, 1683037280]
+    timestamps.discard(1683037280)
+    assert 1683037280 not in timestamps
+
+
+def test_sorted_timestamps_out_of_order_inserts():
+    timestamps = SortedTimestamps(range(0, 100, 10))
+    assert timestamps.add(35)
+    assert timestamps.add(5)
+    assert not timestamps.add(35)
+    assert not timestamps.add(40)
+    assert 5 in timestamps and len(timestamps) == 12
+    # appends in order after out-of-order inserts
+    assert timestamps.add(100)
+    assert timestamps.between(0, 40) == [5, 10, 20, 30, 35]
+    assert timestamps.add(15)
+    assert timestamps == SortedTimestamps([*range(0, 101, 10), 5, 15, 35])
+    timestamps.discard(15)
+    assert list(timestamps) == [0, 5, 10, 20, 30, 35, 40, 50, 60, 70, 80, 90, 100]
+
+
+def test_sorted_timestamps_serialize_as_lists():
+    state = {"0xabc": {"last_scanned_block": 1, "0x83a7": SortedTimestamps([2, 1])}}
+    assert json.loads(json.dumps(state, default=json_default)) == {"0xabc": {"last_scanned_block": 1, "0x83a7": [1, 2]}}
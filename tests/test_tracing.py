@@ -0,0 +1,60 @@
+import json
+import threading
+
+import pytest
+
+from timestamps_tip_scanner import tracing
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    tracing.configure(path=str(path))
+    yield path
+    tracing.configure()
+
+
+def exported(path):
+    tracing.configure(path=str(path))
+    with open(path) as f:
+        return {span["name"]: span for span in map(json.loads, f)}
+
+
+def test_spans_nest_in_their_parent(trace_file):
+    with tracing.span("request", path="/feed_tips/137") as root:
+        with tracing.span("multicall", calls=3):
+            pass
+        with pytest.raises(ValueError):
+            with tracing.span("state_save"):
+                raise ValueError("disk full")
+        root.set(status_code=200)
+
+    spans = exported(trace_file)
+    assert "parentId" not in spans["request"]
+    assert spans["request"]["tags"] == {"path": "/feed_tips/137", "status_code": "200"}
+    for name in ("multicall", "state_save"):
+        assert spans[name]["traceId"] == spans["request"]["traceId"]
+        assert spans[name]["parentId"] == spans["request"]["id"]
+    assert spans["multicall"]["tags"] == {"calls": "3"}
+    assert spans["state_save"]["tags"]["error"] == "ValueError: disk full"
+
+
+def test_spans_keep_their_parent_on_other_threads(trace_file):
+    def fetch():
+        with tracing.span("fetch_chunk"):
+            pass
+
+    with tracing.span("scan"):
+        thread = threading.Thread(target=tracing.in_context(fetch))
+        thread.start()
+        thread.join()
+
+    spans = exported(trace_file)
+    assert spans["fetch_chunk"]["parentId"] == spans["scan"]["id"]
+
+
+def test_no_export_without_destination(tmp_path):
+    tracing.configure()
+    with tracing.span("scan") as span:
+        span.set(chunks=1)
+    assert tracing._exporter is None
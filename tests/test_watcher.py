@@ -0,0 +1,31 @@
+from hexbytes import HexBytes
+from telliot_feeds.feeds import eth_usd_median_feed
+
+from timestamps_tip_scanner.timestamps_scanner import new_report_scanner
+from timestamps_tip_scanner.watcher import Watcher
+
+
+def test_watcher_follows_new_reports(tellor_autopay, contracts, submit_reports):
+    keys = contracts.keys
+    scanner = new_report_scanner(
+        w3=tellor_autopay.node._web3,
+        tellorflex_contract=contracts.tellorflex,
+        reporter=keys.reporter1.address,
+        chain_id=1337,
+        starting_block=0,
+    )
+    watcher = Watcher(scanner, interval=0)
+    query_id = HexBytes(eth_usd_median_feed.query.query_id).hex()
+
+    first = submit_reports(keys.reporter1, (eth_usd_median_feed,))
+    assert len(watcher.poll()) == 1
+    scanned_block = watcher.state.get_last_scanned_block()
+
+    second = submit_reports(keys.reporter1, (eth_usd_median_feed,))
+    watcher.follow(max_polls=2)
+    assert watcher.state.state["localhost"][keys.reporter1.address][query_id] == first + second
+    assert watcher.state.get_last_scanned_block() > scanned_block
+
+    # nothing new, the scan time is still refreshed for the API
+    assert watcher.poll() == []
+    assert watcher.state.last_scanned_time() is not None